@@ -27,6 +27,10 @@ DEFAULT_CITY = os.getenv('DEFAULT_CITY', 'Chernihiv')
 raw_feeds = os.getenv('RSS_FEEDS', '')
 RSS_FEEDS = [url.strip() for url in raw_feeds.split(',') if url.strip()]
 
+# ATB catalog: шляхи категорій для фонового індексування (напр. catalog/287-ovochi-ta-frukti)
+raw_atb_categories = os.getenv('ATB_CATEGORIES', '')
+ATB_CATEGORIES = [path.strip() for path in raw_atb_categories.split(',') if path.strip()]
+
 # Fitness activitys
 FITNESS_PLAN = {
     0: (
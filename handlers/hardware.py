@@ -1,11 +1,9 @@
 import html
-import subprocess
-import os
-import glob
 from aiogram import Router, types, F
 from aiogram.filters import Command, CommandObject
 
 from config import OWNER_ID, ADMIN_IDS
+from services import log_search, metrics, pm2_client
 from services import termux_api as hardware
 from services.db_manager import backup_database
 
@@ -26,7 +24,7 @@ async def cmd_status(message: types.Message):
     if not is_owner(message.from_user.id): return
     
     await message.answer("🔍 Збираю дані про систему...")
-    report = hardware.get_full_system_report()
+    report = await metrics.get_status_report()
     
     if len(report) > 4096: 
         report = report[:4090] + "..."
@@ -96,65 +94,58 @@ async def handle_restarts(message: types.Message):
         await message.answer("♻️ Йду на перезавантаження. Побачимось за мить! 👋")
     
     try:
-        subprocess.run(["pm2", "restart", service_name], check=True)
+        await pm2_client.restart_process(service_name)
         if service_name != "Jeeves":
             await message.answer(f"✅ {message.text}: Успішно!")
-    except subprocess.CalledProcessError:
+    except pm2_client.Pm2Error:
         await message.answer(f"❌ {message.text}: Помилка PM2.")
 
 # --- 5. ЛОГИ (Тільки Власник) ---
 
+LOGS_HELP = (
+    "🔎 <code>/logs [app|pm2|out|err] [процес] [debug|info|warning|error] [30m|2h|1d] [слово]</code>\n"
+    "<code>app</code> — лог бота, <code>pm2</code>/<code>out</code>/<code>err</code> — логи всіх процесів PM2 "
+    "(або одного, якщо вказати назву).\n"
+    "Напр.: <code>/logs error 2h timeout</code>, <code>/logs moto 1h</code>"
+)
+
+async def send_log_records(message: types.Message, query: log_search.LogQuery):
+    try:
+        records = await log_search.search_async(query)
+    except Exception as e:
+        return await message.answer(f"❌ Не вдалося прочитати логи: {e}")
+
+    if not records:
+        return await message.answer(f"✅ Нічого не знайдено ({html.escape(log_search.describe_query(query))}).")
+
+    # найновіші записи в кінці — при обрізанні жертвуємо найстарішими
+    text = "\n".join(records)[-3500:]
+    await message.answer(
+        f"📋 {html.escape(log_search.describe_query(query))}: {len(records)}\n<pre>{html.escape(text)}</pre>"
+    )
+
+@router.message(Command("logs"))
+async def cmd_logs_query(message: types.Message, command: CommandObject):
+    if not is_owner(message.from_user.id): return
+
+    if command.args and command.args.strip() in ("help", "?"):
+        return await message.answer(LOGS_HELP)
+    await send_log_records(message, log_search.parse_query(command.args))
+
 @router.message(F.text == "📄 Логи")
 @router.message(F.text == "Логи")
 async def cmd_logs(message: types.Message):
     if not is_owner(message.from_user.id): return
-    
-    await message.answer("📋 Читаю останні 20 рядків логів...")
-    try:
-        result = subprocess.check_output(
-            ["pm2", "logs", "--lines", "20", "--nostream", "--raw"], 
-            stderr=subprocess.STDOUT
-        ).decode('utf-8')
-        
-        clean_logs = html.escape(result[-3500:]) 
-        await message.answer(f"<pre>{clean_logs}</pre>")
-    except Exception as e:
-        await message.answer(f"❌ Не вдалося отримати логи: {e}")
+    # як `pm2 logs`: out і error усіх процесів, злиті за часом
+    await send_log_records(message, log_search.LogQuery(source="pm2", limit=20))
 
 @router.message(F.text == "❌ Еrror log")
 async def cmd_err_logs(message: types.Message):
     if not is_owner(message.from_user.id): return
-    
-    home_dir = os.path.expanduser("~")
-    pm2_log_dir = os.path.join(home_dir, ".pm2", "logs")
-    
-    main_error_log = os.path.join(pm2_log_dir, "Jeeves-error.log")
-    
-    target_file = main_error_log
-    info_msg = "📋 Логи помилок (Active):"
-
-    if os.path.exists(main_error_log) and os.path.getsize(main_error_log) == 0:
-        search_pattern = os.path.join(pm2_log_dir, "Jeeves-error__*.log")
-        rotated_files = sorted(glob.glob(search_pattern))
-        
-        if rotated_files:
-            target_file = rotated_files[-1]
-            info_msg = f"📋 Лог пустий. Читаю архів:\n{os.path.basename(target_file)}"
-        else:
-             return await message.answer("✅ Файл помилок пустий і архівів немає. (Clean run)")
-    
-    await message.answer(info_msg)
-
-    try:
-        output = subprocess.check_output(["tail", "-n", "30", target_file]).decode("utf-8")
-        
-        if output.strip():
-            await message.answer(f"<pre>{html.escape(output)}</pre>")
-        else:
-            await message.answer("✅ Лог пустий.")
-            
-    except Exception as e:
-        await message.answer(f"❌ Помилка читання файлу: {e}")
+    # порожній активний файл — читання саме продовжиться в останній ротації
+    await send_log_records(
+        message, log_search.LogQuery(source="err", app=log_search.PM2_APP_NAME, limit=30)
+    )
 
 # --- 6. РЕЗЕРВНЕ КОПІЮВАННЯ БД (Тільки Власник) ---
 @router.message(F.text == "💾 Бекап БД")
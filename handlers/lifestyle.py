@@ -2,7 +2,7 @@ import html
 from datetime import datetime
 
 from aiogram import F, Router, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
@@ -15,12 +15,37 @@ from services.calendar_api import (
     delete_event,
     get_event_by_id,
     get_events,
+    import_events_file,
+    is_supported_import,
     mass_import_events,
+    MAX_IMPORT_BYTES,
     update_event_text
 )
-from services.news_api import get_fresh_news
-from services.price_parser import search_atb
-from services.weather_api import get_weather_forecast, search_city, set_city_coords
+from services.news_api import (
+    get_fresh_news,
+    list_subscriptions,
+    MAX_SUBSCRIPTIONS,
+    subscribe_feed,
+    unsubscribe_feed
+)
+from services.atb_catalog import (
+    add_watch,
+    index_products,
+    list_watch,
+    lookup_shopping_list,
+    parse_shopping_list,
+    remove_watch,
+    search_catalog
+)
+from services.price_parser import AtbError, format_product, search_products_async
+from services.weather_api import (
+    get_cached_city,
+    get_weather_forecast,
+    normalize_city_query,
+    search_cities,
+    set_city_coords,
+    set_weather_alerts
+)
 
 router = Router()
 
@@ -47,14 +72,36 @@ def is_authorized(user_id: int) -> bool:
 # 🌤 ПОГОДА ТА МІСТА
 # ==========================================
 
+def format_city_label(city: dict) -> str:
+    parts = [city['name'], city.get('region'), city.get('country')]
+    return ", ".join(p for p in parts if p)
+
 async def find_and_save_city(message: types.Message, city_name: str):
     msg = await message.answer(f"🔎 Шукаю <b>{html.escape(city_name)}</b>...")
-    result = await search_city(city_name)
-    if result:
-        set_city_coords(message.from_user.id, result['name'], result['lat'], result['lon'])
-        await msg.edit_text(f"✅ Місто змінено на <b>{result['name']}</b>.")
-    else:
+    results = await search_cities(city_name)
+    if not results:
         await msg.edit_text("❌ Місто не знайдено.")
+    elif len(results) == 1:
+        result = results[0]
+        await set_city_coords(message.from_user.id, result['name'], result['lat'], result['lon'])
+        await msg.edit_text(f"✅ Місто змінено на <b>{html.escape(result['name'])}</b>.")
+    else:
+        key = normalize_city_query(city_name)
+        kb = types.InlineKeyboardMarkup(inline_keyboard=[
+            [types.InlineKeyboardButton(text=f"📍 {format_city_label(city)}", callback_data=f"city_pick:{i}:{key}")]
+            for i, city in enumerate(results)
+        ])
+        await msg.edit_text("🏙 Знайшов кілька варіантів, оберіть:", reply_markup=kb)
+
+@router.callback_query(F.data.startswith("city_pick:"))
+async def process_city_pick(callback: types.CallbackQuery):
+    _, index, key = callback.data.split(":", 2)
+    city = await get_cached_city(key, int(index))
+    if not city:
+        return await callback.answer("⚠️ Варіант застарів, повторіть пошук.", show_alert=True)
+    await set_city_coords(callback.from_user.id, city['name'], city['lat'], city['lon'])
+    await callback.message.edit_text(f"✅ Місто змінено на <b>{html.escape(format_city_label(city))}</b>.")
+    await callback.answer()
 
 @router.message(Command("set_city"))
 @router.message(F.text.in_({"🌦 Обрати місто", "Обрати місто"}))
@@ -80,14 +127,177 @@ async def cmd_weather(message: types.Message):
     text = await get_weather_forecast(message.from_user.id)
     await sent_msg.edit_text(text)
 
+@router.message(Command("weather_alerts"))
+async def cmd_weather_alerts(message: types.Message, command: CommandObject):
+    if not is_authorized(message.from_user.id): return
+    arg = (command.args or "").strip().lower()
+    if arg not in ("on", "off"):
+        return await message.answer(
+            "🔔 Сповіщення про дощ найближчої години та нічні заморозки:\n"
+            "<code>/weather_alerts on</code> або <code>/weather_alerts off</code>"
+        )
+    await set_weather_alerts(message.from_user.id, arg == "on")
+    await message.answer("🔔 Погодні сповіщення увімкнено." if arg == "on" else "🔕 Погодні сповіщення вимкнено.")
+
 @router.message(Command("news"))
 @router.message(F.text == "📰 Новини")
 async def cmd_news(message: types.Message):
     if not is_authorized(message.from_user.id): return
     sent_msg = await message.answer("📰 Гортаю газети...")
-    text = await get_fresh_news()
+    text = await get_fresh_news(message.from_user.id)
     await sent_msg.edit_text(text, disable_web_page_preview=True)
 
+@router.message(Command("feeds"))
+async def cmd_feeds(message: types.Message):
+    if not is_authorized(message.from_user.id): return
+    feeds = await list_subscriptions(message.from_user.id)
+    if not feeds:
+        return await message.answer(
+            "📰 Власних підписок немає — показую загальні стрічки.\n"
+            "Додати: <code>/feed_add https://site/rss</code>"
+        )
+    lines = [f"{i}. <code>{html.escape(url)}</code>" for i, url in enumerate(feeds, 1)]
+    await message.answer(
+        "📰 <b>Ваші стрічки:</b>\n" + "\n".join(lines) +
+        "\n\nВидалити: <code>/feed_del номер</code>",
+        disable_web_page_preview=True
+    )
+
+@router.message(Command("feed_add"))
+async def cmd_feed_add(message: types.Message, command: CommandObject):
+    if not is_authorized(message.from_user.id): return
+    url = (command.args or "").strip()
+    if not url.startswith(("http://", "https://")):
+        return await message.answer("ℹ️ Формат: <code>/feed_add https://site/rss</code>")
+    if len(await list_subscriptions(message.from_user.id)) >= MAX_SUBSCRIPTIONS:
+        return await message.answer(f"⚠️ Не більше {MAX_SUBSCRIPTIONS} стрічок.")
+
+    status_msg = await message.answer("🔎 Перевіряю стрічку...")
+    source = await subscribe_feed(message.from_user.id, url)
+    if source is None:
+        return await status_msg.edit_text("❌ За цим посиланням не знайшлося RSS/Atom стрічки.")
+    await status_msg.edit_text(f"✅ Підписано: <b>{html.escape(source)}</b>")
+
+@router.message(Command("feed_del"))
+async def cmd_feed_del(message: types.Message, command: CommandObject):
+    if not is_authorized(message.from_user.id): return
+    arg = (command.args or "").strip()
+    feeds = await list_subscriptions(message.from_user.id)
+    url = feeds[int(arg) - 1] if arg.isdigit() and 0 < int(arg) <= len(feeds) else arg
+    if not url or not await unsubscribe_feed(message.from_user.id, url):
+        return await message.answer("❌ Такої стрічки немає. Список: /feeds")
+    await message.answer(f"🗑 Відписано: <code>{html.escape(url)}</code>")
+
+# ==========================================
+# 🛒 ЦІНИ АТБ
+# ==========================================
+WATCH_BUTTONS_PER_ROW = 5
+
+def build_watch_kb(products: list, action: str, icon: str) -> types.InlineKeyboardMarkup:
+    buttons = [
+        types.InlineKeyboardButton(text=f"{icon} {i}", callback_data=f"{action}:{p['id']}")
+        for i, p in enumerate(products, 1)
+    ]
+    rows = [buttons[i:i + WATCH_BUTTONS_PER_ROW] for i in range(0, len(buttons), WATCH_BUTTONS_PER_ROW)]
+    return types.InlineKeyboardMarkup(inline_keyboard=rows)
+
+async def answer_price_query(message: types.Message, query: str):
+    status_msg = await message.answer(f"🔎 Шукаю <b>{html.escape(query)}</b>...")
+
+    products = await search_catalog(query)
+    if not products:
+        # В індексі порожньо — один живий запит, результат одразу лягає в каталог
+        try:
+            await index_products(await search_products_async(query))
+        except AtbError as e:
+            return await status_msg.edit_text(str(e))
+        except Exception as e:
+            return await status_msg.edit_text(f"❌ Помилка: {e}")
+        products = await search_catalog(query)
+
+    if not products:
+        return await status_msg.edit_text("🤷‍♂️ В АТБ (маг. 1158) нічого не знайдено.")
+
+    lines = [f"{i}. {format_product(p)}" for i, p in enumerate(products, 1)]
+    await status_msg.edit_text(
+        "🛒 <b>АТБ:</b>\n" + "\n".join(lines) + "\n\n<i>👁 — стежити за ціною</i>",
+        reply_markup=build_watch_kb(products, "price_watch", "👁")
+    )
+
+async def answer_shopping_list(message: types.Message, text: str):
+    items = parse_shopping_list(text)
+    if not items:
+        return await message.answer("🧾 Список порожній: одна позиція на рядок.")
+    status_msg = await message.answer(f"🧾 Рахую кошик з {len(items)} позицій...")
+
+    out, total, missing = [], 0.0, 0
+    for i, line in enumerate(await lookup_shopping_list(items), 1):
+        label = html.escape(line.query) + (f" ×{line.quantity}" if line.quantity > 1 else "")
+        product = line.product
+        if product is None:
+            missing += 1
+            out.append(f"{i}. {label} → 🤷‍♂️ {html.escape(line.error or 'не знайдено')}")
+        elif product["price"] is None:
+            missing += 1
+            out.append(f"{i}. {label} → ⛔️ {html.escape(product['name'])} (немає в наявності)")
+        else:
+            cost = product["price"] * line.quantity
+            total += cost
+            out.append(f"{i}. {label} → <b>{html.escape(product['name'])}</b> — {cost:.2f} грн")
+
+    footer = f"\n\n💰 <b>Разом: {total:.2f} грн</b>"
+    if missing:
+        footer += f"\n<i>Без ціни: {missing} поз.</i>"
+    await status_msg.edit_text("🧾 <b>Кошик АТБ:</b>\n" + "\n".join(out) + footer)
+
+async def answer_price_request(message: types.Message, text: str):
+    # Кілька рядків — це список покупок
+    if "\n" in text.strip():
+        await answer_shopping_list(message, text)
+    else:
+        await answer_price_query(message, text.strip())
+
+@router.message(Command("price", "shop"))
+async def cmd_price(message: types.Message, command: CommandObject, state: FSMContext):
+    if not is_authorized(message.from_user.id): return
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🛒 Що шукаємо в АТБ? Можна цілий список — по позиції на рядок.")
+        return await state.set_state(PriceStates.waiting_for_query)
+    await answer_price_request(message, query)
+
+@router.message(PriceStates.waiting_for_query)
+async def process_price_query(message: types.Message, state: FSMContext):
+    await state.clear()
+    await answer_price_request(message, message.text or "")
+
+@router.callback_query(F.data.startswith("price_watch:"))
+async def process_price_watch(callback: types.CallbackQuery):
+    product_id = int(callback.data.split(":", 1)[1])
+    added = await add_watch(callback.from_user.id, product_id)
+    await callback.answer("👁 Стежу за ціною." if added else "Вже в списку стеження.")
+
+async def render_watchlist(user_id: int):
+    products = await list_watch(user_id)
+    if not products:
+        return "👁 Список стеження порожній. Додайте товар кнопкою 👁 у /price.", None
+    lines = [f"{i}. {format_product(p)}" for i, p in enumerate(products, 1)]
+    text = "👁 <b>Стежу за цінами:</b>\n" + "\n".join(lines) + "\n\n<i>❌ — прибрати</i>"
+    return text, build_watch_kb(products, "price_unwatch", "❌")
+
+@router.message(Command("watchlist"))
+async def cmd_watchlist(message: types.Message):
+    if not is_authorized(message.from_user.id): return
+    text, kb = await render_watchlist(message.from_user.id)
+    await message.answer(text, reply_markup=kb)
+
+@router.callback_query(F.data.startswith("price_unwatch:"))
+async def process_price_unwatch(callback: types.CallbackQuery):
+    await remove_watch(callback.from_user.id, int(callback.data.split(":", 1)[1]))
+    text, kb = await render_watchlist(callback.from_user.id)
+    await callback.message.edit_text(text, reply_markup=kb)
+    await callback.answer()
+
 # ==========================================
 # 📅 КАЛЕНДАР
 # ==========================================
@@ -102,7 +312,7 @@ async def process_filter(callback: types.CallbackQuery):
     filter_type = callback.data.split("_")[1]
     user_id = callback.from_user.id
     
-    events = get_events(user_id, filter_type)
+    events = await get_events(user_id, filter_type)
     
     if not events:
         await callback.message.edit_text("🤷‍♂️ Подій у цьому діапазоні немає.", reply_markup=get_events_filter_kb())
@@ -165,8 +375,7 @@ async def process_filter(callback: types.CallbackQuery):
     else:
         for event in events:
             try:
-                d, m = map(int, event['date'].split('.'))
-                dt_obj = datetime.now().replace(month=m, day=d) 
+                dt_obj = event['when']
                 days_ua = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Нд"]
                 day_label = days_ua[dt_obj.weekday()]
                 date_display = f"{day_label}, {event['date']}"
@@ -191,20 +400,44 @@ async def process_filter(callback: types.CallbackQuery):
 @router.message(Command("import"))
 async def cmd_import(message: types.Message, state: FSMContext):
     if not is_authorized(message.from_user.id): return
-    await message.answer("📦 <b>Масовий імпорт</b>\nФормат:\n<pre>14.02 День Валентина</pre>")
+    await message.answer(
+        "📦 <b>Масовий імпорт</b>\nФормат:\n<pre>14.02 День Валентина</pre>\n"
+        "Або надішліть файл <code>.txt</code>, <code>.csv</code> (дата;назва;посилання) чи <code>.ics</code>."
+    )
     await state.set_state(CalendarStates.waiting_for_import)
 
 @router.message(CalendarStates.waiting_for_import)
 async def process_import(message: types.Message, state: FSMContext):
-    count = mass_import_events(message.from_user.id, message.text)
-    await message.answer(f"✅ Успішно додано подій: {count}")
+    user_id = message.from_user.id
+
+    if message.document:
+        doc = message.document
+        if not is_supported_import(doc.file_name):
+            return await message.answer("⚠️ Підтримуються лише файли .txt, .csv та .ics")
+        if doc.file_size and doc.file_size > MAX_IMPORT_BYTES:
+            return await message.answer("⚠️ Файл завеликий (максимум 5 МБ).")
+
+        status_msg = await message.answer("📥 Імпортую файл...")
+        stream = await message.bot.download(doc)
+        report = await import_events_file(user_id, doc.file_name, stream)
+        await status_msg.delete()
+    elif message.text:
+        report = await mass_import_events(user_id, message.text)
+    else:
+        return await message.answer("🤔 Надішліть текст або файл.")
+
+    await message.answer(
+        f"✅ Додано подій: <b>{report.imported}</b>\n"
+        f"♻️ Дублікатів пропущено: {report.skipped}\n"
+        f"⚠️ Некоректних рядків: {report.invalid}"
+    )
     await state.clear()
 
 # --- РЕДАГУВАННЯ ---
 @router.callback_query(F.data.startswith("edit_evt_"))
 async def start_edit(callback: types.CallbackQuery, state: FSMContext):
     evt_id = int(callback.data.split("_")[2])
-    event = get_event_by_id(callback.from_user.id, evt_id)
+    event = await get_event_by_id(callback.from_user.id, evt_id)
     if not event: return await callback.answer("⚠️ Подія не знайдена.", show_alert=True)
 
     await state.update_data(edit_id=evt_id)
@@ -215,7 +448,7 @@ async def start_edit(callback: types.CallbackQuery, state: FSMContext):
 async def finish_edit(message: types.Message, state: FSMContext):
     data = await state.get_data()
     evt_id = data.get('edit_id')
-    if update_event_text(message.from_user.id, evt_id, message.text):
+    if await update_event_text(message.from_user.id, evt_id, message.text):
         await message.answer("✅ Зміни збережено.")
     else:
         await message.answer("❌ Помилка збереження.")
@@ -235,7 +468,7 @@ async def cmd_delete_event(message: types.Message):
     args = message.text.split(maxsplit=1)
     if len(args) < 2:
         return await message.answer("🗑 Використання: <code>/del 14.02</code> або <code>/del Назва</code>")
-    result = delete_event(message.from_user.id, args[1].strip())
+    result = await delete_event(message.from_user.id, args[1].strip())
     await message.answer(f"🗑 {result}")
 
 @router.message(AddEvent.waiting_for_date)
@@ -271,7 +504,7 @@ async def process_link(message: types.Message, state: FSMContext):
         elif raw_text.startswith("+"): final_link = f"https://t.me/{raw_text}"
 
     try:
-        saved_event = add_new_event(message.from_user.id, user_data['date'], user_data['name'], final_link)
+        saved_event = await add_new_event(message.from_user.id, user_data['date'], user_data['name'], final_link)
         preview = decode_event_to_string(saved_event)
         await message.answer(
             f"✅ <b>Збережено!</b>\n📅 {saved_event['date']}: {preview}", 
@@ -289,13 +522,13 @@ async def cmd_manual_briefing(message: types.Message):
     status_msg = await message.answer("☕️ Збираю ранкову пресу...")
     
     parts = []
-    events_text = check_upcoming_events(message.from_user.id)
+    events_text = await check_upcoming_events(message.from_user.id)
     if events_text: parts.append(f"📅 <b>Нагадування:</b>\n{events_text}")
     
     weather_text = await get_weather_forecast(message.from_user.id)
     if weather_text: parts.append(weather_text)
     
-    news_text = await get_fresh_news()
+    news_text = await get_fresh_news(message.from_user.id)
     if news_text: parts.append(news_text)
 
     if parts:
@@ -1,15 +1,18 @@
 # handlers/notes.py
+import hashlib
+import html
 import os
 import re
 from aiogram import Router, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message, CallbackQuery
 
-from config import OWNER_ID, ADMIN_IDS
-from services.db_manager import get_connection
-from services import termux_api
+from services import db_manager as db
+from services import permissions, termux_api
+from utils.cache import TTLCache
+from utils.helpers import parse_tags
 
 # Спробуємо підключити Groq, якщо немає - фолбек
 try:
@@ -27,22 +30,10 @@ class NoteStates(StatesGroup):
     waiting_for_tags = State()
 
 # --- ПРАВА ДОСТУПУ ---
-def check_permissions(user_id, chat_id, member_status):
-    if user_id == OWNER_ID: return True
-    
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT trust_level FROM chat_trust WHERE chat_id = ?', (chat_id,))
-    row = cursor.fetchone()
-    conn.close()
-
-    trust_level = row['trust_level'] if row else 'guest'
-
-    if trust_level == 'guest': return False
-    if trust_level == 'admins_only':
-        return member_status in ['administrator', 'creator'] or user_id in ADMIN_IDS
-    if trust_level == 'all': return True
-    return False
+@router.chat_member()
+async def on_chat_member_update(event: types.ChatMemberUpdated):
+    # Статус змінився (підвищили/розжалували) — не чекаємо закінчення TTL кешу
+    permissions.forget_member(event.chat.id, event.new_chat_member.user.id)
 
 # --- 1. ДОДАВАННЯ НОТАТКИ (ТЕКСТ, ГОЛОС, ФОТО) ---
 @router.message(Command("note"))
@@ -51,9 +42,8 @@ def check_permissions(user_id, chat_id, member_status):
 async def start_note(message: Message, state: FSMContext):
     user_id = message.from_user.id
     chat_id = message.chat.id
-    member = await message.chat.get_member(user_id)
 
-    if not check_permissions(user_id, chat_id, member.status):
+    if not await permissions.can_manage_notes(message.bot, chat_id, user_id):
         await message.answer("⛔️ У цьому чаті я нотатки не приймаю.")
         return
 
@@ -69,7 +59,7 @@ async def start_note(message: Message, state: FSMContext):
     if len(args) > 1:
         content = args[1]
         tags = extract_tags(content)
-        save_note_to_db(chat_id, content, tags)
+        await save_note_to_db(chat_id, content, tags)
         await message.answer(f"✅ Записав: <b>{content[:50]}...</b>", parse_mode="HTML")
         return
 
@@ -175,7 +165,7 @@ async def save_note_callback(callback: CallbackQuery, state: FSMContext):
     
     final_tags = " ".join(clean_tags)
     
-    save_note_to_db(callback.message.chat.id, content, final_tags, file_id, media_type)
+    await save_note_to_db(callback.message.chat.id, content, final_tags, file_id, media_type)
     
     await callback.message.delete()
     await callback.message.answer(f"✅ Збережено в категорію: {final_tags or 'Без тегів'}")
@@ -204,7 +194,7 @@ async def process_manual_tags(message: Message, state: FSMContext):
     
     final_tags = " ".join(clean_tags)
     
-    save_note_to_db(message.chat.id, content, final_tags, file_id, media_type)
+    await save_note_to_db(message.chat.id, content, final_tags, file_id, media_type)
     await message.answer(f"✅ Збережено з тегами: {final_tags}")
     await state.clear()
 
@@ -213,94 +203,155 @@ async def process_manual_tags(message: Message, state: FSMContext):
 def extract_tags(text):
     return " ".join([word for word in text.split() if word.startswith("#")])
 
-def save_note_to_db(user_id, content, tags, file_id=None, media_type=None):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        'INSERT INTO notes (user_id, content, tags, file_id, media_type) VALUES (?, ?, ?, ?, ?)', 
-        (user_id, content, tags, file_id, media_type)
-    )
-    conn.commit()
-    conn.close()
+async def save_note_to_db(user_id, content, tags, file_id=None, media_type=None):
+    def _insert(conn):
+        cur = conn.execute(
+            'INSERT INTO notes (user_id, content, tags, file_id, media_type) VALUES (?, ?, ?, ?, ?)',
+            (user_id, content, tags, file_id, media_type)
+        )
+        note_id = cur.lastrowid
+        conn.executemany(
+            'INSERT OR IGNORE INTO note_tags (note_id, chat_id, tag) VALUES (?, ?, ?)',
+            [(note_id, user_id, tag) for tag in parse_tags(tags)]
+        )
+        return note_id
+    return await db.run_write(_insert)
 
 
 # --- 6. ПЕРЕГЛЯД ТА ПОШУК ---
+# callback_data обмежена 64 байтами, а кириличний символ — це 2 байти:
+# довгий тег у кнопках замінюється коротким стабільним хешем
+TAG_REF_MAX_BYTES = 24
+
+def tag_ref(tag: str) -> str:
+    """Тег для callback_data: як є, якщо короткий, інакше '#<хеш>' ('#' у тегах не буває)."""
+    if len(tag.encode()) <= TAG_REF_MAX_BYTES:
+        return tag
+    return "#" + hashlib.sha1(tag.encode()).hexdigest()[:12]
+
+async def resolve_tag(chat_id: int, ref: str):
+    """Зворотне до tag_ref. None — такого тегу в чаті вже немає."""
+    if not ref.startswith("#"):
+        return ref
+    rows = await db.fetch_all('SELECT DISTINCT tag FROM note_tags WHERE chat_id = ?', (chat_id,))
+    return next((row['tag'] for row in rows if tag_ref(row['tag']) == ref), None)
+
+NO_TAGS_CONDITION = "NOT EXISTS (SELECT 1 FROM note_tags t WHERE t.note_id = n.id)"
+UNTAGGED_EXISTS_SQL = f"SELECT 1 FROM notes n WHERE user_id = ? AND {NO_TAGS_CONDITION} LIMIT 1"
 
 @router.message(F.text == "/notes")
 @router.message(F.text == "📚 База знань")
 @router.message(F.text.lower().in_({"чек", "база", "нотатки", "записи", "архів", "картотека"}))
 async def show_tags(message: Message):
     chat_id = message.chat.id
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT tags FROM notes WHERE user_id = ?', (chat_id,))
-    rows = cursor.fetchall()
-    conn.close()
+    tag_rows = await db.fetch_all(
+        'SELECT tag, COUNT(*) AS cnt FROM note_tags WHERE chat_id = ? GROUP BY tag ORDER BY tag',
+        (chat_id,)
+    )
+    untagged = await db.fetch_one(UNTAGGED_EXISTS_SQL, (chat_id,))
 
-    if not rows:
+    if not tag_rows and not untagged:
         await message.answer("📭 База порожня.")
         return
 
-    all_tags = set()
-    has_untagged = False 
-
-    for row in rows:
-        tags_raw = row['tags']
-        if tags_raw:
-            # Обробка різних розділювачів (пробіл або кома)
-            if " " in tags_raw and "," not in tags_raw:
-                 for t in tags_raw.split(): 
-                     if t: all_tags.add(t.replace("#", ""))
-            else:
-                 for t in tags_raw.split(','):
-                    tag = t.strip()
-                    if tag: all_tags.add(tag.replace("#", ""))
-        else:
-            has_untagged = True
-
     buttons = []
-    sorted_tags = sorted(list(all_tags))
-    
     temp_row = []
-    for tag in sorted_tags:
-        if not tag: continue
-        temp_row.append(InlineKeyboardButton(text=f"📂 {tag}", callback_data=f"list_notes:{tag}"))
+    for row in tag_rows:
+        tag = row['tag']
+        temp_row.append(InlineKeyboardButton(text=f"📂 {tag} ({row['cnt']})", callback_data=f"list_notes:{tag_ref(tag)}:0"))
         if len(temp_row) == 2:
             buttons.append(temp_row)
             temp_row = []
     if temp_row:
         buttons.append(temp_row)
 
-    if has_untagged:
-        buttons.append([InlineKeyboardButton(text="📥 Інше (без тегів)", callback_data="list_notes:__empty__")])
+    if untagged:
+        buttons.append([InlineKeyboardButton(text="📥 Інше (без тегів)", callback_data="list_notes:__empty__:0")])
     
     buttons.append([InlineKeyboardButton(text="❌ Закрити меню", callback_data="delete_msg")])
 
     await message.answer("📚 <b>База знань чату.</b> Обери категорію:", reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons), parse_mode="HTML")
 
 
+NOTES_PAGE_SIZE = 8
+
+def split_cursor(rest: str):
+    """'<тег>:<курсор>' -> (тег, курсор). Без курсора (старі кнопки) — перша сторінка."""
+    tag_name, _, cursor = rest.rpartition(":")
+    if not tag_name or not cursor.lstrip("<").isdigit():
+        return rest, "0"
+    return tag_name, cursor
+
+def split_note_callback(data: str):
+    """'view_note:<id>:<тег>:<курсор>' -> (id, тег, курсор)."""
+    _, note_id, rest = data.split(":", 2)
+    return (note_id, *split_cursor(rest))
+
+async def fetch_notes_page(chat_id: int, tag_name: str, cursor: str):
+    """
+    Keyset-пагінація по notes.id: '<start>' — сторінка з id >= start,
+    '<<start>' — сторінка перед start. Один індексний запит на сторінку
+    (плюс проба LIMIT 1, чи є щось перед нею, коли йдемо вперед не з початку).
+    Повертає (rows, prev_cursor, next_cursor).
+    """
+    backward = cursor.startswith("<")
+    anchor = int(cursor.lstrip("<") or 0)
+
+    if tag_name == "__empty__":
+        base = 'SELECT n.id, n.content, n.media_type FROM notes n WHERE n.user_id = ? AND ' + NO_TAGS_CONDITION
+        params, key = (chat_id,), "n.id"
+    else:
+        base = '''
+            SELECT n.id, n.content, n.media_type
+            FROM note_tags t JOIN notes n ON n.id = t.note_id
+            WHERE t.chat_id = ? AND t.tag = ?
+        '''
+        params, key = (chat_id, tag_name), "t.note_id"
+
+    if backward:
+        sql = f"{base} AND {key} < ? ORDER BY {key} DESC LIMIT ?"
+    else:
+        sql = f"{base} AND {key} >= ? ORDER BY {key} LIMIT ?"
+    rows = await db.fetch_all(sql, (*params, anchor, NOTES_PAGE_SIZE + 1))
+
+    if backward:
+        if not rows:  # попереду нічого не лишилось — перша сторінка
+            return await fetch_notes_page(chat_id, tag_name, "0")
+        has_prev = len(rows) > NOTES_PAGE_SIZE
+        rows = list(reversed(rows[:NOTES_PAGE_SIZE]))
+        next_cursor = str(anchor)
+    else:
+        if not rows and anchor > 0:  # напр. видалили останню нотатку на сторінці
+            return await fetch_notes_page(chat_id, tag_name, f"<{anchor}")
+        # курсор вказує на id, а не на номер сторінки: чи є щось перед ним, видно лише з даних
+        has_prev = bool(rows) and anchor > 0 and await db.fetch_one(
+            f"{base} AND {key} < ? LIMIT 1", (*params, rows[0]['id'])
+        ) is not None
+        next_cursor = str(rows[NOTES_PAGE_SIZE]['id']) if len(rows) > NOTES_PAGE_SIZE else None
+        rows = rows[:NOTES_PAGE_SIZE]
+
+    prev_cursor = f"<{rows[0]['id']}" if rows and has_prev else None
+    return rows, prev_cursor, next_cursor
+
+
 @router.callback_query(F.data.startswith("list_notes:"))
 async def show_notes_list(callback: CallbackQuery):
-    tag_name = callback.data.split(":")[1]
+    ref, cursor = split_cursor(callback.data.split(":", 1)[1])
     chat_id = callback.message.chat.id
-    
-    conn = get_connection()
-    cursor = conn.cursor()
 
-    if tag_name == "__empty__":
-        cursor.execute('SELECT id, content, media_type FROM notes WHERE user_id = ? AND (tags = "" OR tags IS NULL)', (chat_id,))
-        header = "📥 <b>Без тегів:</b>"
-    else:
-        cursor.execute('SELECT id, content, media_type FROM notes WHERE user_id = ? AND tags LIKE ?', (chat_id, f'%#{tag_name}%'))
-        header = f"<b>📂 Категорія #{tag_name}:</b>"
+    tag_name = await resolve_tag(chat_id, ref)
+    if tag_name is None:
+        await callback.answer("Категорії вже немає.", show_alert=True)
+        return
 
-    rows = cursor.fetchall()
-    conn.close()
+    rows, prev_cursor, next_cursor = await fetch_notes_page(chat_id, tag_name, cursor)
+    header = "📥 <b>Без тегів:</b>" if tag_name == "__empty__" else f"<b>📂 Категорія #{tag_name}:</b>"
 
     if not rows:
         await callback.answer("Пусто...", show_alert=True)
         return
 
+    page_cursor = str(rows[0]['id'])
     buttons = []
     for row in rows:
         note_id = row['id']
@@ -311,7 +362,15 @@ async def show_notes_list(callback: CallbackQuery):
         icon = "🖼" if is_photo else "🔹"
         preview_text = note_content[:25].replace("\n", " ") + "..." if note_content else "Без опису"
         
-        buttons.append([InlineKeyboardButton(text=f"{icon} {preview_text}", callback_data=f"view_note:{note_id}:{tag_name}")])
+        buttons.append([InlineKeyboardButton(text=f"{icon} {preview_text}", callback_data=f"view_note:{note_id}:{ref}:{page_cursor}")])
+
+    nav = []
+    if prev_cursor:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"list_notes:{ref}:{prev_cursor}"))
+    if next_cursor:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"list_notes:{ref}:{next_cursor}"))
+    if nav:
+        buttons.append(nav)
 
     buttons.append([InlineKeyboardButton(text="🔙 Назад до категорій", callback_data="back_to_tags")])
 
@@ -331,20 +390,24 @@ async def show_notes_list(callback: CallbackQuery):
     await callback.answer()
 
 
+async def return_to_list(callback: CallbackQuery, tag_context: str, cursor: str):
+    """Повертає на ту саму сторінку списку, з якої відкрили нотатку (категорія або пошук)."""
+    if tag_context == FIND_CONTEXT:
+        await render_find_page(callback, int(cursor.lstrip("<")))
+    else:
+        new_callback = callback.model_copy(update={"data": f"list_notes:{tag_context}:{cursor}"})
+        await show_notes_list(new_callback)
+
+
 @router.callback_query(F.data.startswith("view_note:"))
 async def view_single_note(callback: CallbackQuery):
-    _, note_id, tag_context = callback.data.split(":")
-    
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT content, tags, file_id, media_type FROM notes WHERE id = ?', (note_id,))
-    row = cursor.fetchone()
-    conn.close()
+    note_id, tag_context, cursor = split_note_callback(callback.data)
+
+    row = await db.fetch_one('SELECT content, tags, file_id, media_type FROM notes WHERE id = ?', (note_id,))
 
     if not row:
         await callback.answer("Нотатка видалена.", show_alert=True)
-        new_callback = callback.model_copy(update={"data": f"list_notes:{tag_context}"})
-        await show_notes_list(new_callback)
+        await return_to_list(callback, tag_context, cursor)
         return
 
     full_text = row['content'] or "Без опису"
@@ -360,8 +423,9 @@ async def view_single_note(callback: CallbackQuery):
         buttons.append([InlineKeyboardButton(text="🔗 Відкрити посилання", url=found_url)])
 
     # 2. Стандартні кнопки
-    buttons.append([InlineKeyboardButton(text="🗑 Видалити", callback_data=f"del_note:{note_id}:{tag_context}")])
-    buttons.append([InlineKeyboardButton(text="🔙 Назад до списку", callback_data=f"list_notes:{tag_context}")])
+    buttons.append([InlineKeyboardButton(text="🗑 Видалити", callback_data=f"del_note:{note_id}:{tag_context}:{cursor}")])
+    back_data = f"find_back:{cursor}" if tag_context == FIND_CONTEXT else f"list_notes:{tag_context}:{cursor}"
+    buttons.append([InlineKeyboardButton(text="🔙 Назад до списку", callback_data=back_data)])
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -379,25 +443,19 @@ async def view_single_note(callback: CallbackQuery):
 
 @router.callback_query(F.data.startswith("del_note:"))
 async def delete_single_note(callback: CallbackQuery):
-    _, note_id, tag_context = callback.data.split(":")
+    note_id, tag_context, cursor = split_note_callback(callback.data)
     user_id = callback.from_user.id
     chat_id = callback.message.chat.id
-    member = await callback.message.chat.get_member(user_id)
 
-    if not check_permissions(user_id, chat_id, member.status):
+    if not await permissions.can_manage_notes(callback.bot, chat_id, user_id):
         await callback.answer("⛔️ Немає прав!", show_alert=True)
         return
 
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM notes WHERE id = ?', (note_id,))
-    conn.commit()
-    conn.close()
+    await db.execute('DELETE FROM notes WHERE id = ?', (note_id,))
 
     await callback.answer("✅ Видалено!", show_alert=True)
-    
-    new_callback = callback.model_copy(update={"data": f"list_notes:{tag_context}"})
-    await show_notes_list(new_callback)
+
+    await return_to_list(callback, tag_context, cursor)
 
 @router.callback_query(F.data == "back_to_tags")
 async def back_to_tags_handler(callback: CallbackQuery):
@@ -406,4 +464,98 @@ async def back_to_tags_handler(callback: CallbackQuery):
 
 @router.callback_query(F.data == "delete_msg")
 async def delete_msg_handler(callback: CallbackQuery):
-    await callback.message.delete()
\ No newline at end of file
+    await callback.message.delete()
+
+
+# --- 7. ПОВНОТЕКСТОВИЙ ПОШУК (FTS5) ---
+FIND_CONTEXT = "__find__"
+FIND_PAGE_SIZE = 5
+_HL_START, _HL_END = "\x02", "\x03"
+
+# Запит живе поза FSM, під ключем (chat_id, user_id): state.clear() після збереження нотатки
+# не має ламати пошук. Номер сторінки їде в callback_data.
+_find_queries = TTLCache(maxsize=256, ttl=86400)
+
+def build_fts_query(text: str) -> str:
+    """Перетворює довільний ввід на безпечний FTS5-запит: кожне слово — префіксний пошук."""
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{w}"*' for w in words)
+
+async def search_notes(chat_id: int, query: str, offset: int = 0, limit: int = FIND_PAGE_SIZE):
+    """Ранжований (bm25) пошук по вмісту і тегах нотаток чату."""
+    fts_query = build_fts_query(query)
+    if not fts_query:
+        return []
+    return await db.fetch_all(f'''
+        SELECT n.id, n.media_type,
+               snippet(notes_fts, 0, '{_HL_START}', '{_HL_END}', '…', 12) AS snip,
+               n.tags
+        FROM notes_fts
+        JOIN notes n ON n.id = notes_fts.rowid
+        WHERE notes_fts MATCH ? AND n.user_id = ?
+        ORDER BY notes_fts.rank
+        LIMIT ? OFFSET ?
+    ''', (fts_query, chat_id, limit, offset))
+
+def format_snippet(snip: str) -> str:
+    text = html.escape((snip or "").replace("\n", " "))
+    return text.replace(_HL_START, "<b>").replace(_HL_END, "</b>")
+
+async def render_find_page(callback: CallbackQuery, page: int):
+    query = _find_queries.get((callback.message.chat.id, callback.from_user.id))
+    if not query:
+        await callback.answer("Пошук застарів, повтори /find", show_alert=True)
+        return
+
+    text, kb = await build_find_page(callback.message.chat.id, query, page)
+    if callback.message.photo:
+        await callback.message.delete()
+        await callback.message.answer(text, reply_markup=kb, parse_mode="HTML")
+    else:
+        await callback.message.edit_text(text, reply_markup=kb, parse_mode="HTML")
+
+async def build_find_page(chat_id: int, query: str, page: int):
+    # Беремо на один рядок більше — так знаємо, чи є наступна сторінка без COUNT(*)
+    rows = await search_notes(chat_id, query, page * FIND_PAGE_SIZE, FIND_PAGE_SIZE + 1)
+    has_next = len(rows) > FIND_PAGE_SIZE
+    rows = rows[:FIND_PAGE_SIZE]
+
+    if not rows:
+        return f"🔎 За запитом <b>{html.escape(query)}</b> нічого не знайдено.", None
+
+    lines = [f"🔎 <b>Пошук:</b> {html.escape(query)} <i>(стор. {page + 1})</i>\n"]
+    buttons = []
+    for i, row in enumerate(rows, start=page * FIND_PAGE_SIZE + 1):
+        icon = "🖼" if row['media_type'] == 'photo' else "🔹"
+        lines.append(f"{icon} <b>{i}.</b> {format_snippet(row['snip'])}")
+        buttons.append(InlineKeyboardButton(text=f"{icon} {i}", callback_data=f"view_note:{row['id']}:{FIND_CONTEXT}:{page}"))
+
+    keyboard = [buttons[j:j + FIND_PAGE_SIZE] for j in range(0, len(buttons), FIND_PAGE_SIZE)]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"find_page:{page - 1}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"find_page:{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([InlineKeyboardButton(text="❌ Закрити", callback_data="delete_msg")])
+
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@router.message(Command("find"))
+async def cmd_find(message: Message, command: CommandObject):
+    if not command.args:
+        await message.answer("🔎 Використання: <code>/find слово або фраза</code>", parse_mode="HTML")
+        return
+
+    query = command.args.strip()
+    _find_queries.set((message.chat.id, message.from_user.id), query)
+    text, kb = await build_find_page(message.chat.id, query, 0)
+    await message.answer(text, reply_markup=kb, parse_mode="HTML")
+
+@router.callback_query(F.data.startswith("find_page:"))
+@router.callback_query(F.data.startswith("find_back"))
+async def find_page_handler(callback: CallbackQuery):
+    # "find_back" без сторінки — кнопки, надіслані до того, як сторінка переїхала в callback_data
+    await render_find_page(callback, int(callback.data.partition(":")[2] or 0))
+    await callback.answer()
@@ -1,12 +1,14 @@
+import html
 import logging
 from aiogram import Bot, Router, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from config import OWNER_ID
 from datetime import datetime
 from services.calendar_api import check_upcoming_events
 from services.weather_api import get_weather_forecast
 from services.news_api import get_fresh_news
 from services.fitness import get_today_workout
+from services import permissions
 from utils.filters import IsOwner
 
 router = Router()
@@ -36,7 +38,7 @@ async def cmd_briefing(message: types.Message, bot: Bot):
                 logging.error(f"Weekly weather error: {e}")
 
         # 2. КАЛЕНДАР
-        events_text = check_upcoming_events(OWNER_ID)
+        events_text = await check_upcoming_events(OWNER_ID)
         if events_text:
             parts.append(f"📅 <b>Нагадування:</b>\n{events_text}")
         
@@ -68,3 +70,43 @@ async def cmd_briefing(message: types.Message, bot: Bot):
     except Exception as e:
         logging.error(f"Briefing command error: {e}")
         await message.answer(f"❌ Помилка при генерації: {e}")
+
+# --- ДОВІРА ЧАТІВ (доступ до нотаток) ---
+@router.message(Command("trust"))
+async def cmd_trust(message: types.Message, command: CommandObject):
+    args = (command.args or "").split()
+    levels_help = "\n".join(f"<code>{k}</code> — {v}" for k, v in permissions.TRUST_LEVELS.items())
+
+    if not args:
+        level = await permissions.get_trust_level(message.chat.id)
+        return await message.answer(
+            f"🔐 Цей чат: <b>{permissions.TRUST_LEVELS[level]}</b>\n\n"
+            f"Змінити: <code>/trust рівень</code> або <code>/trust chat_id рівень</code>\n{levels_help}"
+        )
+
+    if len(args) == 1:
+        chat_id, level, title = message.chat.id, args[0], message.chat.title
+    else:
+        try:
+            chat_id = int(args[0])
+        except ValueError:
+            return await message.answer("⚠️ chat_id має бути числом.")
+        level, title = args[1], None
+
+    if level not in permissions.TRUST_LEVELS:
+        return await message.answer(f"⚠️ Невідомий рівень.\n{levels_help}")
+
+    await permissions.set_trust_level(chat_id, level, title)
+    await message.answer(f"✅ Чат <code>{chat_id}</code>: {permissions.TRUST_LEVELS[level]}")
+
+@router.message(Command("trusts"))
+async def cmd_trust_list(message: types.Message):
+    chats = await permissions.list_trusted_chats()
+    if not chats:
+        return await message.answer("🔐 Налаштувань довіри ще немає (всі чати — гості).")
+
+    lines = ["🔐 <b>Довіра чатів:</b>"]
+    for chat in chats:
+        title = html.escape(chat['title']) if chat['title'] else "—"
+        lines.append(f"<code>{chat['chat_id']}</code> {title}: {permissions.TRUST_LEVELS.get(chat['trust_level'], chat['trust_level'])}")
+    await message.answer("\n".join(lines))
@@ -1,4 +1,5 @@
 import asyncio
+import html
 import logging
 import os
 import sqlite3
@@ -11,12 +12,13 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from config import LOG_FILE, OWNER_ID, TOKEN
 from handlers import common, hardware, lifestyle, navigation, notes, owner, public
-from services import termux_api as hardware_service
+from services import atb_catalog, http_client, metrics, pm2_client, price_parser
 from services.calendar_api import check_upcoming_events
-from services.db_manager import backup_database, init_db
+from services.db_manager import backup_database, close_pool, init_db, start_pool
 from services.fitness import get_hydration_reminder, get_today_workout
-from services.news_api import get_fresh_news
-from services.weather_api import get_weather_forecast, get_weekly_forecast
+from services.news_api import NEWS_POLL_MINUTES, get_fresh_news, poll_news_feeds
+from services.weather_api import collect_weather_alerts, get_weather_forecast, get_weekly_forecast
+from utils.cache import TTLCache
 from utils.logger import setup_logging
 
 
@@ -27,7 +29,7 @@ async def scheduled_reporter(bot: Bot):
         now = datetime.now()
         if now.hour in target_hours and now.minute == 0:
             try:
-                report = hardware_service.get_full_system_report()
+                report = await metrics.get_status_report()
                 await bot.send_message(OWNER_ID, report)
                 await asyncio.sleep(65)
             except Exception as e:
@@ -49,7 +51,7 @@ async def morning_briefing(bot: Bot):
                     await bot.send_message(OWNER_ID, weekly_weather)
                 
                 # 1. КАЛЕНДАР
-                events_text = check_upcoming_events(OWNER_ID)
+                events_text = await check_upcoming_events(OWNER_ID)
                 if events_text:
                     parts.append(f"📅 <b>Нагадування:</b>\n{events_text}")
                 
@@ -93,6 +95,63 @@ async def send_water_alert(bot: Bot):
     except Exception as e:
         logging.error(f"Water error: {e}")
 
+# --- ПОГОДНІ СПОВІЩЕННЯ (кожні 30 хв) ---
+WEATHER_ALERT_COOLDOWN = {"rain": 3 * 3600, "frost": 12 * 3600}
+_sent_weather_alerts = TTLCache(maxsize=1024, ttl=3 * 3600)
+
+async def weather_watch(bot: Bot):
+    try:
+        alerts = await collect_weather_alerts()
+    except Exception as e:
+        logging.error(f"Weather watch error: {e}")
+        return
+
+    for user_id, rule_id, text in alerts:
+        key = (user_id, rule_id)
+        if key in _sent_weather_alerts:
+            continue
+        _sent_weather_alerts.set(key, True, ttl=WEATHER_ALERT_COOLDOWN.get(rule_id))
+        try:
+            await bot.send_message(user_id, text)
+        except Exception as e:
+            logging.error(f"Weather alert to {user_id} failed: {e}")
+
+# --- КАТАЛОГ АТБ ТА ЗДЕШЕВЛЕННЯ (кожні 6 год) ---
+async def price_watch(bot: Bot):
+    try:
+        await atb_catalog.crawl_catalog()
+        drops = await atb_catalog.collect_price_drops()
+    except Exception as e:
+        logging.error(f"Price watch error: {e}")
+        return
+
+    for user_id, product in drops:
+        text = (
+            f"📉 <b>Здешевлення в АТБ!</b>\n"
+            f"{html.escape(product['name'])}: <s>{product['last_price']:.2f}</s> → <b>{product['price']:.2f} грн</b>"
+        )
+        try:
+            await bot.send_message(user_id, text)
+        except Exception as e:
+            logging.error(f"Price alert to {user_id} failed: {e}")
+
+# --- ЗБОЇ PM2 (push із pub.sock демона) ---
+PM2_ALERT_COOLDOWN = 10 * 60
+_sent_pm2_alerts = TTLCache(maxsize=256, ttl=PM2_ALERT_COOLDOWN)
+
+async def pm2_watch(bot: Bot):
+    async def notify(text: str):
+        # процес у crash-loop шле exit кожні кілька секунд — одне сповіщення на cooldown
+        if text in _sent_pm2_alerts:
+            return
+        _sent_pm2_alerts.set(text, True)
+        try:
+            await bot.send_message(OWNER_ID, text)
+        except Exception as e:
+            logging.error(f"PM2 alert failed: {e}")
+
+    await pm2_client.watch_events(notify)
+
 async def main():
     try: os.system('termux-wake-lock')
     except: pass
@@ -100,6 +159,8 @@ async def main():
     init_db()
     backup_database()
     setup_logging(LOG_FILE)
+    await start_pool()
+    await http_client.start_session()
     
     bot = Bot(
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
@@ -117,6 +178,10 @@ async def main():
 
     asyncio.create_task(scheduled_reporter(bot))
     asyncio.create_task(morning_briefing(bot))
+    asyncio.create_task(poll_news_feeds())
+    asyncio.create_task(price_parser.warm_up())
+    asyncio.create_task(metrics.run_sampler())
+    asyncio.create_task(pm2_watch(bot))
 
     scheduler = AsyncIOScheduler(timezone="Europe/Kyiv")
     scheduler.add_job(
@@ -125,19 +190,40 @@ async def main():
         args=[bot],
         hour='12,13,14,15,16,17,18,19,20,21,22,23,0'
     )
+    scheduler.add_job(
+        weather_watch,
+        'interval',
+        args=[bot],
+        minutes=30
+    )
+    scheduler.add_job(
+        poll_news_feeds,
+        'interval',
+        minutes=NEWS_POLL_MINUTES
+    )
+    scheduler.add_job(
+        price_watch,
+        'interval',
+        args=[bot],
+        hours=atb_catalog.CRAWL_HOURS
+    )
     scheduler.start()
 
     await on_startup(bot)
     await bot.delete_webhook(drop_pending_updates=True)
 
-    while True:
-        try:
-            await dp.start_polling(bot, skip_updates=True)
-        except Exception as e:
-            with open("crash_history.log", "a") as f:
-                f.write(f"[{datetime.now()}] Polling Crash: {str(e)}\n")
-            logging.error(f"Critical polling error: {e}")
-            await asyncio.sleep(15)
+    try:
+        while True:
+            try:
+                await dp.start_polling(bot, skip_updates=True)
+            except Exception as e:
+                with open("crash_history.log", "a") as f:
+                    f.write(f"[{datetime.now()}] Polling Crash: {str(e)}\n")
+                logging.error(f"Critical polling error: {e}")
+                await asyncio.sleep(15)
+    finally:
+        await http_client.close_session()
+        await close_pool()
 
 if __name__ == "__main__":
     try:
@@ -1,8 +1,17 @@
 # Jeeves_bot/services
 from . import calendar_api
+from . import feed_parser
 from . import news_api
+from . import pm2_client
+from . import log_search
+from . import sys_probes
 from . import termux_api
+from . import metrics
 from . import weather_api
 from . import db_manager
+from . import html_extract
 from . import price_parser
-from . import fitness
\ No newline at end of file
+from . import atb_catalog
+from . import fitness
+from . import permissions
+from . import http_client
@@ -0,0 +1,253 @@
+# services/atb_catalog.py
+"""
+Локальний каталог АТБ (маг. 1158): фоновий обхід категорій, історія цін,
+нечіткий пошук по триграмах назв і список стеження зі сповіщеннями про здешевлення.
+/price відповідає з індексу, сайт смикається лише коли в індексі порожньо.
+"""
+import asyncio
+import logging
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+from config import ATB_CATEGORIES
+from services import db_manager as db
+from services.price_parser import AtbChallenge, AtbError, fetch_category_async, search_products_async
+
+CRAWL_HOURS = 6
+CATEGORY_PAGES = 10         # максимум сторінок на категорію за прохід
+CRAWL_DELAY_SEC = 3         # пауза між сторінками, щоб не дратувати антибот
+WATCH_REFRESH_LIMIT = 20    # скільки товарів зі стеження дошукувати поштучно за прохід
+MIN_COVERAGE = 0.5          # яка частка триграм запиту має збігтися з назвою
+SEARCH_LIMIT = 10
+
+_WORD_RE = re.compile(r'\w+')
+
+def _trigrams(text: str) -> set:
+    """Триграми кожного слова з пробілами по краях: 'хліб' -> ' хл', 'хлі', 'ліб', 'іб '."""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def _upsert_products(conn, products: List[dict]) -> int:
+    """Оновлює товари; історія цін пишеться лише при зміні ціни. Повертає к-сть змін ціни."""
+    changes = 0
+    for p in products:
+        row = conn.execute('SELECT id, name, price FROM products WHERE sku = ?', (p["sku"],)).fetchone()
+        grams = _trigrams(p["name"])
+
+        if row is None:
+            product_id = conn.execute('''
+                INSERT INTO products (sku, name, url, price, on_sale, trigram_count)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (p["sku"], p["name"], p["url"], p["price"], int(p["on_sale"]), len(grams))).lastrowid
+        else:
+            product_id = row['id']
+            conn.execute('''
+                UPDATE products
+                SET name = ?, url = ?, price = ?, on_sale = ?, trigram_count = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (p["name"], p["url"], p["price"], int(p["on_sale"]), len(grams), product_id))
+            if row['name'] != p["name"]:
+                conn.execute('DELETE FROM product_trigrams WHERE product_id = ?', (product_id,))
+            elif row['price'] == p["price"]:
+                continue
+
+        if row is None or row['name'] != p["name"]:
+            conn.executemany(
+                'INSERT OR IGNORE INTO product_trigrams (trigram, product_id) VALUES (?, ?)',
+                [(gram, product_id) for gram in grams]
+            )
+        if row is None or row['price'] != p["price"]:
+            conn.execute('INSERT INTO price_history (product_id, price) VALUES (?, ?)', (product_id, p["price"]))
+            changes += 1
+    return changes
+
+async def index_products(products: List[dict]) -> int:
+    if not products:
+        return 0
+    return await db.run_write(_upsert_products, products)
+
+async def search_catalog(query: str, limit: int = SEARCH_LIMIT) -> List[dict]:
+    """
+    Нечіткий пошук: кандидати — товари з найбільшою к-стю спільних триграм,
+    далі ранжування за покриттям запиту, потім за схожістю (Жаккар) з назвою.
+    """
+    grams = _trigrams(query)
+    if not grams:
+        return []
+    placeholders = ", ".join("?" for _ in grams)
+    rows = await db.fetch_all(f'''
+        SELECT p.id, p.name, p.url, p.price, p.on_sale, p.trigram_count, p.updated_at, COUNT(*) AS hits
+        FROM product_trigrams t
+        JOIN products p ON p.id = t.product_id
+        WHERE t.trigram IN ({placeholders})
+        GROUP BY p.id
+        ORDER BY hits DESC
+        LIMIT 200
+    ''', tuple(grams))
+
+    scored = []
+    for row in rows:
+        coverage = row['hits'] / len(grams)
+        if coverage < MIN_COVERAGE:
+            continue
+        similarity = row['hits'] / (len(grams) + row['trigram_count'] - row['hits'])
+        scored.append((coverage, similarity, dict(row)))
+    scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+    return [product for _, _, product in scored[:limit]]
+
+# --- СПИСОК ПОКУПОК ---
+SHOPPING_LIST_MAX = 30
+# "2x молоко", "молоко х2", "хліб × 3" (кирилична х лише окремим символом, щоб не з'їсти "2 хліб")
+_QTY_PREFIX_RE = re.compile(r'^(\d{1,3})\s*[xх×*](?=\s)\s*(.+)$', re.IGNORECASE)
+_QTY_SUFFIX_RE = re.compile(r'^(.+?)\s+[xх×*]\s*(\d{1,3})$', re.IGNORECASE)
+
+class ShoppingLine(NamedTuple):
+    query: str
+    quantity: int
+    product: Optional[dict]
+    error: Optional[str] = None
+
+def parse_shopping_list(text: str) -> List[Tuple[str, int]]:
+    """Рядок = позиція; маркери списку відкидаються, кількість — через x/×/*."""
+    items = []
+    for raw in text.splitlines():
+        line = raw.strip().lstrip("-•·").strip()
+        if not line:
+            continue
+        quantity = 1
+        match = _QTY_PREFIX_RE.match(line)
+        if match:
+            quantity, line = int(match.group(1)), match.group(2)
+        else:
+            match = _QTY_SUFFIX_RE.match(line)
+            if match:
+                line, quantity = match.group(1), int(match.group(2))
+        items.append((line.strip(), max(quantity, 1)))
+    return items[:SHOPPING_LIST_MAX]
+
+async def find_best_match(query: str) -> Optional[dict]:
+    """Найкращий збіг з індексу; якщо там порожньо — живий пошук, який поповнює індекс."""
+    products = await search_catalog(query, limit=5)
+    if not products:
+        await index_products(await search_products_async(query))
+        products = await search_catalog(query, limit=5)
+    in_stock = [p for p in products if p["price"] is not None]
+    return (in_stock or products or [None])[0]
+
+async def lookup_shopping_list(items: List[Tuple[str, int]]) -> List[ShoppingLine]:
+    """
+    Усі позиції паралельно: з індексу миттєво, решта — живими запитами через
+    спільний пул сесій і ліміт частоти. Однакові запити виконуються один раз.
+    """
+    unique = list(dict.fromkeys(query.lower() for query, _ in items))
+    found = await asyncio.gather(*(find_best_match(query) for query in unique), return_exceptions=True)
+    by_query = dict(zip(unique, found))
+
+    lines = []
+    for query, quantity in items:
+        result = by_query[query.lower()]
+        if isinstance(result, Exception):
+            error = str(result) if isinstance(result, AtbError) else "помилка пошуку"
+            if not isinstance(result, AtbError):
+                logging.warning(f"Shopping list '{query}': {result}")
+            lines.append(ShoppingLine(query, quantity, None, error))
+        else:
+            lines.append(ShoppingLine(query, quantity, result))
+    return lines
+
+# --- СПИСОК СТЕЖЕННЯ ---
+
+async def add_watch(user_id: int, product_id: int) -> bool:
+    result = await db.execute('''
+        INSERT OR IGNORE INTO price_watch (user_id, product_id, last_price)
+        SELECT ?, id, price FROM products WHERE id = ?
+    ''', (user_id, product_id))
+    return result.rowcount > 0
+
+async def remove_watch(user_id: int, product_id: int) -> bool:
+    result = await db.execute(
+        'DELETE FROM price_watch WHERE user_id = ? AND product_id = ?', (user_id, product_id)
+    )
+    return result.rowcount > 0
+
+async def list_watch(user_id: int) -> List[dict]:
+    rows = await db.fetch_all('''
+        SELECT p.id, p.name, p.url, p.price, p.on_sale, w.last_price
+        FROM price_watch w
+        JOIN products p ON p.id = w.product_id
+        WHERE w.user_id = ?
+        ORDER BY p.name
+    ''', (user_id,))
+    return [dict(row) for row in rows]
+
+def _take_price_changes(conn) -> list:
+    rows = conn.execute('''
+        SELECT w.user_id, p.id, p.name, w.last_price, p.price
+        FROM price_watch w
+        JOIN products p ON p.id = w.product_id
+        WHERE p.price IS NOT NULL AND (w.last_price IS NULL OR p.price != w.last_price)
+    ''').fetchall()
+    conn.executemany(
+        'UPDATE price_watch SET last_price = ? WHERE user_id = ? AND product_id = ?',
+        [(row['price'], row['user_id'], row['id']) for row in rows]
+    )
+    return [dict(row) for row in rows]
+
+async def collect_price_drops() -> List[Tuple[int, dict]]:
+    """Фіксує нові ціни в списку стеження; повертає (user_id, товар) лише для здешевлень."""
+    changes = await db.run_write(_take_price_changes)
+    return [
+        (row['user_id'], row) for row in changes
+        if row['last_price'] is not None and row['price'] < row['last_price']
+    ]
+
+# --- ФОНОВИЙ ОБХІД ---
+
+async def crawl_catalog(categories: List[str] = None) -> int:
+    """Обходить категорії, потім дошукує застарілі товари зі стеження. Повертає к-сть змін ціни."""
+    categories = ATB_CATEGORIES if categories is None else categories
+    changes = 0
+    try:
+        for path in categories:
+            for page in range(1, CATEGORY_PAGES + 1):
+                try:
+                    products = await fetch_category_async(path, page)
+                except AtbChallenge:
+                    raise
+                except AtbError as e:
+                    # сторінка за межами категорії (404 тощо) — категорія скінчилась
+                    logging.info(f"ATB crawl {path}: stop at p{page} ({e})")
+                    break
+                except Exception as e:
+                    logging.warning(f"ATB crawl {path} p{page}: {e}")
+                    break
+                if not products:
+                    break
+                changes += await index_products(products)
+                await asyncio.sleep(CRAWL_DELAY_SEC)
+
+        stale = await db.fetch_all('''
+            SELECT DISTINCT p.name FROM price_watch w
+            JOIN products p ON p.id = w.product_id
+            WHERE p.updated_at < datetime('now', ?)
+            LIMIT ?
+        ''', (f"-{CRAWL_HOURS} hours", WATCH_REFRESH_LIMIT))
+        for row in stale:
+            try:
+                products = await search_products_async(row['name'])
+            except AtbChallenge:
+                raise
+            except Exception as e:
+                logging.warning(f"ATB refresh '{row['name']}': {e}")
+                continue
+            changes += await index_products(products)
+            await asyncio.sleep(CRAWL_DELAY_SEC)
+    except AtbChallenge as e:
+        # Антибот: решту пройдемо наступного разу, поки сесія оновлюється
+        logging.warning(f"ATB crawl stopped: {e}")
+
+    logging.info(f"🛒 ATB crawl: {changes} price changes")
+    return changes
@@ -1,180 +1,271 @@
 # services/calendar_api.py
-import sqlite3
+import csv
 import html
-from datetime import datetime
+import io
+import itertools
+import logging
+import re
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import BinaryIO, Iterable, NamedTuple
 from config import OWNER_ID
+from services import db_manager as db
+from utils.helpers import next_occurrence, parse_day_month
 
-DB_PATH = "data/jeeves_database.db"
+FILTER_DAYS = {"today": 0, "week": 7, "month": 31}
 
-def get_user_events(user_id: int):
+def _row_to_event(row) -> dict:
+    return {"id": row["id"], "date": row["event_date"], "text": row["event_text"], "link": row["link"]}
+
+async def get_user_events(user_id: int):
     """Отримує всі події користувача з SQLite."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT id, event_date, event_text, link FROM calendar WHERE user_id = ?", 
-                (user_id,)
-            )
-            rows = cursor.fetchall()
-            
-            events = []
-            for row in rows:
-                events.append({
-                    "id": row[0],
-                    "date": row[1],
-                    "text": row[2],
-                    "link": row[3]
-                })
-            return events
+        rows = await db.fetch_all(
+            "SELECT id, event_date, event_text, link FROM calendar WHERE user_id = ?",
+            (user_id,)
+        )
+        return [_row_to_event(row) for row in rows]
     except Exception as e:
-        print(f"❌ DB Error (get_user_events): {e}")
+        logging.error(f"❌ DB Error (get_user_events): {e}")
         return []
 
-def add_new_event(user_id: int, date: str, name: str, raw_link: str = "-"):
+async def add_new_event(user_id: int, date: str, name: str, raw_link: str = "-"):
     """Додає подію в SQLite."""
     link = None
     if raw_link and raw_link != "-":
         link = raw_link.strip()
-        
+
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO calendar (user_id, event_date, event_text, link) VALUES (?, ?, ?, ?)",
-                (user_id, date, name, link)
-            )
-            conn.commit()
-            return {"id": cursor.lastrowid, "date": date, "text": name, "link": link}
+        res = await db.execute(
+            "INSERT INTO calendar (user_id, event_date, event_text, link, month_day) VALUES (?, ?, ?, ?, ?)",
+            (user_id, date, name, link, parse_day_month(date))
+        )
+        return {"id": res.lastrowid, "date": date, "text": name, "link": link}
     except Exception as e:
-        print(f"❌ DB Error (add_new_event): {e}")
+        logging.error(f"❌ DB Error (add_new_event): {e}")
         return None
 
-def delete_event(user_id: int, query: str) -> str:
+async def delete_event(user_id: int, query: str) -> str:
     """Видаляє події."""
     query = query.lower().strip()
     deleted_events = []
-    
-    all_events = get_user_events(user_id)
+
+    all_events = await get_user_events(user_id)
     ids_to_delete = []
-    
+
     for e in all_events:
         if e['date'] == query or query in e['text'].lower():
             ids_to_delete.append(e['id'])
             deleted_events.append(f"{e['date']} ({e['text']})")
-    
+
     if not ids_to_delete:
         return "🤷‍♂️ Нічого не знайдено."
-    
+
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            placeholders = ', '.join('?' for _ in ids_to_delete)
-            sql = f"DELETE FROM calendar WHERE id IN ({placeholders}) AND user_id = ?"
-            params = ids_to_delete + [user_id]
-            cursor.execute(sql, params)
-            conn.commit()
-            
+        placeholders = ', '.join('?' for _ in ids_to_delete)
+        sql = f"DELETE FROM calendar WHERE id IN ({placeholders}) AND user_id = ?"
+        await db.execute(sql, ids_to_delete + [user_id])
+
         return f"✅ Видалено {len(deleted_events)} подій:\n" + "\n".join(deleted_events)
     except Exception as e:
         return f"❌ Помилка видалення: {e}"
 
-def update_event_text(user_id: int, evt_id: int, new_text: str):
+async def update_event_text(user_id: int, evt_id: int, new_text: str):
     """Оновлює текст події."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE calendar SET event_text = ? WHERE id = ? AND user_id = ?",
-                (new_text, evt_id, user_id)
-            )
-            conn.commit()
-            return cursor.rowcount > 0
+        res = await db.execute(
+            "UPDATE calendar SET event_text = ? WHERE id = ? AND user_id = ?",
+            (new_text, evt_id, user_id)
+        )
+        return res.rowcount > 0
     except Exception as e:
-        print(f"❌ DB Error (update): {e}")
+        logging.error(f"❌ DB Error (update): {e}")
         return False
 
-def mass_import_events(user_id: int, text_block: str):
-    """Масовий імпорт."""
-    lines = text_block.strip().split('\n')
-    count = 0
-    
+# --- МАСОВИЙ ІМПОРТ ---
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+INSERT_EVENT_SQL = "INSERT INTO calendar (user_id, event_date, event_text, link, month_day) VALUES (?, ?, ?, ?, ?)"
+
+class ImportReport(NamedTuple):
+    imported: int
+    skipped: int
+    invalid: int
+
+def _parse_text_lines(lines: Iterable[str]):
+    """Рядки виду '14.02 День Валентина'. None — нерозпізнаний рядок."""
+    for line in lines:
+        parts = line.strip().split(maxsplit=1)
+        if not parts: continue
+        if len(parts) < 2:
+            yield None
+            continue
+        yield parts[0], parts[1], None
+
+def _parse_csv_lines(lines: Iterable[str]):
+    """CSV: дата, назва[, посилання]. Роздільник (',' або ';') визначається по першому рядку."""
+    lines = iter(lines)
+    first = next(lines, "")
+    delimiter = ";" if first.count(";") > first.count(",") else ","
+    for i, row in enumerate(csv.reader(itertools.chain([first], lines), delimiter=delimiter)):
+        cells = [c.strip() for c in row]
+        if not any(cells): continue
+        # Заголовок (date,text,...) не рахуємо як помилку
+        if i == 0 and parse_day_month(cells[0]) is None: continue
+        if len(cells) < 2:
+            yield None
+            continue
+        yield cells[0], cells[1], (cells[2] if len(cells) > 2 and cells[2] else None)
+
+def _unfold_ics(lines: Iterable[str]):
+    """RFC 5545: рядок, що починається з пробілу/табу, продовжує попередній."""
+    buf = None
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and buf is not None:
+            buf += line[1:]
+            continue
+        if buf is not None:
+            yield buf
+        buf = line
+    if buf is not None:
+        yield buf
+
+def _parse_ics_lines(lines: Iterable[str]):
+    """VEVENT -> (DD.MM з DTSTART, SUMMARY, URL). Події вважаються щорічними."""
+    in_event = False
+    dt = summary = url = None
+    for line in _unfold_ics(lines):
+        name, _, value = line.partition(":")
+        key = name.split(";")[0].upper()
+        if key == "BEGIN" and value.upper() == "VEVENT":
+            in_event, dt, summary, url = True, None, None, None
+        elif key == "END" and value.upper() == "VEVENT":
+            in_event = False
+            yield (dt, summary, url) if dt and summary else None
+        elif in_event and key == "DTSTART":
+            m = re.match(r"\d{4}(\d{2})(\d{2})", value)
+            dt = f"{m.group(2)}.{m.group(1)}" if m else None
+        elif in_event and key == "SUMMARY":
+            summary = value.replace("\\n", " ").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+        elif in_event and key == "URL":
+            url = value
+
+IMPORT_PARSERS = {
+    ".txt": _parse_text_lines,
+    ".csv": _parse_csv_lines,
+    ".ics": _parse_ics_lines,
+}
+
+def _store_events(conn, user_id: int, records) -> ImportReport:
+    """Валідує, відсіює дублікати і пише пачками executemany — все в одній транзакції писаря."""
+    existing = {
+        (row["month_day"], row["event_text"])
+        for row in conn.execute("SELECT month_day, event_text FROM calendar WHERE user_id = ?", (user_id,))
+    }
+    imported = skipped = invalid = 0
+    batch = []
+    for rec in records:
+        if rec is None:
+            invalid += 1
+            continue
+        raw_date, text, link = rec
+        md = parse_day_month(raw_date)
+        text = (text or "").strip()
+        if md is None or not text:
+            invalid += 1
+            continue
+        if (md, text) in existing:
+            skipped += 1
+            continue
+        existing.add((md, text))
+        batch.append((user_id, f"{md % 100:02d}.{md // 100:02d}", text, link, md))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            conn.executemany(INSERT_EVENT_SQL, batch)
+            imported += len(batch)
+            batch.clear()
+    if batch:
+        conn.executemany(INSERT_EVENT_SQL, batch)
+        imported += len(batch)
+    return ImportReport(imported, skipped, invalid)
+
+def is_supported_import(filename: str) -> bool:
+    return Path(filename or "").suffix.lower() in IMPORT_PARSERS
+
+async def mass_import_events(user_id: int, text_block: str) -> ImportReport:
+    """Масовий імпорт з вставленого тексту."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            for line in lines:
-                parts = line.strip().split(maxsplit=1)
-                if len(parts) < 2 or "." not in parts[0]: continue
-                
-                cursor.execute(
-                    "INSERT INTO calendar (user_id, event_date, event_text, link) VALUES (?, ?, ?, ?)",
-                    (user_id, parts[0], parts[1], None)
-                )
-                count += 1
-            conn.commit()
+        return await db.run_write(_store_events, user_id, _parse_text_lines(text_block.splitlines()))
     except Exception as e:
-        print(f"❌ DB Error (import): {e}")
-    
-    return count
+        logging.error(f"❌ DB Error (import): {e}")
+        return ImportReport(0, 0, 0)
 
+async def import_events_file(user_id: int, filename: str, stream: BinaryIO) -> ImportReport:
+    """Імпорт з файлу (.txt/.csv/.ics). Файл читається порядково, не цілком у рядок."""
+    parser = IMPORT_PARSERS[Path(filename).suffix.lower()]
+    lines = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline="")
+    try:
+        return await db.run_write(_store_events, user_id, parser(lines))
+    except Exception as e:
+        logging.error(f"❌ DB Error (file import): {e}")
+        return ImportReport(0, 0, 0)
 
-def get_events(user_id: int, filter_type: str):
-    events = get_user_events(user_id)
-    if not events: return []
 
-    def sort_key(e):
-        try:
-            d, m = map(int, e['date'].split('.'))
-            return m, d
-        except: return 13, 32
+async def events_between(user_id: int, start: date, end: date):
+    """
+    Щорічні події, що припадають на [start, end], у порядку настання.
+    Перехід через Новий рік (напр. 28.12 → 04.01) обробляється в SQL по індексу month_day.
+    """
+    if (end - start).days >= 365:
+        return await get_events(user_id, "all")
 
-    events.sort(key=sort_key)
+    s_md = start.month * 100 + start.day
+    e_md = end.month * 100 + end.day
+    if s_md <= e_md:
+        where, params = "month_day BETWEEN ? AND ?", (s_md, e_md)
+    else:
+        where, params = "(month_day >= ? OR month_day <= ?)", (s_md, e_md)
 
+    rows = await db.fetch_all(f"""
+        SELECT id, event_date, event_text, link, month_day FROM calendar
+        WHERE user_id = ? AND {where}
+        ORDER BY month_day < ?, month_day
+    """, (user_id, *params, s_md))
+
+    events = []
+    for row in rows:
+        event = _row_to_event(row)
+        event["when"] = next_occurrence(row["month_day"], start)
+        events.append(event)
+    return events
+
+async def get_events(user_id: int, filter_type: str):
     if filter_type == "all":
-        return events
+        try:
+            rows = await db.fetch_all(
+                "SELECT id, event_date, event_text, link FROM calendar WHERE user_id = ? "
+                "ORDER BY month_day IS NULL, month_day",
+                (user_id,)
+            )
+            return [_row_to_event(row) for row in rows]
+        except Exception as e:
+            logging.error(f"❌ DB Error (get_events): {e}")
+            return []
 
-    filtered = []
+    days = FILTER_DAYS.get(filter_type)
+    if days is None:
+        return []
     today = datetime.now().date()
+    return await events_between(user_id, today, today + timedelta(days=days))
 
-    for event in events:
-        try: d, m = map(int, event['date'].split('.'))
-        except: continue
-
-        try: evt_date_this_year = datetime(today.year, m, d).date()
-        except ValueError: continue 
-
-        if evt_date_this_year < today:
-             evt_date_next = datetime(today.year + 1, m, d).date()
-             delta = (evt_date_next - today).days
-        else:
-             delta = (evt_date_this_year - today).days
-
-        if filter_type == "today" and delta == 0:
-            filtered.append(event)
-        elif filter_type == "week" and 0 <= delta <= 7:
-            filtered.append(event)
-        elif filter_type == "month" and 0 <= delta <= 31:
-            filtered.append(event)
-    
-    if filter_type in ['week', 'month']:
-        def delta_sort(e):
-            d, m = map(int, e['date'].split('.'))
-            try:
-                dt = datetime(today.year, m, d).date()
-                if dt < today: dt = datetime(today.year + 1, m, d).date()
-                return (dt - today).days
-            except: return 999
-        filtered.sort(key=delta_sort)
-
-    return filtered
-
-def get_event_by_id(user_id: int, evt_id: int):
+async def get_event_by_id(user_id: int, evt_id: int):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, event_date, event_text, link FROM calendar WHERE id = ? AND user_id = ?", (evt_id, user_id))
-            row = cursor.fetchone()
-            if row:
-                return {"id": row[0], "date": row[1], "text": row[2], "link": row[3]}
+        row = await db.fetch_one(
+            "SELECT id, event_date, event_text, link FROM calendar WHERE id = ? AND user_id = ?",
+            (evt_id, user_id)
+        )
+        if row:
+            return _row_to_event(row)
     except: pass
     return None
 
@@ -194,32 +285,24 @@ def decode_event_to_string(event):
         return f'<a href="{event["link"]}">{txt}</a>'
     return txt
 
-def check_upcoming_events(user_id: int = OWNER_ID) -> str:
-    events = get_user_events(user_id)
+async def check_upcoming_events(user_id: int = OWNER_ID) -> str:
+    today = datetime.now().date()
+    events = await events_between(user_id, today, today + timedelta(days=7))
     if not events: return None
-    
-    today = datetime.now()
+
     list_today, list_tomorrow, list_week = [], [], []
-    
+
     for event in events:
-        try: d, m = map(int, event['date'].split('.'))
-        except: continue
-        try: evt_date = datetime(today.year, m, d)
-        except: continue
-        
-        if evt_date.date() < today.date():
-             evt_date = datetime(today.year + 1, m, d)
-             
-        delta = (evt_date.date() - today.date()).days
+        delta = (event["when"] - today).days
         link_text = decode_event_to_string(event)
-        
+
         if delta == 0: list_today.append(link_text)
         elif delta == 1: list_tomorrow.append(link_text)
         elif 2 <= delta <= 7: list_week.append(f"{event['date']} - {link_text}")
-            
+
     parts = []
     if list_today: parts.append(f"🔥 <b>СЬОГОДНІ:</b>\n" + "\n".join([f"• {x}" for x in list_today]))
     if list_tomorrow: parts.append(f"⚠️ <b>Завтра:</b>\n" + "\n".join([f"• {x}" for x in list_tomorrow]))
     if list_week: parts.append(f"👀 <b>На тижні:</b>\n" + "\n".join([f"• {x}" for x in list_week]))
-        
-    return "\n\n".join(parts) if parts else None
\ No newline at end of file
+
+    return "\n\n".join(parts) if parts else None
@@ -1,29 +1,222 @@
+import asyncio
 import glob
 import logging
 import os
-import shutil
+import queue
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional
+
+from utils.helpers import parse_day_month, parse_tags
 
 # --- ШЛЯХИ ---
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 DB_NAME = "jeeves.db"
 DB_PATH = DATA_DIR / DB_NAME
+LEGACY_DB_PATH = DATA_DIR / "jeeves_database.db"
 BACKUP_DIR = BASE_DIR / "backups"
 MAX_BACKUPS = 7
 
-def get_connection():
+# --- ПУЛ З'ЄДНАНЬ ---
+READER_POOL_SIZE = 2
+BUSY_TIMEOUT_SEC = 5
+
+def get_connection(readonly: bool = False):
     """Створює підключення до БД з підтримкою словникового виводу"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_SEC, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
     return conn
 
+
+class WriteResult(NamedTuple):
+    lastrowid: Optional[int]
+    rowcount: int
+
+
+class ConnectionPool:
+    """
+    Довгоживучі WAL-з'єднання: кілька читачів у власному пулі потоків
+    і один писар, через якого послідовно проходять усі записи.
+    Event loop лише чекає на future і не блокується диском.
+    """
+
+    def __init__(self, readers: int = READER_POOL_SIZE):
+        self._size = readers
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-read")
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        self._writer_conn: Optional[sqlite3.Connection] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._writer_conn = await loop.run_in_executor(self._write_executor, get_connection)
+        for _ in range(self._size):
+            conn = await loop.run_in_executor(self._read_executor, get_connection, True)
+            self._readers.put(conn)
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer_loop(), name="db-writer")
+        logging.info(f"🗄 DB pool started ({self._size} readers + 1 writer, WAL)")
+
+    async def close(self):
+        if self._writer_task:
+            await self._write_queue.put(None)
+            await self._writer_task
+            self._writer_task = None
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        if self._writer_conn:
+            self._writer_conn.close()
+            self._writer_conn = None
+        self._read_executor.shutdown(wait=False)
+        self._write_executor.shutdown(wait=False)
+
+    # --- ЧИТАННЯ ---
+    def _run_read(self, fn: Callable, args: tuple):
+        conn = self._readers.get()
+        try:
+            return fn(conn, *args)
+        finally:
+            self._readers.put(conn)
+
+    async def read(self, fn: Callable[..., Any], *args):
+        """Виконує fn(conn, *args) на одному з читачів."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, self._run_read, fn, args)
+
+    # --- ЗАПИС ---
+    def _run_write(self, fn: Callable, args: tuple):
+        with self._writer_conn:  # commit або rollback
+            return fn(self._writer_conn, *args)
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._write_queue.get()
+            if job is None:
+                break
+            fn, args, fut = job
+            try:
+                result = await loop.run_in_executor(self._write_executor, self._run_write, fn, args)
+            except Exception as e:
+                if not fut.done(): fut.set_exception(e)
+            else:
+                if not fut.done(): fut.set_result(result)
+
+    async def write(self, fn: Callable[..., Any], *args):
+        """Ставить fn(conn, *args) у чергу писаря; виконується в одній транзакції."""
+        fut = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((fn, args, fut))
+        return await fut
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+async def start_pool() -> ConnectionPool:
+    """Запускає пул (викликається з main). Повторний виклик повертає існуючий."""
+    global _pool, _pool_lock
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            pool = ConnectionPool()
+            await pool.start()
+            _pool = pool
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+async def _get_pool() -> ConnectionPool:
+    return _pool if _pool is not None else await start_pool()
+
+# --- ПУБЛІЧНЕ API ---
+async def run_read(fn: Callable[..., Any], *args):
+    return await (await _get_pool()).read(fn, *args)
+
+async def run_write(fn: Callable[..., Any], *args):
+    return await (await _get_pool()).write(fn, *args)
+
+async def fetch_one(sql: str, params: Iterable = ()) -> Optional[sqlite3.Row]:
+    return await run_read(lambda conn: conn.execute(sql, tuple(params)).fetchone())
+
+async def fetch_all(sql: str, params: Iterable = ()) -> List[sqlite3.Row]:
+    return await run_read(lambda conn: conn.execute(sql, tuple(params)).fetchall())
+
+async def execute(sql: str, params: Iterable = ()) -> WriteResult:
+    def _op(conn):
+        cur = conn.execute(sql, tuple(params))
+        return WriteResult(cur.lastrowid, cur.rowcount)
+    return await run_write(_op)
+
+async def execute_many(sql: str, seq_of_params: Iterable[Iterable]) -> int:
+    def _op(conn):
+        return conn.executemany(sql, seq_of_params).rowcount
+    return await run_write(_op)
+
+# --- СХЕМА ---
+def _ensure_column(cursor, table: str, column: str, decl: str):
+    """Додає колонку, якщо її ще немає (легка міграція для старих баз)."""
+    cols = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def _migrate_legacy_calendar(conn):
+    """Переносить події зі старого файлу data/jeeves_database.db (одноразово)."""
+    if not LEGACY_DB_PATH.exists():
+        return
+    if conn.execute("SELECT 1 FROM calendar LIMIT 1").fetchone():
+        return
+    try:
+        conn.execute("ATTACH DATABASE ? AS legacy", (str(LEGACY_DB_PATH),))
+        has_table = conn.execute(
+            "SELECT 1 FROM legacy.sqlite_master WHERE type='table' AND name='calendar'"
+        ).fetchone()
+        if has_table:
+            conn.execute('''
+                INSERT INTO calendar (user_id, event_date, event_text, link, created_at)
+                SELECT user_id, event_date, event_text, link, created_at FROM legacy.calendar
+            ''')
+            conn.commit()
+            logging.info("📦 Календар перенесено зі старої бази jeeves_database.db")
+        conn.execute("DETACH DATABASE legacy")
+    except sqlite3.Error as e:
+        logging.error(f"Legacy calendar migration failed: {e}")
+
+def _backfill_month_day(conn):
+    """Заповнює calendar.month_day для подій, доданих до появи колонки."""
+    rows = conn.execute("SELECT id, event_date FROM calendar WHERE month_day IS NULL").fetchall()
+    updates = [(md, row["id"]) for row in rows if (md := parse_day_month(row["event_date"])) is not None]
+    if updates:
+        conn.executemany("UPDATE calendar SET month_day = ? WHERE id = ?", updates)
+        conn.commit()
+        logging.info(f"📅 month_day backfilled for {len(updates)} events")
+
+def _backfill_note_tags(cursor):
+    """Одноразово заповнює note_tags з рядкових тегів уже збережених нотаток."""
+    rows = cursor.execute("SELECT id, user_id, tags FROM notes WHERE tags IS NOT NULL AND tags != ''").fetchall()
+    cursor.executemany(
+        "INSERT OR IGNORE INTO note_tags (note_id, chat_id, tag) VALUES (?, ?, ?)",
+        ((row["id"], row["user_id"], tag) for row in rows for tag in parse_tags(row["tags"]))
+    )
+    logging.info(f"🏷 note_tags backfilled from {len(rows)} notes")
+
 def init_db():
     """Ініціалізація таблиць (викликається при старті бота)"""
     os.makedirs(DATA_DIR, exist_ok=True)
-    
+
     conn = get_connection()
     cursor = conn.cursor()
 
@@ -48,6 +241,9 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # Нормалізований ключ MMDD для діапазонних запитів (сьогодні/тиждень/місяць)
+    _ensure_column(cursor, "calendar", "month_day", "INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_calendar_user_md ON calendar(user_id, month_day)")
 
     # 3. Таблиця нотатника
     cursor.execute('''
@@ -60,8 +256,56 @@ def init_db():
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    _ensure_column(cursor, "notes", "file_id", "TEXT")
+    _ensure_column(cursor, "notes", "media_type", "TEXT")
+
+    # 3.1 Повнотекстовий індекс нотаток (FTS5, синхронізується тригерами)
+    fts_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='notes_fts'"
+    ).fetchone()
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            content, tags,
+            content='notes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 0'
+        )
+    ''')
+    cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts(rowid, content, tags) VALUES (new.id, new.content, new.tags);
+        END;
+        CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, content, tags) VALUES ('delete', old.id, old.content, old.tags);
+        END;
+        CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF content, tags ON notes BEGIN
+            INSERT INTO notes_fts(notes_fts, rowid, content, tags) VALUES ('delete', old.id, old.content, old.tags);
+            INSERT INTO notes_fts(rowid, content, tags) VALUES (new.id, new.content, new.tags);
+        END;
+    ''')
+    if not fts_exists:
+        cursor.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
 
-    # 4. Weather settings 
+    # 3.2 Нормалізований індекс тегів (одна пара нотатка-тег на рядок)
+    tags_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='note_tags'"
+    ).fetchone()
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS note_tags (
+            note_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (note_id, tag)
+        );
+        CREATE INDEX IF NOT EXISTS idx_note_tags_chat_tag ON note_tags(chat_id, tag, note_id);
+        CREATE INDEX IF NOT EXISTS idx_notes_user ON notes(user_id, id);
+        CREATE TRIGGER IF NOT EXISTS note_tags_ad AFTER DELETE ON notes BEGIN
+            DELETE FROM note_tags WHERE note_id = old.id;
+        END;
+    ''')
+    if not tags_exists:
+        _backfill_note_tags(cursor)
+
+    # 4. Weather settings
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS user_weather (
             user_id INTEGER PRIMARY KEY,
@@ -70,8 +314,136 @@ def init_db():
             lon REAL
         )
     ''')
+    _ensure_column(cursor, "user_weather", "alerts_enabled", "INTEGER DEFAULT 0")
+
+    # 4.1 Кеш геокодингу (нормалізований запит -> JSON зі збігами)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            query_key TEXT PRIMARY KEY,
+            results TEXT NOT NULL,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 4.2 RSS: валідатори умовного GET і вже розібрані записи фідів
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feed_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            entries TEXT NOT NULL DEFAULT '[]',
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 4.3 Стрічка новин, яку наповнює фоновий полер, і що кому вже показано
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS news_items (
+            item_id TEXT PRIMARY KEY,
+            feed_url TEXT NOT NULL,
+            title TEXT,
+            link TEXT,
+            source TEXT,
+            published_at TIMESTAMP,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_seen_at TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_news_items_feed ON news_items(feed_url, fetched_at);
+        CREATE TABLE IF NOT EXISTS news_seen (
+            user_id INTEGER NOT NULL,
+            item_id TEXT NOT NULL,
+            seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, item_id)
+        );
+    ''')
+
+    # коли запис востаннє був у фіді — за цим чиститься news_items (старі бази)
+    _ensure_column(cursor, 'news_items', 'last_seen_at', 'TIMESTAMP')
+
+    # 4.4 Статистика опитування фідів (латентність, помилки, наступне опитування)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS feed_stats (
+            url TEXT PRIMARY KEY,
+            ok_count INTEGER DEFAULT 0,
+            error_count INTEGER DEFAULT 0,
+            fail_streak INTEGER DEFAULT 0,
+            avg_latency REAL,
+            last_error TEXT,
+            next_fetch_at REAL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 4.5 Персональні підписки на RSS (без підписок — загальні RSS_FEEDS)
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS feed_subscriptions (
+            user_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, url)
+        );
+        CREATE INDEX IF NOT EXISTS idx_feed_subscriptions_url ON feed_subscriptions(url);
+    ''')
+
+    # 5. Рівні довіри чатів (доступ до нотаток)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_trust (
+            chat_id INTEGER PRIMARY KEY,
+            trust_level TEXT NOT NULL DEFAULT 'guest'
+                CHECK (trust_level IN ('guest', 'admins_only', 'all')),
+            title TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 6. Локальний каталог АТБ: товари, історія цін, триграмний індекс назв, список стеження
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sku TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            url TEXT,
+            price REAL,
+            on_sale INTEGER DEFAULT 0,
+            trigram_count INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS price_history (
+            product_id INTEGER NOT NULL,
+            price REAL,
+            seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history(product_id, seen_at);
+        CREATE TABLE IF NOT EXISTS product_trigrams (
+            trigram TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            PRIMARY KEY (trigram, product_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS price_watch (
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            last_price REAL,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, product_id)
+        );
+    ''')
+
+    # 7. Згортки метрик телефону (min/avg/max за 15 хв)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metric_rollups (
+            metric TEXT NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            min_value REAL,
+            avg_value REAL,
+            max_value REAL,
+            samples INTEGER,
+            PRIMARY KEY (metric, bucket_start)
+        )
+    ''')
 
     conn.commit()
+    _migrate_legacy_calendar(conn)
+    _backfill_month_day(conn)
     conn.close()
     logging.info("✅ База даних перевірена/ініціалізована.")
 
@@ -87,7 +459,14 @@ def backup_database():
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         backup_name = BACKUP_DIR / f"jeeves_backup_{timestamp}.db"
 
-        shutil.copy2(DB_PATH, backup_name)
+        # Online backup API: у WAL-режимі простий copy2 може загубити свіжі записи з -wal
+        src = get_connection(readonly=True)
+        dst = sqlite3.connect(backup_name)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
         logging.info(f"✅ Database backup created: {backup_name}")
 
         list_of_backups = glob.glob(str(BACKUP_DIR / "*.db"))
@@ -97,7 +476,7 @@ def backup_database():
             oldest_file = list_of_backups.pop(0)
             os.remove(oldest_file)
             logging.info(f"🗑 Rotated old backup: {oldest_file}")
-            
+
         return True, str(backup_name)
 
     except Exception as e:
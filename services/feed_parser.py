@@ -0,0 +1,121 @@
+# services/feed_parser.py
+"""
+Потоковий парсер RSS 2.0 / Atom, який зупиняється після перших N записів.
+feedparser розбирає і санітизує весь документ навіть тоді, коли потрібні лише
+кілька свіжих записів; тут XML подається шматками і читання обривається одразу,
+щойно набрано ліміт. Для всього нестандартного (RSS 1.0/RDF, битий XML,
+HTML-сутності, екзотичні кодування) повертається None — і викликач іде у feedparser.
+"""
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+CHUNK_SIZE = 16 * 1024
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'   # UTC, як published_parsed у feedparser
+
+_TAG_RE = re.compile(r'<[^>]+>')
+
+def _local(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+def _clean(text: Optional[str]) -> str:
+    return _TAG_RE.sub('', text or '').strip()
+
+def _title(elem: Optional[ET.Element]) -> str:
+    return _clean("".join(elem.itertext())) if elem is not None else ''
+
+def _utc(dt: Optional[datetime]) -> Optional[str]:
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime(TIME_FORMAT)
+
+def _rfc822(value: Optional[str]) -> Optional[str]:
+    try:
+        return _utc(parsedate_to_datetime(value.strip())) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def _iso8601(value: Optional[str]) -> Optional[str]:
+    try:
+        return _utc(datetime.fromisoformat(value.strip().replace('Z', '+00:00'))) if value else None
+    except ValueError:
+        return None
+
+def _read_rss_item(elem: ET.Element) -> dict:
+    link = (elem.findtext('link') or '').strip()
+    return {
+        "title": _title(elem.find('title')) or 'Без назви',
+        "link": link,
+        "guid": (elem.findtext('guid') or '').strip() or link,
+        "published": _rfc822(elem.findtext('pubDate')),
+    }
+
+def _read_atom_entry(elem: ET.Element) -> dict:
+    link = ''
+    for node in elem.findall(ATOM_NS + 'link'):
+        if node.get('rel', 'alternate') == 'alternate':
+            link = node.get('href', '')
+            break
+    return {
+        "title": _title(elem.find(ATOM_NS + 'title')) or 'Без назви',
+        "link": link,
+        "guid": (elem.findtext(ATOM_NS + 'id') or '').strip() or link,
+        "published": _iso8601(elem.findtext(ATOM_NS + 'published') or elem.findtext(ATOM_NS + 'updated')),
+    }
+
+# корінь документа -> (контейнер заголовка джерела, тег запису, читач запису)
+_FORMATS = {
+    "rss": ("channel", "item", _read_rss_item),
+    ATOM_NS + "feed": (ATOM_NS + "feed", ATOM_NS + "entry", _read_atom_entry),
+}
+
+def parse_top_entries(body: bytes, limit: int, chunk_size: int = CHUNK_SIZE) -> Optional[List[dict]]:
+    """
+    Перші limit записів фіда у форматі news_api (title, link, guid, source, published).
+    None — формат не розпізнано або XML битий; тоді потрібен feedparser.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    fmt = None
+    stack = []
+    source_title = None
+    entries = []
+
+    try:
+        for offset in range(0, len(body), chunk_size):
+            parser.feed(body[offset:offset + chunk_size])
+            for event, elem in parser.read_events():
+                if event == "start":
+                    if fmt is None:
+                        fmt = _FORMATS.get(elem.tag)
+                        if fmt is None:
+                            return None
+                    stack.append(elem.tag)
+                    continue
+
+                stack.pop()
+                container, item_tag, read_item = fmt
+                if elem.tag == item_tag:
+                    entries.append(read_item(elem))
+                    elem.clear()
+                    if len(entries) >= limit:
+                        break
+                elif source_title is None and _local(elem.tag) == "title" and stack and stack[-1] == container:
+                    source_title = _title(elem)
+            if len(entries) >= limit:
+                break
+        else:
+            parser.close()
+    except ET.ParseError:
+        return None
+
+    if fmt is None:
+        return None
+    for entry in entries:
+        entry["source"] = source_title or 'Джерело'
+    return entries
+
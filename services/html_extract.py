@@ -0,0 +1,137 @@
+# services/html_extract.py
+"""
+Швидке витягування карток товарів зі сторінок atbmarket.com.
+Замість повного DOM (BeautifulSoup) — потоковий токенізатор зі stdlib: стан
+ведеться лише всередині піддерев .catalog-item, все інше тільки пролітає повз.
+Перевірка на капчу — один регекс по сирому HTML і лише коли карток немає.
+Слово "captcha" саме по собі не ознака: recaptcha-скрипт є на кожній сторінці.
+"""
+import re
+from html.parser import HTMLParser
+from typing import List, Optional
+from urllib.parse import urljoin, urlsplit
+
+ITEM_CLASS = "catalog-item"
+# клас елемента всередині картки -> поле, куди збирається його текст
+FIELD_CLASSES = {
+    "catalog-item__title": "title",
+    "product-price__top": "price_top",
+    "product-price__bottom": "price_bottom",
+    "product-price__value": "price_value",
+}
+SALE_CLASS = "product-price__sale"
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# ознаки сторінки-перевірки Cloudflare (спільні з price_parser._is_challenge) або видимої форми капчі
+CHALLENGE_MARKERS = ("just a moment", "cf-chl")
+_CAPTCHA_RE = re.compile(
+    "|".join([*map(re.escape, CHALLENGE_MARKERS), r'<form\b[^>]*captcha']), re.IGNORECASE
+)
+_DIGITS_RE = re.compile(r'[^\d]')
+_DECIMAL_RE = re.compile(r'\d+[.,]\d+')
+
+class _LimitReached(Exception):
+    pass
+
+class _CatalogParser(HTMLParser):
+    def __init__(self, limit: Optional[int]):
+        super().__init__(convert_charrefs=True)
+        self.limit = limit
+        self.items: List[dict] = []
+        self._item = None       # поточна картка
+        self._stack = []        # (тег, поле) відкритих елементів усередині картки
+
+    def handle_starttag(self, tag, attrs):
+        classes = None
+        href = None
+        for name, value in attrs:
+            if name == "class" and value:
+                classes = value.split()
+            elif name == "href":
+                href = value
+
+        if self._item is None:
+            if classes and ITEM_CLASS in classes and tag not in VOID_TAGS:
+                self._item = {"title": [], "price_top": [], "price_bottom": [], "price_value": [],
+                              "href": None, "title_href": None, "on_sale": False}
+                self._stack = [(tag, None)]
+            return
+
+        field = None
+        if classes:
+            if SALE_CLASS in classes:
+                self._item["on_sale"] = True
+            for cls in classes:
+                if cls in FIELD_CLASSES:
+                    field = FIELD_CLASSES[cls]
+                    break
+        if tag == "a" and href:
+            if field == "title" or any(f == "title" for _, f in self._stack):
+                self._item["title_href"] = self._item["title_href"] or href
+            self._item["href"] = self._item["href"] or href
+        if tag not in VOID_TAGS:
+            self._stack.append((tag, field))
+
+    def handle_endtag(self, tag):
+        if self._item is None:
+            return
+        # Терпимо до незакритих тегів: знімаємо стек до найближчого однойменного
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+        else:
+            return
+        if not self._stack:
+            self._finish_item()
+
+    def handle_data(self, data):
+        if self._item is None:
+            return
+        for _, field in self._stack:
+            if field:
+                self._item[field].append(data)
+
+    def _finish_item(self):
+        item, self._item = self._item, None
+        self.items.append(item)
+        if self.limit and len(self.items) >= self.limit:
+            raise _LimitReached()
+
+def _parse_price(item: dict) -> Optional[float]:
+    if item["price_top"] and item["price_bottom"]:
+        p_m = _DIGITS_RE.sub('', "".join(item["price_top"]))
+        p_c = _DIGITS_RE.sub('', "".join(item["price_bottom"]))
+        return float(f"{p_m}.{p_c or 0}") if p_m else None
+    match = _DECIMAL_RE.search("".join(item["price_value"]))
+    return float(match.group().replace(',', '.')) if match else None
+
+def is_captcha(page: str) -> bool:
+    return _CAPTCHA_RE.search(page) is not None
+
+def extract_catalog_items(page: str, base_url: str, limit: int = None) -> List[dict]:
+    """Картки товарів: sku, name, url, price, on_sale. Без назви картка пропускається."""
+    parser = _CatalogParser(limit)
+    try:
+        parser.feed(page)
+        parser.close()
+    except _LimitReached:
+        pass
+
+    products = []
+    for item in parser.items:
+        name = " ".join("".join(item["title"]).split())
+        if not name:
+            continue
+        href = item["title_href"] or item["href"]
+        url = urljoin(base_url, href) if href else None
+        products.append({
+            # Шлях сторінки товару стабільний; без посилання — сама назва
+            "sku": urlsplit(url).path.rstrip('/') if url else name.lower(),
+            "name": name,
+            "url": url,
+            "price": _parse_price(item),
+            "on_sale": item["on_sale"],
+        })
+    return products
+
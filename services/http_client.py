@@ -0,0 +1,113 @@
+# services/http_client.py
+import asyncio
+import json
+import logging
+import random
+from typing import Any, Mapping, NamedTuple, Optional
+
+import aiohttp
+
+# --- НАЛАШТУВАННЯ ПУЛУ ---
+TOTAL_CONNECTIONS = 20
+CONNECTIONS_PER_HOST = 4
+DNS_CACHE_SEC = 600
+KEEPALIVE_SEC = 60
+DEFAULT_TIMEOUT_SEC = 15
+CONNECT_TIMEOUT_SEC = 5
+
+# --- ПОВТОРИ ---
+MAX_RETRIES = 2
+BACKOFF_BASE_SEC = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+USER_AGENT = "JeevesBot/1.0 (+https://github.com/Infomanser/Jeeves_Bot)"
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+    def text(self, encoding: str = "utf-8") -> str:
+        return self.body.decode(encoding, errors="replace")
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=TOTAL_CONNECTIONS,
+        limit_per_host=CONNECTIONS_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_SEC,
+        keepalive_timeout=KEEPALIVE_SEC,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=DEFAULT_TIMEOUT_SEC, connect=CONNECT_TIMEOUT_SEC),
+        headers={"User-Agent": USER_AGENT},
+    )
+
+async def start_session() -> aiohttp.ClientSession:
+    """Створює спільну сесію (викликається з main)."""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+        logging.info("🌐 HTTP session started (keep-alive pool)")
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+async def get_session() -> aiohttp.ClientSession:
+    return _session if _session is not None and not _session.closed else await start_session()
+
+def _retry_delay(attempt: int, headers: Optional[Mapping[str, str]] = None) -> float:
+    retry_after = (headers or {}).get("Retry-After", "")
+    if retry_after.isdigit():
+        return min(float(retry_after), 10.0)
+    return BACKOFF_BASE_SEC * (2 ** attempt) + random.uniform(0, BACKOFF_BASE_SEC)
+
+async def fetch(
+    url: str,
+    *,
+    method: str = "GET",
+    params: Optional[Mapping[str, Any]] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    timeout: Optional[float] = None,
+    retries: int = MAX_RETRIES,
+) -> HttpResponse:
+    """
+    HTTP-запит через спільну сесію. Повторює мережеві помилки та 429/5xx
+    з експоненційною затримкою; тіло читається повністю до виходу.
+    """
+    session = await get_session()
+    # Без явного timeout діє таймаут сесії; timeout=None у request вимкнув би його зовсім
+    request_kwargs = {"params": params, "headers": headers}
+    if timeout is not None:
+        request_kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout, connect=CONNECT_TIMEOUT_SEC)
+
+    for attempt in range(retries + 1):
+        try:
+            async with session.request(method, url, **request_kwargs) as resp:
+                body = await resp.read()
+                result = HttpResponse(resp.status, resp.headers, body)
+            if result.status not in RETRY_STATUSES or attempt == retries:
+                return result
+            delay = _retry_delay(attempt, result.headers)
+            logging.warning(f"HTTP {result.status} from {url}, retry in {delay:.1f}s")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == retries:
+                raise
+            delay = _retry_delay(attempt)
+            logging.warning(f"HTTP error for {url}: {e!r}, retry in {delay:.1f}s")
+        await asyncio.sleep(delay)
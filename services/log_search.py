@@ -0,0 +1,335 @@
+# services/log_search.py
+"""
+Пошук по логах без fork і без читання файлів цілком.
+Файли читаються з кінця блоками (tail), а для часових вікон є розріджений
+індекс "час -> зсув": раз на INDEX_STEP байт беремо перший рядок з міткою часу.
+Логи дописуються лише в кінець, тож індекс не перебудовується, а добудовується;
+після ротації (інший inode або файл став меншим) — будується наново.
+Запис = рядок з міткою часу + рядки без неї після нього (traceback).
+"""
+import asyncio
+import bisect
+import heapq
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from config import LOG_FILE
+from services.pm2_client import PM2_HOME
+
+PM2_LOG_DIR = PM2_HOME / "logs"
+PM2_APP_NAME = "Jeeves"         # процес самого бота — для кнопки "❌ Еrror log"
+
+BLOCK_SIZE = 64 * 1024
+INDEX_STEP = 256 * 1024         # крок індексу: ~4 точки на мегабайт логу
+INDEX_PROBE_LINES = 64          # скільки рядків після точки шукаємо мітку часу
+MAX_SCAN_BYTES = 64 * 1024 * 1024   # стеля роботи для запиту без часового вікна
+MAX_RECORD_LINES = 200          # довше без заголовка — це не traceback, а лог без міток часу
+MAX_RECORD_BYTES = 64 * 1024
+DEFAULT_LIMIT = 20
+
+# джерело -> (поточний файл, glob ротацій у тій самій теці)
+SOURCES = {
+    "app": (Path(LOG_FILE), f"{Path(LOG_FILE).name}.*"),
+}
+# джерела PM2 -> які потоки кожного процесу читати (<назва>-out.log / <назва>-error.log)
+PM2_SOURCES = {
+    "pm2": ("out", "error"),
+    "out": ("out",),
+    "err": ("error",),
+}
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "warn": 30, "error": 40, "critical": 50}
+DURATION_UNITS = {"m": 60, "хв": 60, "h": 3600, "год": 3600, "d": 86400, "д": 86400}
+
+# "2024-05-01 12:00:00,123 | ..." (logging) або "2024-05-01T12:00:00: ..." (pm2 --time)
+_TS_RE = re.compile(rb"^(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2}):(\d{2})")
+_LEVEL_RE = re.compile(rb"\| (DEBUG|INFO|WARNING|ERROR|CRITICAL) \|")
+_DURATION_RE = re.compile(r"^(\d+)(m|h|d|хв|год|д)$")
+
+class LogQuery(NamedTuple):
+    source: str = "app"
+    level: Optional[int] = None
+    since: Optional[float] = None   # epoch; None — без часового вікна
+    keyword: str = ""
+    limit: int = DEFAULT_LIMIT
+    app: Optional[str] = None       # процес PM2; None — усі процеси
+
+def pm2_apps() -> List[str]:
+    """Назви процесів, для яких PM2 веде логи (за активними файлами, без ротацій)."""
+    apps = set()
+    try:
+        names = os.listdir(PM2_LOG_DIR)
+    except OSError:
+        return []
+    for name in names:
+        for kind in ("out", "error"):
+            suffix = f"-{kind}.log"
+            if name.endswith(suffix) and len(name) > len(suffix):
+                apps.add(name[:-len(suffix)])
+    return sorted(apps)
+
+def parse_query(args: Optional[str], **defaults) -> LogQuery:
+    """`error 2h timeout` -> LogQuery. Порядок слів довільний, невідомі слова — ключове слово."""
+    query = LogQuery(**defaults)
+    apps = {app.lower(): app for app in pm2_apps()}
+    words = []
+    for word in (args or "").split():
+        lowered = word.lower()
+        duration = _DURATION_RE.match(lowered)
+        if lowered in SOURCES or lowered in PM2_SOURCES:
+            query = query._replace(source=lowered)
+        elif lowered in apps:
+            query = query._replace(app=apps[lowered])
+            if query.source not in PM2_SOURCES:
+                query = query._replace(source="pm2")
+        elif lowered in LEVELS:
+            query = query._replace(level=LEVELS[lowered])
+        elif duration:
+            seconds = int(duration.group(1)) * DURATION_UNITS[duration.group(2)]
+            query = query._replace(since=time.time() - seconds)
+        else:
+            words.append(word)
+    return query._replace(keyword=" ".join(words))
+
+def _parse_ts(line: bytes) -> Optional[float]:
+    match = _TS_RE.match(line)
+    if not match:
+        return None
+    try:
+        return datetime(*map(int, match.groups())).timestamp()
+    except ValueError:
+        return None
+
+def _line_level(line: bytes) -> Optional[int]:
+    match = _LEVEL_RE.search(line, 0, 160)
+    return LEVELS[match.group(1).decode().lower()] if match else None
+
+# --- ЧИТАННЯ З КІНЦЯ ---
+
+def reverse_lines(f, start: int, end: int, block: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """Рядки відрізка [start, end) від останнього до першого; в пам'яті лише один блок."""
+    pos = end
+    tail = b""
+    while pos > start:
+        size = min(block, pos - start)
+        pos -= size
+        f.seek(pos)
+        lines = (f.read(size) + tail).split(b"\n")
+        # можливо неповний рядок — доклеїться до наступного блоку; від гігантського
+        # рядка без \n тримаємо лише початок (там мітка часу)
+        tail = lines.pop(0)[:MAX_RECORD_BYTES]
+        yield from reversed(lines)
+    if tail:
+        yield tail
+
+def reverse_records(f, start: int, end: int) -> Iterator[Tuple[Optional[float], List[bytes]]]:
+    """(мітка часу, рядки запису) від найновішого; хвіст traceback чіпляється до свого заголовка.
+    Хвіст обмежений MAX_RECORD_LINES/MAX_RECORD_BYTES: найновіші рядки понад ліміт
+    віддаються окремими записами без мітки часу, тож пам'ять не залежить від розміру файлу."""
+    continuation = deque()      # від найновішого рядка до найстарішого
+    size = 0
+    for line in reverse_lines(f, start, end):
+        if not line.strip():
+            continue
+        ts = _parse_ts(line)
+        if ts is None:
+            continuation.append(line)
+            size += len(line)
+            while len(continuation) > MAX_RECORD_LINES or size > MAX_RECORD_BYTES:
+                orphan = continuation.popleft()
+                size -= len(orphan)
+                yield None, [orphan]
+            continue
+        continuation.append(line)
+        continuation.reverse()
+        yield ts, list(continuation)
+        continuation.clear()
+        size = 0
+    while continuation:   # початок файлу без мітки часу
+        yield None, [continuation.popleft()]
+
+# --- РОЗРІДЖЕНИЙ ІНДЕКС ---
+
+class _FileIndex:
+    __slots__ = ("inode", "size", "times", "offsets")
+
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.size = 0
+        self.times: List[float] = []
+        self.offsets: List[int] = []
+
+_indexes: Dict[str, _FileIndex] = {}
+
+def _probe(f, offset: int) -> Optional[Tuple[float, int]]:
+    """Перша мітка часу після offset (з початку рядка) і зсув її рядка."""
+    f.seek(offset)
+    if offset:
+        f.readline()    # дочитуємо рядок, у середину якого потрапили
+    pos = f.tell()
+    for _ in range(INDEX_PROBE_LINES):
+        line = f.readline()
+        if not line:
+            return None
+        ts = _parse_ts(line)
+        if ts is not None:
+            return ts, pos
+        pos += len(line)
+    return None
+
+def get_index(path: Path, f) -> _FileIndex:
+    st = os.fstat(f.fileno())
+    index = _indexes.get(str(path))
+    if index is None or index.inode != st.st_ino or st.st_size < index.size:
+        index = _indexes[str(path)] = _FileIndex(st.st_ino)
+
+    # добудовуємо точки лише для нового хвоста файлу
+    offset = (index.size // INDEX_STEP) * INDEX_STEP + (INDEX_STEP if index.size else 0)
+    while offset < st.st_size:
+        point = _probe(f, offset)
+        if point and (not index.offsets or point[1] > index.offsets[-1]):
+            index.times.append(point[0])
+            index.offsets.append(point[1])
+        offset += INDEX_STEP
+    index.size = st.st_size
+    return index
+
+def seek_time(index: _FileIndex, since: float) -> int:
+    """Зсув запису, не пізнішого за since: з нього реверсне читання можна зупинити."""
+    i = bisect.bisect_left(index.times, since)
+    return index.offsets[i - 1] if i else 0
+
+# --- ЗАПИТИ ---
+
+def source_files(current: Path, pattern: str) -> List[Path]:
+    """Поточний файл і ротації, від найновішого (імена ротацій сортуються за датою)."""
+    files = [current] if current.exists() else []
+    files += sorted(current.parent.glob(pattern), reverse=True)
+    return files
+
+def source_streams(query: LogQuery) -> List[Tuple[str, Path, str]]:
+    """(підпис, поточний файл, glob ротацій) для кожного потоку логів, який покриває запит."""
+    if query.source in SOURCES:
+        return [(query.source, *SOURCES[query.source])]
+    apps = [query.app] if query.app else pm2_apps()
+    return [
+        (app, PM2_LOG_DIR / f"{app}-{kind}.log", f"{app}-{kind}__*.log")
+        for app in apps for kind in PM2_SOURCES[query.source]
+    ]
+
+def _search_stream(files: List[Path], query: LogQuery, keyword: str, budget: int) -> List[Tuple[float, str]]:
+    """До query.limit записів одного потоку: (час для злиття, текст) у хронологічному порядку."""
+    found: List[Tuple[float, str]] = []
+    for path in files:
+        try:
+            mtime = os.path.getmtime(path)
+            if query.since and mtime < query.since:
+                break   # цей файл і всі старіші ротації — поза вікном
+            with open(path, "rb") as f:
+                end = os.fstat(f.fileno()).st_size
+                if query.since:
+                    start = seek_time(get_index(path, f), query.since)
+                else:
+                    start = max(0, end - budget)
+                    budget -= end - start
+
+                key = mtime     # записи без мітки часу стають поруч із новішим сусідом
+                for ts, lines in reverse_records(f, start, end):
+                    if ts is not None:
+                        if query.since and ts < query.since:
+                            break
+                        key = ts
+                    if query.level and (_line_level(lines[0]) or 0) < query.level:
+                        continue
+                    text = b"\n".join(lines).decode("utf-8", errors="replace")
+                    if keyword and keyword not in text.casefold():
+                        continue
+                    found.append((key, text))
+                    if len(found) >= query.limit:
+                        return found[::-1]
+        except OSError:
+            continue
+        if budget <= 0:
+            break
+    return found[::-1]
+
+def search(query: LogQuery) -> List[str]:
+    """Останні query.limit записів, що пройшли фільтри, у хронологічному порядку.
+    Потоки кількох процесів PM2 зливаються за часом, як у `pm2 logs`."""
+    for path in [p for p in _indexes if not os.path.exists(p)]:
+        del _indexes[path]   # ротацію видалено — індекс не потрібен
+
+    keyword = query.keyword.casefold()
+    streams = source_streams(query)
+    if not streams:
+        return []
+    budget = MAX_SCAN_BYTES // len(streams)
+    prefixed = query.source not in SOURCES and not query.app
+
+    results = []
+    for label, current, pattern in streams:
+        found = _search_stream(source_files(current, pattern), query, keyword, budget)
+        if prefixed:
+            found = [(key, f"{label} | {text}") for key, text in found]
+        results.append(found)
+    merged = list(heapq.merge(*results, key=itemgetter(0)))
+    return [text for _, text in merged[-query.limit:]]
+
+async def search_async(query: LogQuery) -> List[str]:
+    return await asyncio.get_running_loop().run_in_executor(None, search, query)
+
+def describe_query(query: LogQuery) -> str:
+    parts = [query.source]
+    if query.app:
+        parts.append(query.app)
+    if query.level:
+        parts.append(next(name.upper() for name, no in LEVELS.items() if no == query.level) + "+")
+    if query.since:
+        parts.append(f"з {datetime.fromtimestamp(query.since):%d.%m %H:%M}")
+    if query.keyword:
+        parts.append(f"«{query.keyword}»")
+    return ", ".join(parts)
+
+
+if __name__ == "__main__":
+    # Бенчмарк на синтетичному логу: python services/log_search.py
+    import tempfile
+    import timeit
+
+    path = Path(tempfile.mkdtemp()) / "bench.log"
+    lines = 400_000
+    t0 = time.time() - lines
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            level = "ERROR" if i % 997 == 0 else "INFO"
+            stamp = datetime.fromtimestamp(t0 + i).strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"{stamp},000 | {level} | root | request {i} handled in {i % 300} ms\n")
+            if level == "ERROR":
+                f.write("Traceback (most recent call last):\n  File \"x.py\", line 1\nValueError: boom\n")
+    SOURCES["bench"] = (path, "bench.log.*")
+    print(f"log: {path.stat().st_size / 1024 / 1024:.1f} MB, {lines} записів")
+
+    def _naive(since):
+        with open(path, encoding="utf-8") as f:
+            return [l for l in f.readlines() if "| ERROR |" in l and _parse_ts(l.encode()) >= since][-20:]
+
+    since = time.time() - 7200
+    cases = {
+        "tail 20": LogQuery("bench"),
+        "error 2h": LogQuery("bench", level=40, since=since),
+        "2h «handled in 299»": LogQuery("bench", since=since, keyword="handled in 299"),
+    }
+    with open(path, "rb") as f:
+        get_index(path, f)
+    for name, query in cases.items():
+        ms = timeit.timeit(lambda: search(query), number=20) / 20 * 1000
+        print(f"{name:<22} {ms:8.2f} ms  ({len(search(query))} записів)")
+    ms = timeit.timeit(lambda: _naive(since), number=3) / 3 * 1000
+    print(f"{'readlines + filter':<22} {ms:8.2f} ms")
+    print(f"індекс: {len(_indexes[str(path)].offsets)} точок")
@@ -0,0 +1,186 @@
+# services/metrics.py
+"""
+Фоновий збір метрик телефону для трендів у /status.
+Заміри лежать у кільцевих буферах на array('f') фіксованого розміру (жодних
+dict на замір), тож пам'ять не росте тижнями. Раз на ROLLUP_SEC кожна метрика
+згортається в min/avg/max і пишеться в metric_rollups.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from services import db_manager as db
+from services import pm2_client
+from services import sys_probes
+from services import termux_api
+
+SAMPLE_SEC = 60
+WINDOW_SEC = 4 * 3600           # скільки історії тримає кожен буфер
+SLOW_EVERY = 5                  # battery/pm2 — раз на 5 тіків (termux-battery-status і демон PM2 не смикаємо щохвилини)
+ROLLUP_SEC = 15 * 60
+ROLLUP_RETENTION_DAYS = 30
+MAX_PM2_PROCESSES = 16
+
+class RingBuffer:
+    """Кільцевий буфер float32 фіксованої місткості; pending — заміри з останньої згортки."""
+    __slots__ = ("_data", "_head", "count", "pending")
+
+    def __init__(self, size: int):
+        self._data = array('f', [math.nan]) * size
+        self._head = 0
+        self.count = 0
+        self.pending = 0
+
+    def append(self, value: float):
+        self._data[self._head] = value
+        self._head = (self._head + 1) % len(self._data)
+        self.count = min(self.count + 1, len(self._data))
+        self.pending = min(self.pending + 1, len(self._data))
+
+    def values(self, last: int = None) -> List[float]:
+        """Заміри від найстаршого до найновішого (або лише last останніх)."""
+        n = self.count if last is None else min(last, self.count)
+        start = (self._head - n) % len(self._data)
+        if start + n <= len(self._data):
+            return self._data[start:start + n].tolist()
+        return (self._data[start:] + self._data[:self._head]).tolist()
+
+    def latest(self) -> Optional[float]:
+        return self._data[self._head - 1] if self.count else None
+
+def summarize(values: List[float]) -> Optional[Tuple[float, float, float]]:
+    values = [v for v in values if v == v]
+    if not values:
+        return None
+    return min(values), sum(values) / len(values), max(values)
+
+# метрика -> (підпис, одиниця, знаків після коми, кожен який тік заміряти)
+METRICS = {
+    "ram": ("ОЗП", "%", 0, 1),
+    "disk": ("Диск", "%", 0, 1),
+    "load": ("LA", "", 2, 1),
+    "battery": ("Акум", "%", 0, SLOW_EVERY),
+    "temp": ("t°", "°C", 1, SLOW_EVERY),
+}
+
+_rings: Dict[str, RingBuffer] = {
+    name: RingBuffer(WINDOW_SEC // (SAMPLE_SEC * every)) for name, (_, _, _, every) in METRICS.items()
+}
+_pm2_rings: Dict[str, RingBuffer] = {}
+_PM2_RING_SIZE = WINDOW_SEC // (SAMPLE_SEC * SLOW_EVERY)
+
+def _sample_native():
+    try:
+        _rings["ram"].append(sys_probes.read_meminfo().percent)
+    except Exception:
+        pass
+    try:
+        _rings["disk"].append(sys_probes.read_disk().percent)
+    except Exception:
+        pass
+    try:
+        _rings["load"].append(sys_probes.read_loadavg().one)
+    except Exception:
+        pass
+
+async def _sample_battery():
+    try:
+        data = json.loads(await termux_api.run_command_async(["termux-battery-status"], 3))
+    except Exception:
+        return
+    _rings["battery"].append(float(data.get("percentage", math.nan)))
+    _rings["temp"].append(float(data.get("temperature", math.nan)))
+
+async def _sample_pm2():
+    try:
+        processes = await pm2_client.list_processes()
+    except Exception:
+        return
+    seen = set()
+    for proc in processes:
+        name = proc.get('name', 'N/A')
+        ring = _pm2_rings.get(name)
+        if ring is None:
+            if len(_pm2_rings) >= MAX_PM2_PROCESSES:
+                continue
+            ring = _pm2_rings[name] = RingBuffer(_PM2_RING_SIZE)
+        ring.append(proc.get('monit', {}).get('memory', 0) / 1024 / 1024)
+        seen.add(name)
+    # видалені з pm2 процеси не тримаємо вічно
+    for name in list(_pm2_rings):
+        if name not in seen:
+            del _pm2_rings[name]
+
+def _store_rollups(conn, bucket_start: int, rows: list):
+    conn.executemany('''
+        INSERT OR REPLACE INTO metric_rollups (metric, bucket_start, min_value, avg_value, max_value, samples)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(metric, bucket_start, *stats, samples) for metric, stats, samples in rows])
+    conn.execute(
+        'DELETE FROM metric_rollups WHERE bucket_start < ?',
+        (bucket_start - ROLLUP_RETENTION_DAYS * 86400,)
+    )
+
+async def _rollup(bucket_start: int):
+    rows = []
+    named = [*_rings.items(), *((f"pm2:{name}", ring) for name, ring in _pm2_rings.items())]
+    for metric, ring in named:
+        if not ring.pending:
+            continue
+        stats = summarize(ring.values(ring.pending))
+        if stats:
+            rows.append((metric, stats, ring.pending))
+        ring.pending = 0
+    if rows:
+        await db.run_write(_store_rollups, bucket_start, rows)
+
+async def run_sampler():
+    """Нескінченний цикл замірів; стартує з main поруч з іншими фоновими задачами."""
+    tick = 0
+    last_rollup = time.time()
+    while True:
+        try:
+            _sample_native()
+            if tick % SLOW_EVERY == 0:
+                await asyncio.gather(_sample_battery(), _sample_pm2())
+            now = time.time()
+            if now - last_rollup >= ROLLUP_SEC:
+                await _rollup(int(last_rollup))
+                last_rollup = now
+        except Exception as e:
+            logging.error(f"Metrics sampler error: {e}")
+        tick += 1
+        await asyncio.sleep(SAMPLE_SEC)
+
+def _trend_line(label: str, ring: RingBuffer, unit: str, digits: int = 0) -> Optional[str]:
+    values = ring.values()
+    stats = summarize(values)
+    if stats is None:
+        return None
+    low, avg, high = (f"{v:.{digits}f}" for v in stats)
+    return f"<code>{label[:5]:<5} {termux_api.get_sparkline(values)}</code> {low}/{avg}/{high}{unit}"
+
+def format_trends() -> str:
+    """Блок трендів для /status: спарклайн і мін/сер/макс за вікно буферів."""
+    lines = []
+    for name, (label, unit, digits, _) in METRICS.items():
+        line = _trend_line(label, _rings[name], unit, digits)
+        if line:
+            lines.append(line)
+    top = sorted(_pm2_rings.items(), key=lambda kv: kv[1].latest() or 0, reverse=True)[:5]
+    for name, ring in top:
+        line = _trend_line(name, ring, "M")
+        if line:
+            lines.append(line)
+    if not lines:
+        return ""
+    return f"📈 <b>Тренд за {WINDOW_SEC // 3600} год</b> <i>(мін/сер/макс)</i>:\n" + "\n".join(lines)
+
+async def get_status_report() -> str:
+    report = await termux_api.get_full_system_report()
+    trends = format_trends()
+    return f"{report}\n\n{trends}" if trends else report
@@ -1,48 +1,359 @@
 # services/news_api.py
 import feedparser
+import hashlib
 import html
 import asyncio
-import sqlite3
-from datetime import datetime
+import json
+import logging
+import time
+from urllib.parse import urlsplit
 from concurrent.futures import ThreadPoolExecutor
-from config import RSS_FEEDS
+from typing import Dict, List, Optional
+from config import OWNER_ID, RSS_FEEDS
+from services import db_manager as db
+from services import http_client
+from services.feed_parser import parse_top_entries
 
 
-executor = ThreadPoolExecutor()
+# Обмежений пул: завислий парсинг не повинен з'їдати потоки всього процесу
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rss")
 
-def _parse_feed_sync(url: str, limit: int = 2) -> list:
-    """Синхронна функція парсингу одного фіда"""
+FEED_CACHE_ENTRIES = 20     # скільки записів фіда зберігаємо (показуємо менше)
+ENTRIES_PER_FEED = 2
+
+# url -> {"etag", "last_modified", "entries"}; дзеркало таблиці feed_cache
+_feed_state: Dict[str, dict] = {}
+
+def _parse_feed_sync(url: str, body: bytes, limit: int = FEED_CACHE_ENTRIES) -> list:
+    """Синхронний парсинг вже завантаженого фіда (CPU-робота, виконується в пулі потоків)"""
+    entries = parse_top_entries(body, limit)
+    if entries is not None:
+        return entries
+
+    # Нестандартний або битий фід — повний розбір feedparser
     try:
-        feed = feedparser.parse(url)
+        feed = feedparser.parse(body, response_headers={"content-location": url})
+        source_title = feed.feed.get('title', 'Джерело')
         entries = []
         for entry in feed.entries[:limit]:
-            title = html.escape(entry.get('title', 'Без назви'))
-            link = entry.get('link', '')
-            source_title = feed.feed.get('title', 'Джерело')
-            entries.append(f"🔹 <a href='{link}'>{title}</a> <i>({source_title})</i>")
+            published = entry.get('published_parsed') or entry.get('updated_parsed')
+            entries.append({
+                "title": entry.get('title', 'Без назви'),
+                "link": entry.get('link', ''),
+                "guid": entry.get('id') or entry.get('link', ''),
+                "source": source_title,
+                "published": time.strftime('%Y-%m-%d %H:%M:%S', published) if published else None,
+            })
         return entries
     except:
         return []
 
-async def get_fresh_news() -> str:
-    if not RSS_FEEDS:
-        return "⚠️ У налаштуваннях (.env) немає RSS-стрічок."
+def format_entry(entry: dict) -> str:
+    title = html.escape(entry['title'])
+    return f"🔹 <a href='{entry['link']}'>{title}</a> <i>({html.escape(entry['source'])})</i>"
+
+async def _load_feed_state(url: str) -> dict:
+    state = _feed_state.get(url)
+    if state is None:
+        row = await db.fetch_one('SELECT etag, last_modified, entries FROM feed_cache WHERE url = ?', (url,))
+        state = {
+            "etag": row['etag'] if row else None,
+            "last_modified": row['last_modified'] if row else None,
+            "entries": json.loads(row['entries']) if row else [],
+        }
+        _feed_state[url] = state
+    return state
+
+async def _save_feed_state(url: str, state: dict):
+    _feed_state[url] = state
+    await db.execute('''
+        INSERT INTO feed_cache (url, etag, last_modified, entries, fetched_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(url) DO UPDATE SET
+            etag=excluded.etag,
+            last_modified=excluded.last_modified,
+            entries=excluded.entries,
+            fetched_at=excluded.fetched_at
+    ''', (url, state["etag"], state["last_modified"], json.dumps(state["entries"], ensure_ascii=False)))
+
+async def fetch_feed_entries(url: str, timeout: float = 10, retries: int = http_client.MAX_RETRIES) -> List[dict]:
+    """
+    Умовний GET (If-None-Match / If-Modified-Since). На 304 повертає вже розібрані
+    записи з кешу, XML не завантажується і не парситься повторно.
+    Мережеві помилки та не-2xx відповіді піднімаються назовні (для статистики полера).
+    """
+    state = await _load_feed_state(url)
+    headers = {}
+    if state["etag"]:
+        headers["If-None-Match"] = state["etag"]
+    if state["last_modified"]:
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    resp = await http_client.fetch(url, headers=headers, timeout=timeout, retries=retries)
+    if resp.status == 304:
+        return state["entries"]
+    if not resp.ok:
+        raise RuntimeError(f"HTTP {resp.status}")
 
     loop = asyncio.get_running_loop()
-    all_news = []
+    entries = await loop.run_in_executor(executor, _parse_feed_sync, url, resp.body)
+    if not entries:
+        return state["entries"]
+
+    await _save_feed_state(url, {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "entries": entries,
+    })
+    return entries
+
+# --- ФОНОВИЙ ПОЛЕР: фіди -> news_items ---
+NEWS_POLL_MINUTES = 15
+NEWS_TOTAL_LIMIT = 15
+NEWS_RETENTION_DAYS = 14       # скільки тримати запис, якого вже немає у фіді
+NEWS_SEEN_RETENTION_DAYS = 60
 
-    tasks = [
-        loop.run_in_executor(executor, _parse_feed_sync, url)
-        for url in RSS_FEEDS
+FEED_TIMEOUT_SEC = 8        # завантаження + парсинг одного фіда
+NEWS_BUDGET_SEC = 4         # скільки /news готовий чекати, якщо в базі ще порожньо
+SLOW_FEED_SEC = 3           # середня латентність, після якої фід опитується вдвічі рідше
+MAX_BACKOFF = 8             # проблемний фід опитується не рідше ніж раз на 8 циклів
+LATENCY_ALPHA = 0.3         # згладжування середньої латентності (EWMA)
+
+# url -> статистика фіда; дзеркало таблиці feed_stats
+_feed_stats: Dict[str, dict] = {}
+# url -> запущене опитування (щоб один фід не качався паралельно двічі)
+_feed_tasks: Dict[str, asyncio.Task] = {}
+
+def _item_id(entry: dict) -> str:
+    return hashlib.sha1((entry.get("guid") or entry.get("link") or entry["title"]).encode()).hexdigest()[:20]
+
+def _store_items(conn, url: str, entries: List[dict]) -> int:
+    """Дописує нові записи фіда; тим, що вже є, оновлює last_seen_at. Повертає к-сть нових."""
+    rows = [
+        (_item_id(e), url, e["title"], e["link"], e["source"], e.get("published"))
+        for e in entries
     ]
-    
-    results = await asyncio.gather(*tasks)
+    conn.executemany(
+        "UPDATE news_items SET last_seen_at = CURRENT_TIMESTAMP WHERE item_id = ?",
+        [(row[0],) for row in rows]
+    )
+    before = conn.total_changes
+    conn.executemany('''
+        INSERT OR IGNORE INTO news_items (item_id, feed_url, title, link, source, published_at, last_seen_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', rows)
+    return conn.total_changes - before
+
+def _prune_items(conn):
+    # Видаляємо лише те, чого фід не віддає вже NEWS_RETENTION_DAYS: запис, який
+    # досі є у фіді, після видалення вставився б знову і прийшов би як непрочитаний.
+    conn.execute(
+        "DELETE FROM news_items WHERE COALESCE(last_seen_at, fetched_at) < datetime('now', ?)",
+        (f"-{NEWS_RETENTION_DAYS} days",)
+    )
+    # Позначки "прочитано" живуть довше за самі записи — на випадок, якщо фід,
+    # що довго лежав, повернеться зі старими записами.
+    conn.execute('''
+        DELETE FROM news_seen
+        WHERE seen_at < datetime('now', ?)
+          AND item_id NOT IN (SELECT item_id FROM news_items)
+    ''', (f"-{NEWS_SEEN_RETENTION_DAYS} days",))
+
+async def _load_feed_stats():
+    if _feed_stats:
+        return
+    for row in await db.fetch_all('SELECT * FROM feed_stats'):
+        _feed_stats[row['url']] = dict(row)
+
+def _record_stats(url: str, latency: float, error: str = None) -> dict:
+    """Оновлює лічильники фіда і вираховує, коли його варто опитати наступного разу."""
+    stats = _feed_stats.setdefault(url, {
+        "url": url, "ok_count": 0, "error_count": 0, "fail_streak": 0,
+        "avg_latency": None, "last_error": None, "next_fetch_at": 0,
+    })
+    if error is None:
+        stats["ok_count"] += 1
+        stats["fail_streak"] = 0
+        stats["last_error"] = None
+        avg = stats["avg_latency"]
+        stats["avg_latency"] = latency if avg is None else (1 - LATENCY_ALPHA) * avg + LATENCY_ALPHA * latency
+    else:
+        stats["error_count"] += 1
+        stats["fail_streak"] += 1
+        stats["last_error"] = error[:200]
+
+    factor = 1
+    if stats["fail_streak"]:
+        factor = min(2 ** stats["fail_streak"], MAX_BACKOFF)
+    elif stats["avg_latency"] and stats["avg_latency"] > SLOW_FEED_SEC:
+        factor = 2
+    stats["next_fetch_at"] = time.time() + (factor - 1) * NEWS_POLL_MINUTES * 60
+    return stats
+
+async def _save_stats(stats: dict):
+    await db.execute('''
+        INSERT INTO feed_stats (url, ok_count, error_count, fail_streak, avg_latency, last_error, next_fetch_at, updated_at)
+        VALUES (:url, :ok_count, :error_count, :fail_streak, :avg_latency, :last_error, :next_fetch_at, CURRENT_TIMESTAMP)
+        ON CONFLICT(url) DO UPDATE SET
+            ok_count=excluded.ok_count,
+            error_count=excluded.error_count,
+            fail_streak=excluded.fail_streak,
+            avg_latency=excluded.avg_latency,
+            last_error=excluded.last_error,
+            next_fetch_at=excluded.next_fetch_at,
+            updated_at=excluded.updated_at
+    ''', {k: stats[k] for k in ("url", "ok_count", "error_count", "fail_streak",
+                                 "avg_latency", "last_error", "next_fetch_at")})
+
+async def _poll_feed(url: str) -> int:
+    """Одне опитування фіда з жорстким таймаутом. Ніколи не кидає винятків."""
+    started = time.monotonic()
+    try:
+        entries = await asyncio.wait_for(
+            fetch_feed_entries(url, timeout=FEED_TIMEOUT_SEC, retries=0), FEED_TIMEOUT_SEC
+        )
+    except Exception as e:
+        error = "timeout" if isinstance(e, asyncio.TimeoutError) else (str(e) or type(e).__name__)
+        logging.warning(f"RSS {url}: {error}")
+        await _save_stats(_record_stats(url, time.monotonic() - started, error))
+        return 0
+
+    await _save_stats(_record_stats(url, time.monotonic() - started))
+    if not entries:
+        return 0
+    return await db.run_write(_store_items, url, entries)
+
+def _start_poll(url: str) -> asyncio.Task:
+    task = _feed_tasks.get(url)
+    if task is None or task.done():
+        task = asyncio.create_task(_poll_feed(url))
+        _feed_tasks[url] = task
+    return task
+
+async def poll_news_feeds(urls: List[str] = None, budget: float = None, force: bool = False):
+    """
+    Опитує фіди, чия черга настала (повільні й несправні — рідше), і дописує нові записи
+    в news_items. Кожен url качається один раз, скільки б людей на нього не підписалося.
+    З budget чекає не довше за нього: фіди, що не встигли, докачуються у фоні.
+    Повертає (к-сть нових записів, список url, що не вклалися в бюджет).
+    """
+    urls = await all_feed_urls() if urls is None else urls
+    await _load_feed_stats()
+
+    now = time.time()
+    due = [url for url in urls if force or (_feed_stats.get(url) or {}).get("next_fetch_at", 0) <= now]
+    tasks = {_start_poll(url): url for url in due}
+    if not tasks:
+        return 0, []
+
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+    added = sum(task.result() for task in done)
+    if budget is None:
+        await db.run_write(_prune_items)
+    if added:
+        logging.info(f"📰 News poller: +{added} items")
+    return added, [tasks[task] for task in pending]
+
+def _feed_host(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+# --- ПІДПИСКИ: кожен користувач читає свої фіди, качається кожен url один раз ---
+MAX_SUBSCRIPTIONS = 20
+
+async def list_subscriptions(user_id: int) -> List[str]:
+    rows = await db.fetch_all(
+        'SELECT url FROM feed_subscriptions WHERE user_id = ? ORDER BY added_at, url', (user_id,)
+    )
+    return [row['url'] for row in rows]
+
+async def get_user_feeds(user_id: int) -> List[str]:
+    """Фіди користувача; без власних підписок — загальні RSS_FEEDS з .env."""
+    return await list_subscriptions(user_id) or list(RSS_FEEDS)
+
+async def all_feed_urls() -> List[str]:
+    """Унікальні url усіх підписок разом із загальними — саме їх опитує полер."""
+    rows = await db.fetch_all('SELECT DISTINCT url FROM feed_subscriptions')
+    return list(dict.fromkeys([*RSS_FEEDS, *(row['url'] for row in rows)]))
+
+async def subscribe_feed(user_id: int, url: str) -> Optional[str]:
+    """
+    Перевіряє, що за url справді фід, і додає підписку. Повертає назву джерела
+    або None, якщо фід не відповів чи не розпізнався.
+    """
+    try:
+        entries = await asyncio.wait_for(
+            fetch_feed_entries(url, timeout=FEED_TIMEOUT_SEC, retries=0), FEED_TIMEOUT_SEC
+        )
+    except Exception as e:
+        logging.warning(f"RSS subscribe {url}: {e}")
+        return None
+    if not entries:
+        return None
+
+    await db.run_write(_store_items, url, entries)
+    await db.execute(
+        'INSERT OR IGNORE INTO feed_subscriptions (user_id, url) VALUES (?, ?)', (user_id, url)
+    )
+    return entries[0]["source"]
+
+async def unsubscribe_feed(user_id: int, url: str) -> bool:
+    result = await db.execute(
+        'DELETE FROM feed_subscriptions WHERE user_id = ? AND url = ?', (user_id, url)
+    )
+    return result.rowcount > 0
+
+async def get_unseen_items(user_id: int, urls: List[str], per_feed: int = ENTRIES_PER_FEED,
+                           limit: int = NEWS_TOTAL_LIMIT) -> List[dict]:
+    """Найновіші записи, які користувач ще не бачив (до per_feed з кожного фіда)."""
+    if not urls:
+        return []
+    placeholders = ", ".join("?" for _ in urls)
+    rows = await db.fetch_all(f'''
+        SELECT item_id, title, link, source FROM (
+            SELECT i.*, ROW_NUMBER() OVER (
+                PARTITION BY i.feed_url
+                ORDER BY COALESCE(i.published_at, i.fetched_at) DESC, i.rowid
+            ) AS rn
+            FROM news_items i
+            WHERE i.feed_url IN ({placeholders})
+              AND NOT EXISTS (SELECT 1 FROM news_seen s WHERE s.user_id = ? AND s.item_id = i.item_id)
+        )
+        WHERE rn <= ?
+        ORDER BY COALESCE(published_at, fetched_at) DESC
+        LIMIT ?
+    ''', (*urls, user_id, per_feed, limit))
+    return [dict(row) for row in rows]
+
+async def mark_seen(user_id: int, item_ids: List[str]):
+    await db.execute_many(
+        "INSERT OR IGNORE INTO news_seen (user_id, item_id) VALUES (?, ?)",
+        [(user_id, item_id) for item_id in item_ids]
+    )
+
+async def get_fresh_news(user_id: int = OWNER_ID) -> str:
+    feeds = await get_user_feeds(user_id)
+    if not feeds:
+        return "⚠️ Немає RSS-стрічок: додайте свою через /feed_add або вкажіть RSS_FEEDS у .env."
+
+    # Холодний старт: полер ще не встиг зібрати ці фіди. Чекаємо не довше бюджету,
+    # решта докачається у фоні й потрапить у наступний випуск.
+    placeholders = ", ".join("?" for _ in feeds)
+    pending = []
+    if not await db.fetch_one(f"SELECT 1 FROM news_items WHERE feed_url IN ({placeholders}) LIMIT 1", feeds):
+        _, pending = await poll_news_feeds(feeds, budget=NEWS_BUDGET_SEC, force=True)
+    else:
+        await _load_feed_stats()
+
+    lagging = [url for url in feeds if url in pending or (_feed_stats.get(url) or {}).get("fail_streak")]
+    note = ""
+    if lagging:
+        note = "\n\n<i>⏳ Не відповіли вчасно: " + ", ".join(html.escape(_feed_host(u)) for u in lagging) + "</i>"
 
-    for news_items in results:
-        all_news.extend(news_items)
+    items = await get_unseen_items(user_id, feeds)
+    if not items:
+        return "📭 Нових новин з минулого разу немає." + note
 
-    if not all_news:
-        return "📭 Новин не знайдено або помилка з'єднання."
+    await mark_seen(user_id, [item["item_id"] for item in items])
 
-    final_text = "🗞 <b>Свіжа преса:</b>\n\n" + "\n".join(all_news[:15])
+    final_text = "🗞 <b>Свіжа преса:</b>\n\n" + "\n".join(format_entry(item) for item in items) + note
     return final_text
@@ -0,0 +1,79 @@
+# services/permissions.py
+import logging
+from typing import List
+
+from aiogram import Bot
+
+from config import ADMIN_IDS, OWNER_ID
+from services import db_manager as db
+from utils.cache import TTLCache
+
+TRUST_LEVELS = {
+    "guest": "🚫 Чужий (нотатки вимкнені)",
+    "admins_only": "🛡 Тільки адміни чату",
+    "all": "✅ Всі учасники",
+}
+DEFAULT_TRUST = "guest"
+
+# Рівень довіри змінюється тільки командами власника -> довгий TTL + інвалідація при записі.
+# Статус учасника може змінитись без нашого відома -> короткий TTL.
+_trust_cache = TTLCache(maxsize=512, ttl=600)
+_member_cache = TTLCache(maxsize=2048, ttl=120)
+
+async def get_trust_level(chat_id: int) -> str:
+    level = _trust_cache.get(chat_id)
+    if level is None:
+        row = await db.fetch_one('SELECT trust_level FROM chat_trust WHERE chat_id = ?', (chat_id,))
+        level = row['trust_level'] if row else DEFAULT_TRUST
+        _trust_cache.set(chat_id, level)
+    return level
+
+async def set_trust_level(chat_id: int, level: str, title: str = None):
+    if level not in TRUST_LEVELS:
+        raise ValueError(f"Unknown trust level: {level}")
+    await db.execute('''
+        INSERT INTO chat_trust (chat_id, trust_level, title, updated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(chat_id) DO UPDATE SET
+            trust_level=excluded.trust_level,
+            title=COALESCE(excluded.title, chat_trust.title),
+            updated_at=CURRENT_TIMESTAMP
+    ''', (chat_id, level, title))
+    _trust_cache.pop(chat_id)
+    logging.info(f"🔐 Trust level for chat {chat_id} -> {level}")
+
+async def list_trusted_chats() -> List[dict]:
+    rows = await db.fetch_all('SELECT chat_id, trust_level, title FROM chat_trust ORDER BY chat_id')
+    return [dict(row) for row in rows]
+
+async def get_member_status(bot: Bot, chat_id: int, user_id: int) -> str:
+    key = (chat_id, user_id)
+    status = _member_cache.get(key)
+    if status is None:
+        member = await bot.get_chat_member(chat_id, user_id)
+        status = member.status
+        _member_cache.set(key, status)
+    return status
+
+def forget_member(chat_id: int, user_id: int):
+    """Скидає кеш статусу (викликається на апдейтах chat_member)."""
+    _member_cache.pop((chat_id, user_id))
+
+async def can_manage_notes(bot: Bot, chat_id: int, user_id: int) -> bool:
+    """Чи може користувач додавати/видаляти нотатки в цьому чаті."""
+    if user_id == OWNER_ID: return True
+
+    trust_level = await get_trust_level(chat_id)
+
+    if trust_level == 'guest': return False
+    if trust_level == 'all': return True
+    if trust_level == 'admins_only':
+        # Статус у Telegram запитуємо лише коли він справді потрібен
+        if user_id in ADMIN_IDS: return True
+        try:
+            status = await get_member_status(bot, chat_id, user_id)
+        except Exception as e:
+            logging.error(f"get_chat_member failed ({chat_id}/{user_id}): {e}")
+            return False
+        return status in ['administrator', 'creator']
+    return False
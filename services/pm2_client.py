@@ -0,0 +1,214 @@
+# services/pm2_client.py
+"""
+Клієнт демона PM2 без запуску `pm2` CLI (кожен виклик CLI — це старт Node.js, ~1 с на телефоні).
+Говоримо з демоном напряму через його unix-сокети у ~/.pm2:
+  rpc.sock — axon req/rep (getMonitorData, restartProcessId, ...)
+  pub.sock — axon pub: події процесів (exit, restart, restart overlimit)
+Обидва використовують формат AMP: байт meta (версія << 4 | к-сть аргументів),
+далі для кожного аргументу 4 байти довжини (big-endian) і тіло з префіксом
+"j:" (JSON) або "s:" (рядок). Якщо демон недоступний — відкат на CLI.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+from utils.cache import TTLCache
+
+PM2_HOME = Path(os.getenv("PM2_HOME", Path.home() / ".pm2"))
+RPC_SOCKET = PM2_HOME / "rpc.sock"
+PUB_SOCKET = PM2_HOME / "pub.sock"
+
+RPC_TIMEOUT_SEC = 3
+CLI_TIMEOUT_SEC = 15
+LIST_CACHE_SEC = 5
+EVENTS_RECONNECT_SEC = 30
+AMP_VERSION = 1
+
+class Pm2Error(Exception):
+    pass
+
+# --- AMP КОДЕК ---
+
+def _encode_arg(arg) -> bytes:
+    if isinstance(arg, bytes):
+        return arg
+    if isinstance(arg, str):
+        return b"s:" + arg.encode()
+    return b"j:" + json.dumps(arg).encode()
+
+def _decode_arg(data: bytes):
+    if data[:2] == b"j:":
+        return json.loads(data[2:])
+    if data[:2] == b"s:":
+        return data[2:].decode()
+    return data
+
+def pack(args: list) -> bytes:
+    parts = [bytes([AMP_VERSION << 4 | len(args)])]
+    for arg in args:
+        body = _encode_arg(arg)
+        parts.append(struct.pack(">I", len(body)))
+        parts.append(body)
+    return b"".join(parts)
+
+async def read_message(reader: asyncio.StreamReader) -> list:
+    meta = (await reader.readexactly(1))[0]
+    args = []
+    for _ in range(meta & 0x0F):
+        (length,) = struct.unpack(">I", await reader.readexactly(4))
+        args.append(_decode_arg(await reader.readexactly(length)))
+    return args
+
+async def _run_cli(*args: str) -> str:
+    """Відкат на `pm2 ...`, коли демон не відповідає на сокеті"""
+    proc = await asyncio.create_subprocess_exec(
+        "pm2", *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        stdout, _ = await asyncio.wait_for(proc.communicate(), CLI_TIMEOUT_SEC)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise Pm2Error(f"pm2 {args[0]}: таймаут")
+    if proc.returncode != 0:
+        raise Pm2Error(f"pm2 {args[0]}: код {proc.returncode}")
+    return stdout.decode('utf-8', errors='replace')
+
+# --- RPC ---
+
+_rpc_lock = asyncio.Lock()
+_rpc_conn: Optional[tuple] = None   # (reader, writer)
+_ids = itertools.count()
+_list_cache = TTLCache(maxsize=1, ttl=LIST_CACHE_SEC)
+
+async def _close_rpc():
+    global _rpc_conn
+    if _rpc_conn:
+        _rpc_conn[1].close()
+    _rpc_conn = None
+
+async def rpc_call(method: str, *args, timeout: float = RPC_TIMEOUT_SEC):
+    """Виклик методу демона (як axon-rpc Client.call). Повертає перший результат."""
+    global _rpc_conn
+    async with _rpc_lock:
+        try:
+            if _rpc_conn is None:
+                _rpc_conn = await asyncio.wait_for(asyncio.open_unix_connection(str(RPC_SOCKET)), timeout)
+            reader, writer = _rpc_conn
+            msg_id = f"jeeves:{next(_ids)}"
+            writer.write(pack([{"type": "call", "method": method, "args": list(args)}, msg_id]))
+            await writer.drain()
+
+            while True:
+                reply = await asyncio.wait_for(read_message(reader), timeout)
+                if reply and reply[-1] == msg_id:
+                    break
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            await _close_rpc()
+            raise Pm2Error(f"RPC {method}: {e.__class__.__name__}") from e
+
+    body = reply[0] if isinstance(reply[0], dict) else {}
+    if body.get("error"):
+        raise Pm2Error(f"RPC {method}: {body['error']}")
+    results = body.get("args") or [None]
+    return results[0]
+
+async def list_processes(fresh: bool = False) -> List[dict]:
+    """Список процесів у форматі `pm2 jlist`; кешується на LIST_CACHE_SEC."""
+    if not fresh:
+        cached = _list_cache.get("list")
+        if cached is not None:
+            return cached
+    try:
+        processes = await rpc_call("getMonitorData", {})
+    except Pm2Error as e:
+        logging.debug(f"PM2 RPC unavailable, using CLI: {e}")
+        try:
+            processes = json.loads(await _run_cli("jlist"))
+        except (OSError, ValueError) as cli_error:
+            raise Pm2Error(f"jlist: {cli_error.__class__.__name__}") from cli_error
+    _list_cache.set("list", processes)
+    return processes
+
+# Рестарти, які ми ініціювали самі, — щоб не сповіщати про них як про збій
+_expected_restarts = TTLCache(maxsize=64, ttl=60)
+
+async def restart_process(name: str):
+    """Рестарт усіх інстансів процесу за назвою. Кидає Pm2Error, якщо не вдалося."""
+    _expected_restarts.set(name, True)
+    try:
+        processes = await list_processes(fresh=True)
+        ids = [p["pm_id"] for p in processes if p.get("name") == name]
+        if not ids:
+            raise Pm2Error(f"процес {name} не знайдено")
+        for pm_id in ids:
+            await rpc_call("restartProcessId", {"id": pm_id, "env": {}}, timeout=CLI_TIMEOUT_SEC)
+    except Pm2Error as e:
+        logging.debug(f"PM2 RPC restart failed, using CLI: {e}")
+        try:
+            await _run_cli("restart", name)
+        except OSError as cli_error:
+            raise Pm2Error(f"{name}: {cli_error.__class__.__name__}") from cli_error
+    finally:
+        _list_cache.clear()
+
+# --- ПОДІЇ ---
+
+# подія pm2 -> як її назвати власнику (ручні дії ігноруються)
+ALERT_EVENTS = {
+    "exit": "💥 впав",
+    "restart": "♻️ перезапущено",
+    "restart overlimit": "🔴 errored: забагато рестартів поспіль",
+}
+
+# Після падіння autorestart шле exit, а слідом restart — про один збій сповіщаємо один раз
+RESTART_AFTER_EXIT_SEC = 60
+_recent_exits = TTLCache(maxsize=64, ttl=RESTART_AFTER_EXIT_SEC)
+
+def describe_event(data: dict) -> Optional[str]:
+    """Текст сповіщення для process:event або None, якщо подія штатна."""
+    event = data.get("event")
+    if event not in ALERT_EVENTS or data.get("manually"):
+        return None
+    proc = data.get("process") or {}
+    name = proc.get("name", "?")
+    if _expected_restarts.get(name):
+        return None
+    if event == "exit":
+        _recent_exits.set(name, True)
+    elif event == "restart" and name in _recent_exits:
+        _recent_exits.pop(name)
+        return None
+    text = f"{ALERT_EVENTS[event]}: <b>{name}</b>"
+    exit_code = proc.get("exit_code")
+    if event == "exit" and exit_code is not None:
+        text += f" (код {exit_code})"
+    return f"⚙️ PM2 {text}"
+
+async def watch_events(notify: Callable[[str], Awaitable[None]]):
+    """Слухає pub.sock демона і віддає тексти збоїв у notify. Перепідключається сам."""
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(str(PUB_SOCKET))
+        except OSError:
+            await asyncio.sleep(EVENTS_RECONNECT_SEC)
+            continue
+        try:
+            while True:
+                message = await read_message(reader)
+                if len(message) >= 2 and message[0] == "process:event" and isinstance(message[1], dict):
+                    text = describe_event(message[1])
+                    if text:
+                        await notify(text)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            logging.warning(f"PM2 events stream closed: {e.__class__.__name__}")
+        except Exception as e:
+            logging.error(f"PM2 events error: {e}")
+        finally:
+            writer.close()
+        await asyncio.sleep(EVENTS_RECONNECT_SEC)
@@ -1,18 +1,90 @@
 # services/price_parser.py
-import cloudscraper
-from bs4 import BeautifulSoup
-import re
-import time
 import asyncio
+import html
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+from urllib.parse import urljoin
 
-def search_atb(query: str):
-    """
-    Шукає товар в АТБ (Location ID: 1158 - Чернігів).
-    Використовує cloudscraper + прогрів сесії (Cookies).
-    """
-    
-    # Створюємо скрапер
-    scraper = cloudscraper.create_scraper(
+import cloudscraper
+
+from services.html_extract import CHALLENGE_MARKERS, extract_catalog_items, is_captcha
+from utils.cache import TTLCache
+from utils.rate_limit import RateLimiter
+
+ATB_HOME = "https://www.atbmarket.com/"
+ATB_SEARCH_URL = "https://www.atbmarket.com/sch"
+ATB_LOCATION = "1158"           # Чернігів
+REQUEST_TIMEOUT = 10
+POOL_SIZE = 3                   # теплі сесії = скільки пошуків може йти паралельно
+REQUESTS_PER_SEC = 2            # ввічливий ліміт на всі запити до atbmarket.com
+SEARCH_CACHE_TTL = 30 * 60
+COOKIE_FILE = Path(__file__).resolve().parent.parent / "data" / "atb_cookies.json"
+CHALLENGE_STATUSES = {403, 429, 503}
+
+# +1 потік, щоб фонове оновлення кук не чекало за пошуками
+executor = ThreadPoolExecutor(max_workers=POOL_SIZE + 1, thread_name_prefix="atb")
+_rate_limiter = RateLimiter(REQUESTS_PER_SEC)
+# нормалізований запит -> список товарів живого пошуку
+_search_cache = TTLCache(maxsize=256, ttl=SEARCH_CACHE_TTL)
+
+# Куки + User-Agent, під який їх видали (cf_clearance прив'язаний до UA).
+# generation зростає після кожного оновлення, щоб сесії з пулу підхопили нові куки.
+_cookie_state = {"user_agent": None, "cookies": [], "generation": 0}
+_state_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_pool: "queue.Queue" = queue.Queue()
+
+def _load_cookie_file():
+    try:
+        with open(COOKIE_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    with _state_lock:
+        _cookie_state["user_agent"] = data.get("user_agent")
+        _cookie_state["cookies"] = data.get("cookies", [])
+        _cookie_state["generation"] += 1
+
+def _save_cookies(scraper):
+    """Знімає куки з сесії, оновлює спільний стан і атомарно пише їх на диск."""
+    cookies = [
+        {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "expires": c.expires}
+        for c in scraper.cookies
+    ]
+    user_agent = scraper.headers.get("User-Agent")
+    with _state_lock:
+        if cookies == _cookie_state["cookies"] and user_agent == _cookie_state["user_agent"]:
+            return
+        _cookie_state.update(user_agent=user_agent, cookies=cookies)
+        _cookie_state["generation"] += 1
+        scraper._cookie_generation = _cookie_state["generation"]
+
+    os.makedirs(COOKIE_FILE.parent, exist_ok=True)
+    tmp_path = COOKIE_FILE.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"user_agent": user_agent, "cookies": cookies}, f)
+    os.replace(tmp_path, COOKIE_FILE)
+
+def _apply_cookies(scraper):
+    with _state_lock:
+        state = dict(_cookie_state)
+    if getattr(scraper, "_cookie_generation", None) == state["generation"]:
+        return
+    scraper.cookies.clear()
+    for c in state["cookies"]:
+        scraper.cookies.set(c["name"], c["value"], domain=c["domain"], path=c["path"], expires=c["expires"])
+    if state["user_agent"]:
+        scraper.headers["User-Agent"] = state["user_agent"]
+    scraper._cookie_generation = state["generation"]
+
+def _new_scraper():
+    return cloudscraper.create_scraper(
         browser={
             'browser': 'chrome',
             'platform': 'windows',
@@ -20,76 +92,150 @@ def search_atb(query: str):
         }
     )
 
+def _acquire():
     try:
+        scraper = _pool.get_nowait()
+    except queue.Empty:
+        scraper = _new_scraper()
+    _apply_cookies(scraper)
+    return scraper
 
-        scraper.get("https://www.atbmarket.com/", timeout=10)
-        
-        time.sleep(10) 
+def _release(scraper):
+    if _pool.qsize() < POOL_SIZE:
+        _pool.put(scraper)
+    else:
+        scraper.close()
 
-        # --- ПОШУК ---
-        base_url = "https://www.atbmarket.com/sch"
-        params = {
-            'lang': 'uk',
-            'location': '1158',
-            'query': query
-        }
+def _is_challenge(response) -> bool:
+    """Сторінка-перевірка Cloudflare. Слово "captcha" не маркер: звичайна сторінка
+    теж підключає recaptcha-скрипт у <head>."""
+    if response.status_code in CHALLENGE_STATUSES:
+        return True
+    head = response.text[:4096].lower()
+    if not any(marker in head for marker in CHALLENGE_MARKERS):
+        return False
+    # справжній челендж не містить карток товарів
+    return "catalog-item" not in response.text
+
+def _refresh_session():
+    """Нова сесія проходить головну сторінку (cloudscraper сам розв'язує JS-челендж) і ділиться куками."""
+    if not _refresh_lock.acquire(blocking=False):
+        return  # оновлення вже йде
+    try:
+        scraper = _new_scraper()
+        response = scraper.get(ATB_HOME, timeout=REQUEST_TIMEOUT)
+        if _is_challenge(response):
+            logging.warning(f"ATB: challenge persists after refresh (HTTP {response.status_code})")
+            return
+        _save_cookies(scraper)
+        _release(scraper)
+        logging.info("ATB: session cookies refreshed")
+    except Exception as e:
+        logging.warning(f"ATB: session refresh failed: {e}")
+    finally:
+        _refresh_lock.release()
+
+def _warm_pool():
+    """Піднімає куки з диска і заздалегідь створює сесії (створення скрапера — не безкоштовне)."""
+    _load_cookie_file()
+    while _pool.qsize() < POOL_SIZE:
+        scraper = _new_scraper()
+        _apply_cookies(scraper)
+        _pool.put(scraper)
+
+class AtbError(Exception):
+    """Сайт АТБ не віддав сторінку (капча, блок); текст — готове повідомлення користувачу."""
+
+class AtbChallenge(AtbError):
+    """Антибот-перевірка: наступні запити теж упруться в неї, поки сесія не оновиться."""
+
+def extract_products(page: str) -> List[dict]:
+    """Картки товарів зі сторінки пошуку чи категорії: sku, name, url, price, on_sale."""
+    products = extract_catalog_items(page, ATB_HOME)
+    # Капча буває лише на сторінці без товарів — там і шукаємо
+    if not products and is_captcha(page):
+        raise AtbChallenge("🤖 АТБ вимагає капчу. Спробуй пізніше.")
+    return products
+
+def format_product(product: dict) -> str:
+    if product["price"] is None:
+        return f"⛔️ <b>{html.escape(product['name'])}</b> — Немає в наявності"
+    marker = "🔥" if product["on_sale"] else "📦"
+    return f"{marker} <b>{html.escape(product['name'])}</b> — {product['price']:.2f} грн"
+
+def fetch_page(url: str, params: dict = None) -> str:
+    """Одна сторінка atbmarket.com через теплу сесію з пулу. Блокуючий."""
+    scraper = _acquire()
+    try:
+        response = scraper.get(url, params=params, timeout=REQUEST_TIMEOUT)
+
+        if _is_challenge(response):
+            # Куки протухли: оновлюємо у фоні, користувача не тримаємо
+            executor.submit(_refresh_session)
+            raise AtbChallenge("🤖 АТБ перевіряє бота, оновлюю сесію. Спробуй за хвилину.")
 
-        # Робимо запит вже з куками
-        response = scraper.get(base_url, params=params, timeout=10)
-        
         if response.status_code != 200:
-            return f"⚠️ АТБ блокує (код {response.status_code}). Спробуй пізніше."
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        if "captcha" in soup.text.lower():
-            return "🤖 АТБ вимагає капчу. Спробуй пізніше."
-
-        items = soup.select('.catalog-item') 
-
-        if not items:
-            return "🤷‍♂️ В АТБ (маг. 1158) нічого не знайдено."
-
-        results = []
-        for item in items[:7]: 
-            try:
-                name_tag = item.select_one('.catalog-item__title')
-                if not name_tag: continue
-                name = name_tag.get_text(strip=True)
-
-                price_final = "???"
-                
-                # Ціна
-                price_top = item.select_one('.product-price__top')
-                price_bottom = item.select_one('.product-price__bottom') 
-
-                if price_top and price_bottom:
-                    p_m = re.sub(r'[^\d]', '', price_top.get_text())
-                    p_c = re.sub(r'[^\d]', '', price_bottom.get_text())
-                    price_final = f"{p_m}.{p_c} грн"
-                elif item.select_one('.product-price__value'):
-                    raw_text = item.select_one('.product-price__value').get_text(strip=True)
-                    match = re.search(r'\d+[.,]\d+', raw_text)
-                    if match:
-                        price_final = f"{match.group().replace(',', '.')} грн"
-
-                # Акція
-                is_sale = bool(item.select_one('.product-price__sale'))
-                marker = "🔥" if is_sale else "📦"
-                
-                if price_final == "???":
-                    price_final = "Немає в наявності"
-                    marker = "⛔️"
-
-                results.append(f"{marker} <b>{name}</b> — {price_final}")
-                
-            except Exception:
-                continue
-            
-        return "\n".join(results) if results else "🤷‍♂️ Пусто."
+            raise AtbError(f"⚠️ АТБ блокує (код {response.status_code}). Спробуй пізніше.")
+
+        _save_cookies(scraper)
+        return response.text
+    finally:
+        _release(scraper)
+
+def search_products(query: str) -> List[dict]:
+    params = {
+        'lang': 'uk',
+        'location': ATB_LOCATION,
+        'query': query
+    }
+    return extract_products(fetch_page(ATB_SEARCH_URL, params))
+
+def fetch_category(path: str, page: int = 1) -> List[dict]:
+    """Сторінка категорії каталогу, напр. 'catalog/287-ovochi-ta-frukti'."""
+    params = {'lang': 'uk', 'location': ATB_LOCATION}
+    if page > 1:
+        params['page'] = page
+    return extract_products(fetch_page(urljoin(ATB_HOME, path.lstrip('/')), params))
 
+def search_atb(query: str):
+    """
+    Шукає товар в АТБ (Location ID: 1158 - Чернігів).
+    Бере теплу сесію з пулу (куки переживають рестарт), тож пошук — один запит.
+    Блокуючий: з асинхронного коду — search_products_async.
+    """
+    try:
+        products = search_products(query)
+    except AtbError as e:
+        return str(e)
     except Exception as e:
         return f"❌ Помилка: {e}"
 
+    if not products:
+        return "🤷‍♂️ В АТБ (маг. 1158) нічого не знайдено."
+    return "\n".join(format_product(p) for p in products[:7])
+
+async def warm_up():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, _warm_pool)
+
+async def search_products_async(query: str) -> List[dict]:
+    """Живий пошук з кешем на запит і спільним лімітом частоти."""
+    key = " ".join(query.lower().split())
+    cached = _search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    await _rate_limiter.wait()
+    loop = asyncio.get_running_loop()
+    products = await loop.run_in_executor(executor, search_products, query)
+    _search_cache.set(key, products)
+    return products
+
+async def fetch_category_async(path: str, page: int = 1) -> List[dict]:
+    await _rate_limiter.wait()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, fetch_category, path, page)
+
 if __name__ == "__main__":
+    _warm_pool()
     print(search_atb("хліб"))
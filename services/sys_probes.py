@@ -0,0 +1,99 @@
+# services/sys_probes.py
+"""
+Системні проби без fork: читають /proc і statvfs напряму і повертають числа,
+а не текст free/df/uptime, формат якого різниться між busybox і coreutils.
+"""
+import os
+from typing import NamedTuple
+
+DISK_PATH = "/data"
+
+class MemInfo(NamedTuple):
+    total_mb: int
+    used_mb: int
+    available_mb: int
+
+    @property
+    def percent(self) -> float:
+        return self.used_mb / self.total_mb * 100 if self.total_mb else 0.0
+
+class LoadAvg(NamedTuple):
+    one: float
+    five: float
+    fifteen: float
+
+class DiskUsage(NamedTuple):
+    total: int      # байти
+    used: int
+    free: int       # доступно непривілейованому користувачу
+
+    @property
+    def percent(self) -> float:
+        # як у df: частка від used + available, а не від повного розміру
+        usable = self.used + self.free
+        return self.used / usable * 100 if usable else 0.0
+
+def read_meminfo() -> MemInfo:
+    fields = {}
+    with open("/proc/meminfo", "rb") as f:
+        for line in f:
+            key, _, rest = line.partition(b":")
+            fields[key] = int(rest.split()[0])  # кБ
+
+    total = fields[b"MemTotal"]
+    available = fields.get(b"MemAvailable")
+    if available is None:   # старі ядра
+        available = fields.get(b"MemFree", 0) + fields.get(b"Buffers", 0) + fields.get(b"Cached", 0)
+    return MemInfo(total // 1024, (total - available) // 1024, available // 1024)
+
+def read_uptime() -> float:
+    with open("/proc/uptime", "rb") as f:
+        return float(f.read().split()[0])
+
+def read_loadavg() -> LoadAvg:
+    with open("/proc/loadavg", "rb") as f:
+        one, five, fifteen = f.read().split()[:3]
+    return LoadAvg(float(one), float(five), float(fifteen))
+
+def read_disk(path: str = DISK_PATH) -> DiskUsage:
+    st = os.statvfs(path)
+    total = st.f_blocks * st.f_frsize
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    return DiskUsage(total, used, st.f_bavail * st.f_frsize)
+
+def format_duration(seconds: float) -> str:
+    minutes = int(seconds) // 60
+    days, minutes = divmod(minutes, 1440)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days} дн {hours} год"
+    if hours:
+        return f"{hours} год {minutes} хв"
+    return f"{minutes} хв"
+
+def format_size(num_bytes: float) -> str:
+    """Як df -h: 1 знак після коми до 10 одиниць, далі ціле."""
+    for unit in ("B", "K", "M", "G", "T"):
+        if num_bytes < 1024 or unit == "T":
+            return f"{num_bytes:.1f}{unit}" if num_bytes < 10 and unit != "B" else f"{num_bytes:.0f}{unit}"
+        num_bytes /= 1024
+
+
+if __name__ == "__main__":
+    # Мікробенчмарк: python services/sys_probes.py
+    import subprocess
+    import timeit
+
+    def _native():
+        read_meminfo(); read_uptime(); read_loadavg(); read_disk("/")
+
+    def _forked():
+        for command in (["free", "-m"], ["df", "-h", "/"], ["uptime", "-p"]):
+            subprocess.check_output(command, encoding='utf-8')
+
+    repeat = 50
+    native_ms = timeit.timeit(_native, number=repeat) / repeat * 1000
+    forked_ms = timeit.timeit(_forked, number=repeat) / repeat * 1000
+    print(f"native /proc + statvfs: {native_ms:.3f} ms")
+    print(f"free + df + uptime:     {forked_ms:.3f} ms  (x{forked_ms / native_ms:.0f})")
+    print(read_meminfo(), read_loadavg(), format_duration(read_uptime()), read_disk("/"), sep="\n")
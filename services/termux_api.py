@@ -1,8 +1,12 @@
+import asyncio
+import math
 import subprocess
 import json
 import time
 from datetime import datetime
 
+from services import pm2_client, sys_probes
+
 # --- ДОПОМІЖНІ ФУНКЦІЇ ---
 
 def run_command(command):
@@ -21,18 +25,29 @@ def get_bar(percent, length=10):
     except:
         return "□" * length
 
-def ukrainian_uptime(uptime_str):
-    translations = {
-        "up": "",
-        "weeks": "тиж", "week": "тижд",
-        "days": "дн", "day": "дн",
-        "hours": "год", "hour": "год",
-        "minutes": "хв", "minute": "хв",
-        ",": ""
-    }
-    for old, new in translations.items():
-        uptime_str = uptime_str.replace(old, new)
-    return uptime_str.strip()
+SPARK_LEVELS = "▁▂▃▄▅▆▇█"
+
+def get_sparkline(values, length=16, low=None, high=None):
+    """Малює спарклайн ▁▃▅▇ (по одному символу на відрізок ряду, як клітинки get_bar)"""
+    try:
+        values = [v for v in values if v == v]  # NaN — пропущені заміри
+        if not values:
+            return " " * length
+        # стискаємо ряд до length відрізків середнім значенням
+        step = max(len(values) / length, 1)
+        buckets = []
+        i = 0.0
+        while int(i) < len(values) and len(buckets) < length:
+            chunk = values[int(i):max(int(i + step), int(i) + 1)]
+            buckets.append(sum(chunk) / len(chunk))
+            i += step
+        low = min(buckets) if low is None else low
+        high = max(buckets) if high is None else high
+        span = (high - low) or 1
+        top = len(SPARK_LEVELS) - 1
+        return "".join(SPARK_LEVELS[min(top, max(0, int((b - low) / span * top + 0.5)))] for b in buckets)
+    except:
+        return " " * length
 
 def format_pm2_uptime(uptime_ms):
     diff = int(time.time() * 1000) - uptime_ms
@@ -69,97 +84,124 @@ def tts_stop():
 
 # --- ЗВІТИ ТА PM2 ---
 
-def get_pm2_stats():
+async def run_command_async(command, timeout: float) -> str:
+    """Асинхронний run_command з власним таймаутом: зависла команда вбивається, event loop вільний"""
+    proc = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
     try:
-        result = subprocess.check_output(["pm2", "jlist"], encoding='utf-8')
-        processes = json.loads(result)
-        if not processes: return "Процеси відсутні."
-
-        report = "📊 <b>Процеси PM2:</b>\n<pre>"
-        report += f"{'ID':<2} {'Назва':<10} {'Час':<6} {'Стан':<2} {'ОЗП':<5}\n"
-        report += "─"*30 + "\n"
-
-        for proc in processes:
-            pm_id = proc.get('pm_id', 0)
-            name = proc.get('name', 'N/A')[:10]
-            status_raw = proc['pm2_env'].get('status', 'stopped')
-            status = "🟢" if status_raw == 'online' else ("🔴" if status_raw == 'errored' else "⚪️")
-            uptime_ms = proc['pm2_env'].get('pm_uptime', 0)
-            uptime_str = format_pm2_uptime(uptime_ms) if status_raw == 'online' else "-"
-            mem_bytes = proc.get('monit', {}).get('memory', 0)
-            mem_mb = f"{int(mem_bytes / 1024 / 1024)}M"
-            report += f"{pm_id:<2} {name:<10} {uptime_str:<6} {status:<2} {mem_mb:<5}\n"
-        
-        report += "</pre>"
-        return report
-    except Exception as e:
-        return f"⚠️ Помилка PM2: {str(e)}"
-
-def get_full_system_report() -> str:
-    current_time = datetime.now().strftime("%H:%M")
-    
-    # Uptime
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return stdout.decode('utf-8', errors='replace').strip()
+
+def format_battery(raw: str) -> str:
+    bat_data = json.loads(raw)
+
+    p = bat_data.get("percentage", 0)
+    temp = bat_data.get("temperature", 0)
+    st = bat_data.get("status", "Unknown").upper()
+
+    # Статус (через строге порівняння ==)
+    if st == "CHARGING":
+        st_ua = "заряджається"
+        icon = "⚡️"
+    elif st == "DISCHARGING":
+        st_ua = "автономно"
+        icon = "🪫" if p < 20 else "🔋"
+    elif st == "FULL":
+        st_ua = "повний"
+        icon = "🔋"
+    else:
+        st_ua = "не заряджається"
+        icon = "🔋"
+
+    return f"🔋 Акум: {icon} {p}% ({st_ua}, {temp}°C)"
+
+def format_uptime() -> str:
+    line = f"⏱️ В мережі: {sys_probes.format_duration(sys_probes.read_uptime())}"
     try:
-        raw_uptime = run_command(["uptime", "-p"])
-        uptime_ua = ukrainian_uptime(raw_uptime.replace("up ", ""))
-    except:
-        uptime_ua = "Невідомо"
-        
-    header = f"🕰 <b>Система ({current_time}):</b>\n⏱️ В мережі: {uptime_ua}"
+        line += f" · LA {sys_probes.read_loadavg().one:.2f}"
+    except OSError:
+        pass  # новіші Android ховають /proc/loadavg
+    return line
+
+def format_ram() -> str:
+    mem = sys_probes.read_meminfo()
+    return f"🧠 ОЗП: <code>[{get_bar(mem.percent)}]</code> {mem.used_mb}М / {mem.total_mb}М"
+
+def format_disk() -> str:
+    disk = sys_probes.read_disk()
+    disk_p = math.ceil(disk.percent)
+    used, total = sys_probes.format_size(disk.used), sys_probes.format_size(disk.total)
+    return f"💾 Пам'ять: <code>[{get_bar(disk_p)}]</code> {used} / {total} ({disk_p}%)"
+
+def format_pm2_stats(processes: list) -> str:
+    if not processes: return "Процеси відсутні."
+
+    report = "📊 <b>Процеси PM2:</b>\n<pre>"
+    report += f"{'ID':<2} {'Назва':<10} {'Час':<6} {'Стан':<2} {'ОЗП':<5}\n"
+    report += "─"*30 + "\n"
+
+    for proc in processes:
+        pm_id = proc.get('pm_id', 0)
+        name = proc.get('name', 'N/A')[:10]
+        status_raw = proc['pm2_env'].get('status', 'stopped')
+        status = "🟢" if status_raw == 'online' else ("🔴" if status_raw == 'errored' else "⚪️")
+        uptime_ms = proc['pm2_env'].get('pm_uptime', 0)
+        uptime_str = format_pm2_uptime(uptime_ms) if status_raw == 'online' else "-"
+        mem_bytes = proc.get('monit', {}).get('memory', 0)
+        mem_mb = f"{int(mem_bytes / 1024 / 1024)}M"
+        report += f"{pm_id:<2} {name:<10} {uptime_str:<6} {status:<2} {mem_mb:<5}\n"
+
+    report += "</pre>"
+    return report
+
+# Нативні проби: /proc і statvfs, без fork (рядок звіту -> підпис на випадок збою)
+NATIVE_PROBES = [
+    (format_uptime, "⏱️ В мережі:"),
+    (format_ram, "🧠 ОЗП:"),
+    (format_disk, "💾 Пам'ять:"),
+]
+
+# Проби, яким потрібен процес -> (команда, таймаут у секундах, форматер, підпис на випадок збою)
+PROBES = {
+    "battery": (["termux-battery-status"], 3, format_battery, "🔋 Акум:"),
+}
+
+def run_native_probe(probe, label: str) -> str:
+    try:
+        return probe()
+    except Exception:
+        return f"{label} n/a"
 
-    # --- 🔋 BATTERY LOGIC ---
+async def run_probe(name: str) -> str:
+    """Один рядок звіту. Ніколи не кидає: таймаут чи помилка стають позначкою в рядку."""
+    command, timeout, formatter, label = PROBES[name]
     try:
-        # 1. Отримуємо дані
-        result = subprocess.run(["termux-battery-status"], capture_output=True, text=True, timeout=3)
-        bat_data = json.loads(result.stdout)
-        
-        # 2. Парсимо змінні
-        p = bat_data.get("percentage", 0)
-        temp = bat_data.get("temperature", 0)
-        st = bat_data.get("status", "Unknown").upper()
-
-        # 3. Визначаємо статус (через строге порівняння ==)
-        if st == "CHARGING":
-            st_ua = "заряджається"
-            icon = "⚡️"
-        elif st == "DISCHARGING":
-            st_ua = "автономно"
-            icon = "🪫" if p < 20 else "🔋"
-        elif st == "FULL":
-            st_ua = "повний"
-            icon = "🔋"
-        else:
-            st_ua = "не заряджається"
-            icon = "🔋"
-
-        battery_info = f"🔋 Акум: {icon} {p}% ({st_ua}, {temp}°C)"
-    
-    except subprocess.TimeoutExpired:
-        battery_info = "🔋 Акум: ⏳ (API Timeout)"
+        raw = await run_command_async(command, timeout)
+    except asyncio.TimeoutError:
+        return f"{label} ⏳ (таймаут {timeout}с)"
     except Exception as e:
-        battery_info = f"🔋 Акум: ❌ Помилка ({str(e)})"
-
-    # --- 🧠 RAM ---
+        return f"{label} ❌ ({e.__class__.__name__})"
     try:
-        ram_out = run_command(["free", "-m"])
-        lines = ram_out.split('\n')
-        ram_info = "🧠 ОЗП: n/a"
-        for line in lines:
-            if "Mem:" in line:
-                p_ram = line.split()
-                used, total = int(p_ram[2]), int(p_ram[1])
-                ram_bar = get_bar((used/total)*100)
-                ram_info = f"🧠 ОЗП: <code>[{ram_bar}]</code> {used}М / {total}М"
-                break
-    except: ram_info = "🧠 ОЗП: помилка"
-
-    # --- 💾 DISK ---
+        return formatter(raw)
+    except Exception:
+        return f"{label} n/a"
+
+async def get_pm2_stats() -> str:
+    """Таблиця процесів через сокет демона PM2 (CLI — лише запасний шлях)"""
     try:
-        output = run_command(["df", "-h", "/data"])
-        parts = output.strip().split('\n')[1].split()
-        disk_p = parts[4].replace('%', '')
-        disk_bar = get_bar(disk_p)
-        disk_info = f"💾 Пам'ять: <code>[{disk_bar}]</code> {parts[2]} / {parts[1]} ({disk_p}%)"
-    except: disk_info = "💾 Пам'ять: n/a"
-
-    return f"{header}\n{battery_info}\n{ram_info}\n{disk_info}\n\n{get_pm2_stats()}"
+        return format_pm2_stats(await pm2_client.list_processes())
+    except Exception as e:
+        return f"⚠️ Помилка PM2: {str(e)}"
+
+async def get_full_system_report() -> str:
+    """Процесні проби паралельно (звіт чекає на найповільнішу), решта — читання /proc"""
+    current_time = datetime.now().strftime("%H:%M")
+    pending = asyncio.gather(run_probe("battery"), get_pm2_stats())
+    uptime, ram, disk = (run_native_probe(probe, label) for probe, label in NATIVE_PROBES)
+    battery, pm2 = await pending
+    return f"🕰 <b>Система ({current_time}):</b>\n{uptime}\n{battery}\n{ram}\n{disk}\n\n{pm2}"
@@ -1,13 +1,15 @@
+import asyncio
+import hashlib
+import json
 import logging
-import sqlite3
-from datetime import datetime
-from pathlib import Path
-from typing import Dict, Optional
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
-import aiohttp
-
-BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "data" / "jeeves.db"
+from services import db_manager as db
+from services import http_client
+from utils.cache import TTLCache
 
 DEFAULT_CONFIG = {
     "name": "Chernihiv",
@@ -26,103 +28,291 @@ WMO_CODES = {
     95: "⛈ Гроза", 96: "⛈ Гроза з градом", 99: "⛈ Сильна гроза з градом"
 }
 
-def get_user_city(user_id: int) -> dict:
+async def get_user_city(user_id: int) -> dict:
     """Отримує координати користувача з БД. Якщо немає — дефолт."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT city_name, lat, lon FROM user_weather WHERE user_id = ?", (user_id,))
-            row = cur.fetchone()
-            
-            if row:
-                return {"name": row[0], "lat": row[1], "lon": row[2]}
+        row = await db.fetch_one(
+            "SELECT city_name, lat, lon FROM user_weather WHERE user_id = ?", (user_id,)
+        )
+        if row:
+            return {"name": row["city_name"], "lat": row["lat"], "lon": row["lon"]}
     except Exception as e:
         logging.error(f"Database error in get_user_city: {e}")
-            
+
     return DEFAULT_CONFIG
 
-def set_city_coords(user_id: int, name: str, lat: float, lon: float):
+async def set_city_coords(user_id: int, name: str, lat: float, lon: float):
     """Зберігає або оновлює координати для конкретного користувача."""
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO user_weather (user_id, city_name, lat, lon)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                city_name=excluded.city_name,
-                lat=excluded.lat,
-                lon=excluded.lon
-        """, (user_id, name, lat, lon))
-        conn.commit()
+    await db.execute("""
+        INSERT INTO user_weather (user_id, city_name, lat, lon)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET
+            city_name=excluded.city_name,
+            lat=excluded.lat,
+            lon=excluded.lon
+    """, (user_id, name, lat, lon))
+
+# --- ГЕОКОДИНГ (кеш у пам'яті + таблиця geocode_cache) ---
+GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+GEOCODE_RESULTS = 5
+GEOCODE_KEY_LEN = 40            # ключ потрапляє в callback_data (ліміт 64 байти)
+GEOCODE_EMPTY_TTL_SEC = 86400   # "не знайдено" перепитуємо не частіше ніж раз на добу
+
+# Офіційна транслітерація (КМУ №55): Київ -> Kyiv, Ялта -> Yalta, Гайсин -> Haisyn
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie",
+    "ж": "zh", "з": "z", "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l",
+    "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ь": "", "ю": "iu",
+    "я": "ia", "ы": "y", "э": "e", "ё": "io", "ъ": "", "'": "", "’": "", "ʼ": "",
+})
+_WORD_START = {"є": "ye", "ї": "yi", "й": "y", "ю": "yu", "я": "ya"}
+
+_geocode_memory = TTLCache(maxsize=256, ttl=86400)
+
+def normalize_city_query(query: str) -> str:
+    """'  Київ ' / 'KYIV' / 'kyiv' -> 'kyiv'. Кирилиця транслітерується, щоб латиниця і кирилиця мали один ключ."""
+    text = re.sub(r"\b[єїйюя]", lambda m: _WORD_START[m.group()], query.casefold())
+    text = text.translate(_TRANSLIT)
+    text = re.sub(r"[^\w]+", " ", text).strip()
+    if len(text.encode()) <= GEOCODE_KEY_LEN:
+        return text
+    # довгий запит не обрізаємо (два різні запити з одним початком злилися б в один ключ),
+    # а хешуємо повністю; "#" нормалізація сама не породжує
+    return "#" + hashlib.sha1(text.encode()).hexdigest()[:GEOCODE_KEY_LEN - 1]
+
+async def _load_geocode(key: str) -> Optional[List[Dict]]:
+    row = await db.fetch_one(
+        "SELECT results, strftime('%s','now') - strftime('%s', fetched_at) AS age FROM geocode_cache WHERE query_key = ?",
+        (key,)
+    )
+    if not row:
+        return None
+    results = json.loads(row["results"])
+    if not results and row["age"] > GEOCODE_EMPTY_TTL_SEC:
+        return None
+    return results
+
+async def _fetch_geocode(query: str) -> Optional[List[Dict]]:
+    params = {"name": query, "count": GEOCODE_RESULTS, "language": "uk", "format": "json"}
+    try:
+        resp = await http_client.fetch(GEOCODING_URL, params=params, timeout=5)
+        if not resp.ok:
+            logging.error(f"Geocoding API error: {resp.status}")
+            return None
+        data = resp.json()
+    except Exception as e:
+        logging.error(f"Geocoding failed for {query!r}: {e}")
+        return None
+
+    return [
+        {
+            "name": city.get("name"),
+            "lat": city.get("latitude"),
+            "lon": city.get("longitude"),
+            "country": city.get("country", ""),
+            "region": city.get("admin1", ""),
+        }
+        for city in data.get("results") or []
+    ]
+
+async def search_cities(query: str) -> List[Dict]:
+    """До GEOCODE_RESULTS збігів. Пам'ять -> SQLite -> Open-Meteo."""
+    key = normalize_city_query(query)
+    if not key:
+        return []
+
+    results = _geocode_memory.get(key)
+    if results is None:
+        results = await _load_geocode(key)
+    if results is None:
+        results = await _fetch_geocode(query)
+        if results is None:  # мережева помилка — нічого не кешуємо
+            return []
+        await db.execute("""
+            INSERT INTO geocode_cache (query_key, results, fetched_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(query_key) DO UPDATE SET results=excluded.results, fetched_at=excluded.fetched_at
+        """, (key, json.dumps(results, ensure_ascii=False)))
+
+    _geocode_memory.set(key, results)
+    return results
+
+async def get_cached_city(key: str, index: int) -> Optional[Dict]:
+    """Результат з уже кешованого пошуку (для inline-кнопок вибору міста)."""
+    results = _geocode_memory.get(key)
+    if results is None:
+        results = await _load_geocode(key) or []
+    return results[index] if 0 <= index < len(results) else None
 
 async def search_city(query: str) -> Optional[Dict]:
     """Шукає місто за назвою і повертає координати першого результату."""
-    url = f"https://geocoding-api.open-meteo.com/v1/search?name={query}&count=1&language=uk&format=json"
-    
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url, timeout=5) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if "results" in data and data["results"]:
-                        city = data["results"][0]
-                        return {
-                            "name": city.get("name"),
-                            "lat": city.get("latitude"),
-                            "lon": city.get("longitude"),
-                            "country": city.get("country", "")
-                        }
-        except: pass
-    return None
+    results = await search_cities(query)
+    return results[0] if results else None
 
-async def get_weather_forecast(user_id: int, *args, **kwargs) -> str:
-    settings = get_user_city(user_id)
-    lat, lon, city_name = settings["lat"], settings["lon"], settings["name"]
+# --- ПРОГНОЗ (один запит current + daily + hourly, кеш по округлених координатах) ---
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+CURRENT_FIELDS = "temperature_2m,relative_humidity_2m,apparent_temperature,weather_code,wind_speed_10m"
+DAILY_FIELDS = "weather_code,temperature_2m_max,temperature_2m_min"
+HOURLY_FIELDS = "temperature_2m,precipitation,precipitation_probability"
+HOURLY_HORIZON = 24             # годин погодинних даних (для сповіщень)
+FORECAST_FRESH_SEC = 600        # свіжі дані — віддаємо як є
+FORECAST_STALE_SEC = 3 * 3600   # застарілі — віддаємо одразу і оновлюємо у фоні
+COORD_PRECISION = 2             # ~1 км: сусідні користувачі ділять один запис
+FORECAST_BATCH_SIZE = 50        # Open-Meteo приймає списки latitude/longitude через кому
 
-    url = (f"https://api.open-meteo.com/v1/forecast?"
-           f"latitude={lat}&longitude={lon}&current=temperature_2m,relative_humidity_2m,"
-           f"apparent_temperature,weather_code,wind_speed_10m&wind_speed_unit=kmh")
-    
+_forecast_cache = TTLCache(maxsize=128, ttl=FORECAST_STALE_SEC)
+_inflight: Dict[tuple, asyncio.Task] = {}
+
+def _coord_key(lat: float, lon: float) -> tuple:
+    return round(float(lat), COORD_PRECISION), round(float(lon), COORD_PRECISION)
+
+async def _fetch_forecast_batch(keys: List[tuple]) -> Dict[tuple, dict]:
+    """Один запит на кілька координат; кожна відповідь кладеться у кеш окремо."""
+    params = {
+        "latitude": ",".join(str(lat) for lat, _ in keys),
+        "longitude": ",".join(str(lon) for _, lon in keys),
+        "current": CURRENT_FIELDS, "daily": DAILY_FIELDS, "hourly": HOURLY_FIELDS,
+        "forecast_hours": HOURLY_HORIZON,
+        "wind_speed_unit": "kmh", "timezone": "auto",
+    }
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=10) as resp:
-                if resp.status != 200: 
-                    logging.error(f"Weather API error: {resp.status}")
-                    return "❌ Сервіс погоди тимчасово недоступний."
-                data = await resp.json()
-                
-        cur = data.get('current', {})
-        if not cur:
-            return "❌ Не вдалося отримати поточні дані погоди."
-
-        code = cur.get('weather_code', 0)
-        desc = WMO_CODES.get(code, f"Невідомо ({code})")
-        
-        logging.info(f"Weather updated for {city_name}: {cur.get('temperature_2m')}°C")
-
-        return (
-            f"🌤 <b>Погода ({city_name}):</b>\n"
-            f"🌡 <b>Температура:</b> {cur.get('temperature_2m', '??')}°C (відчувається {cur.get('apparent_temperature', '??')}°C)\n"
-            f"☁️ <b>Небо:</b> {desc}\n"
-            f"💨 <b>Вітер:</b> {cur.get('wind_speed_10m', '??')} км/год\n"
-            f"💧 <b>Вологість:</b> {cur.get('relative_humidity_2m', '??')}%"
-        )
+        resp = await http_client.fetch(FORECAST_URL, params=params, timeout=15)
+        if not resp.ok:
+            logging.error(f"Weather API error: {resp.status}")
+            return {}
+        payload = resp.json()
     except Exception as e:
-        return f"❌ Помилка: {e}"
+        logging.error(f"Weather fetch failed for {keys}: {e}")
+        return {}
 
-async def get_weekly_forecast(user_id: int) -> str:
-    settings = get_user_city(user_id)
-    lat, lon, city_name = settings["lat"], settings["lon"], settings["name"]
-    
-    url = (f"https://api.open-meteo.com/v1/forecast?"
-           f"latitude={lat}&longitude={lon}&daily=weather_code,temperature_2m_max,temperature_2m_min"
-           f"&timezone=auto")
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if resp.status != 200: return "❌ Прогноз на тиждень недоступний."
-            data = await resp.json()
-    
+    # Для однієї точки API повертає об'єкт, для кількох — список у тому ж порядку
+    items = payload if isinstance(payload, list) else [payload]
+    now = time.monotonic()
+    result = {}
+    for key, data in zip(keys, items):
+        _forecast_cache.set(key, (now, data))
+        result[key] = data
+    return result
+
+async def _fetch_forecast(key: tuple) -> Optional[dict]:
+    return (await _fetch_forecast_batch([key])).get(key)
+
+def _refresh(key: tuple) -> asyncio.Task:
+    """Один запит на координату, навіть якщо одночасно питають кілька користувачів."""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_forecast(key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return task
+
+async def get_forecast(lat: float, lon: float) -> Optional[dict]:
+    """Сирий прогноз Open-Meteo (current + daily + hourly) з кешу, stale-while-revalidate."""
+    key = _coord_key(lat, lon)
+    entry = _forecast_cache.get(key)
+    if entry:
+        fetched_at, data = entry
+        if time.monotonic() - fetched_at > FORECAST_FRESH_SEC:
+            _refresh(key)
+        return data
+    return await asyncio.shield(_refresh(key))
+
+async def prefetch_forecasts(coords: List[tuple]) -> int:
+    """Прогріває кеш для всіх координат пачками. Повертає кількість оновлених точок."""
+    keys = sorted({_coord_key(lat, lon) for lat, lon in coords})
+    warmed = 0
+    for i in range(0, len(keys), FORECAST_BATCH_SIZE):
+        warmed += len(await _fetch_forecast_batch(keys[i:i + FORECAST_BATCH_SIZE]))
+    return warmed
+
+# --- СПОВІЩЕННЯ ПРО ОПАДИ / ЗАМОРОЗКИ ---
+RAIN_MM_THRESHOLD = 0.2
+RAIN_PROB_THRESHOLD = 60
+RAIN_LOOKAHEAD_HOURS = 1
+FROST_THRESHOLD = 0.0
+FROST_CHECK_HOURS = range(16, 23)   # попереджаємо ввечері
+FROST_UNTIL_HOUR = 9                # "ніч" — до 09:00 наступного дня
+
+def _hourly_from_now(data: dict):
+    """Погодинні ряди, обрізані від поточної (локальної для точки) години."""
+    hourly = data.get("hourly", {})
+    offset = data.get("utc_offset_seconds", 0)
+    now = (datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(seconds=offset)).replace(minute=0, second=0, microsecond=0)
+    times = hourly.get("time", [])
+    start = next((i for i, t in enumerate(times) if datetime.fromisoformat(t) >= now), len(times))
+    return now, {k: v[start:] for k, v in hourly.items()}
+
+def evaluate_weather_alerts(data: dict) -> List[tuple]:
+    """Правила над кешованим прогнозом. Повертає [(rule_id, текст)]."""
+    now, hourly = _hourly_from_now(data)
+    alerts = []
+
+    # +1, бо поточна година вже теж рахується
+    precip = hourly.get("precipitation", [])[:RAIN_LOOKAHEAD_HOURS + 1]
+    prob = hourly.get("precipitation_probability", [])[:RAIN_LOOKAHEAD_HOURS + 1]
+    rain_mm = max((p or 0 for p in precip), default=0)
+    rain_prob = max((p or 0 for p in prob), default=0)
+    if rain_mm >= RAIN_MM_THRESHOLD or rain_prob >= RAIN_PROB_THRESHOLD:
+        alerts.append(("rain", f"☔️ <b>Найближчої години дощ</b> ({rain_mm} мм, ймовірність {rain_prob}%). Візьміть парасолю."))
+
+    if now.hour in FROST_CHECK_HOURS:
+        night_hours = 24 - now.hour + FROST_UNTIL_HOUR
+        temps = [t for t in hourly.get("temperature_2m", [])[:night_hours] if t is not None]
+        if temps and min(temps) <= FROST_THRESHOLD:
+            alerts.append(("frost", f"🥶 <b>Вночі заморозки</b> до {min(temps)}°C."))
+
+    return alerts
+
+async def set_weather_alerts(user_id: int, enabled: bool):
+    """Вмикає/вимикає сповіщення (для користувача без міста — з дефолтними координатами)."""
+    await db.execute("""
+        INSERT INTO user_weather (user_id, city_name, lat, lon, alerts_enabled)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET alerts_enabled=excluded.alerts_enabled
+    """, (user_id, DEFAULT_CONFIG["name"], DEFAULT_CONFIG["lat"], DEFAULT_CONFIG["lon"], int(enabled)))
+
+async def get_weather_watch_list() -> List[dict]:
+    rows = await db.fetch_all("SELECT user_id, city_name, lat, lon, alerts_enabled FROM user_weather")
+    return [dict(row) for row in rows]
+
+async def collect_weather_alerts() -> List[tuple]:
+    """
+    Прогріває кеш для всіх різних координат з user_weather (пачками)
+    і повертає [(user_id, rule_id, текст)] для тих, хто ввімкнув сповіщення.
+    """
+    watch = await get_weather_watch_list()
+    coords = [(row["lat"], row["lon"]) for row in watch] + [(DEFAULT_CONFIG["lat"], DEFAULT_CONFIG["lon"])]
+    warmed = await prefetch_forecasts(coords)
+    logging.info(f"🌦 Weather prefetch: {warmed} locations for {len(watch)} users")
+
+    result = []
+    for row in watch:
+        if not row["alerts_enabled"]:
+            continue
+        entry = _forecast_cache.get(_coord_key(row["lat"], row["lon"]))
+        if not entry:
+            continue
+        for rule_id, text in evaluate_weather_alerts(entry[1]):
+            result.append((row["user_id"], rule_id, f"{text}\n📍 {row['city_name']}"))
+    return result
+
+def format_current_weather(data: dict, city_name: str) -> str:
+    cur = data.get('current', {})
+    if not cur:
+        return "❌ Не вдалося отримати поточні дані погоди."
+
+    code = cur.get('weather_code', 0)
+    desc = WMO_CODES.get(code, f"Невідомо ({code})")
+
+    return (
+        f"🌤 <b>Погода ({city_name}):</b>\n"
+        f"🌡 <b>Температура:</b> {cur.get('temperature_2m', '??')}°C (відчувається {cur.get('apparent_temperature', '??')}°C)\n"
+        f"☁️ <b>Небо:</b> {desc}\n"
+        f"💨 <b>Вітер:</b> {cur.get('wind_speed_10m', '??')} км/год\n"
+        f"💧 <b>Вологість:</b> {cur.get('relative_humidity_2m', '??')}%"
+    )
+
+def format_weekly_forecast(data: dict, city_name: str) -> str:
     daily = data.get("daily", {})
     days = daily.get("time", [])
     codes = daily.get("weather_code", [])
@@ -130,15 +320,32 @@ async def get_weekly_forecast(user_id: int) -> str:
     t_min = daily.get("temperature_2m_min", [])
 
     res = [f"🗓 <b>Прогноз на тиждень ({city_name}):</b>"]
-    
+
     days_ua = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Нд"]
-    
+
     for i in range(len(days)):
         dt = datetime.strptime(days[i], "%Y-%m-%d")
         day_name = days_ua[dt.weekday()]
         icon = WMO_CODES.get(codes[i], "❓").split()[0]
-        
+
         line = f"<code>{day_name} {dt.strftime('%d.%m')}</code> {icon} <b>{t_min[i]}°..{t_max[i]}°</b>"
         res.append(line)
-        
+
     return "\n".join(res)
+
+async def get_weather_forecast(user_id: int, *args, **kwargs) -> str:
+    settings = await get_user_city(user_id)
+    try:
+        data = await get_forecast(settings["lat"], settings["lon"])
+        if data is None:
+            return "❌ Сервіс погоди тимчасово недоступний."
+        return format_current_weather(data, settings["name"])
+    except Exception as e:
+        return f"❌ Помилка: {e}"
+
+async def get_weekly_forecast(user_id: int) -> str:
+    settings = await get_user_city(user_id)
+    data = await get_forecast(settings["lat"], settings["lon"])
+    if data is None:
+        return "❌ Прогноз на тиждень недоступний."
+    return format_weekly_forecast(data, settings["name"])
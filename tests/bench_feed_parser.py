@@ -0,0 +1,53 @@
+# tests/bench_feed_parser.py
+"""
+Бенчмарк потокового парсера фідів проти feedparser.
+Запуск з кореня репозиторію: python -m tests.bench_feed_parser [feed.xml ...]
+Без аргументів — збережені фіди з tests/fixtures і великі синтетичні RSS та Atom на 300 записів.
+"""
+import sys
+from typing import List
+
+import feedparser
+
+from services.feed_parser import parse_top_entries
+from tests.benchmark import FIXTURES, measure
+
+
+def _synthetic_rss(items: int) -> bytes:
+    body = "".join(
+        f"<item><title>Новина №{i} &amp; подробиці</title><link>https://example.com/news/{i}</link>"
+        f"<guid>https://example.com/news/{i}</guid><pubDate>Mon, 06 Jan 2025 10:{i % 60:02d}:00 +0200</pubDate>"
+        f"<description><![CDATA[<p>{'Довгий текст статті. ' * 40}</p>]]></description></item>"
+        for i in range(items)
+    )
+    return (f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f'<title>Тестова стрічка</title>{body}</channel></rss>').encode()
+
+
+def _synthetic_atom(items: int) -> bytes:
+    body = "".join(
+        f'<entry><title>Запис {i}</title><link rel="alternate" href="https://example.com/a/{i}"/>'
+        f'<id>urn:uuid:{i}</id><updated>2025-01-06T10:{i % 60:02d}:00Z</updated>'
+        f'<content type="html">{"&lt;p&gt;Текст&lt;/p&gt; " * 60}</content></entry>'
+        for i in range(items)
+    )
+    return (f'<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+            f'<title>Atom стрічка</title>{body}</feed>').encode()
+
+
+def main(paths: List[str]):
+    fixtures = [(path, open(path, 'rb').read()) for path in paths] or [
+        (path.name, path.read_bytes()) for path in sorted(FIXTURES.glob("feed_*.xml"))
+    ] + [("synthetic-rss", _synthetic_rss(300)), ("synthetic-atom", _synthetic_atom(300))]
+    limit, repeat = 20, 10
+    print(f"{'feed':<24}{'KiB':>8}{'feedparser ms':>16}{'stream ms':>12}{'fp peak KiB':>14}{'stream peak KiB':>17}")
+    for name, data in fixtures:
+        parsed = parse_top_entries(data, limit)
+        fp_ms, fp_peak = measure(lambda: feedparser.parse(data).entries[:limit], repeat)
+        st_ms, st_peak = measure(lambda: parse_top_entries(data, limit), repeat)
+        note = "" if parsed is not None else "  (fallback: feedparser)"
+        print(f"{name[-24:]:<24}{len(data) / 1024:>8.0f}{fp_ms:>16.1f}{st_ms:>12.2f}{fp_peak:>14.0f}{st_peak:>17.0f}{note}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
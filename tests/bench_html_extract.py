@@ -0,0 +1,74 @@
+# tests/bench_html_extract.py
+"""
+Бенчмарк потокового екстрактора проти попереднього шляху через BeautifulSoup.
+Запуск з кореня репозиторію: python -m tests.bench_html_extract [page.html ...]
+Без аргументів — збережена сторінка з tests/fixtures і синтетична сторінка
+пошуку з важкою шапкою і 48 картками.
+"""
+import re
+import sys
+from typing import List
+
+from bs4 import BeautifulSoup
+
+from services.html_extract import extract_catalog_items
+from tests.benchmark import FIXTURES, measure
+
+BASE = "https://www.atbmarket.com/"
+_DIGITS_RE = re.compile(r'[^\d]')
+
+
+def _extract_bs4(page: str) -> List[dict]:
+    """Попередній шлях: повний DOM, soup.text для капчі, CSS select на кожне поле."""
+    soup = BeautifulSoup(page, 'html.parser')
+    if "captcha" in soup.text.lower():
+        return []
+    products = []
+    for item in soup.select('.catalog-item'):
+        name_tag = item.select_one('.catalog-item__title')
+        if not name_tag:
+            continue
+        top, bottom = item.select_one('.product-price__top'), item.select_one('.product-price__bottom')
+        price = None
+        if top and bottom:
+            price = float(f"{_DIGITS_RE.sub('', top.get_text())}.{_DIGITS_RE.sub('', bottom.get_text())}")
+        products.append({"name": name_tag.get_text(strip=True), "price": price,
+                         "on_sale": bool(item.select_one('.product-price__sale'))})
+    return products
+
+
+def _synthetic_page(items: int) -> str:
+    header = "".join(
+        f'<li class="menu__item"><a href="/catalog/{i}">Категорія {i}</a><ul>'
+        + "".join(f'<li><a href="/catalog/{i}/{j}">Підкатегорія {j}</a></li>' for j in range(15))
+        + "</ul></li>"
+        for i in range(40)
+    )
+    cards = "".join(
+        f'<article class="catalog-item js-product-container" data-id="{i}">'
+        f'<div class="catalog-item__photo"><a href="/product/tovar-{i}"><img src="/img/{i}.webp" alt=""></a></div>'
+        f'<div class="catalog-item__title"><a href="/product/tovar-{i}">Товар №{i} &amp; Ко 500г</a></div>'
+        f'<div class="catalog-item__bottom"><data class="product-price">'
+        f'<span class="product-price__top">{20 + i}</span><span class="product-price__bottom">{i % 100:02d}</span>'
+        f'</data>{"<span class=product-price__sale>-10%</span>" if i % 3 == 0 else ""}</div></article>'
+        for i in range(items)
+    )
+    scripts = "<script>" + "var x = {};".join(str(i) for i in range(3000)) + "</script>"
+    return f"<html><head>{scripts}</head><body><nav><ul>{header}</ul></nav><main>{cards}</main><footer>{header}</footer></body></html>"
+
+
+def main(paths: List[str]):
+    fixtures = [(path, open(path, encoding="utf-8").read()) for path in paths] or [
+        (path.name, path.read_text(encoding="utf-8")) for path in sorted(FIXTURES.glob("*.html"))
+    ] + [("synthetic-search", _synthetic_page(48))]
+    repeat = 10
+    print(f"{'page':<20}{'KiB':>7}{'items':>7}{'bs4 ms':>9}{'stream ms':>11}{'bs4 peak KiB':>14}{'stream peak KiB':>17}")
+    for name, page in fixtures:
+        found = extract_catalog_items(page, BASE)
+        bs_ms, bs_peak = measure(lambda: _extract_bs4(page), repeat)
+        st_ms, st_peak = measure(lambda: extract_catalog_items(page, BASE), repeat)
+        print(f"{name[-20:]:<20}{len(page.encode()) / 1024:>7.0f}{len(found):>7}{bs_ms:>9.1f}{st_ms:>11.1f}{bs_peak:>14.0f}{st_peak:>17.0f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
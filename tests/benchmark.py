@@ -0,0 +1,20 @@
+# tests/benchmark.py
+"""Спільний замір для бенчмарків у tests/bench_*.py (pytest їх не збирає)."""
+import time
+import tracemalloc
+from pathlib import Path
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def measure(fn, repeat: int):
+    """(середній час виклику в мс, піковий обсяг виділеної пам'яті в КіБ)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return elapsed, peak
@@ -0,0 +1,18 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+from services import db_manager
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Порожня база в tmp_path замість data/jeeves.db."""
+    monkeypatch.setattr(db_manager, "DB_PATH", tmp_path / "jeeves.db")
+    monkeypatch.setattr(db_manager, "LEGACY_DB_PATH", tmp_path / "legacy.db")
+    db_manager.init_db()
+    return db_manager
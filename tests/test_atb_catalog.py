@@ -0,0 +1,58 @@
+# tests/test_atb_catalog.py
+import asyncio
+
+import pytest
+
+from services import atb_catalog
+from services.price_parser import AtbChallenge, AtbError
+
+CATEGORIES = ["catalog/a", "catalog/b", "catalog/c"]
+
+
+def _product(path: str) -> dict:
+    return {"sku": f"/product/{path}", "name": f"Товар {path}", "url": None, "price": 10.0, "on_sale": False}
+
+
+def _crawl(temp_db, monkeypatch, page_two):
+    fetched = []
+
+    async def fake_fetch(path, page=1):
+        fetched.append((path, page))
+        if page == 1:
+            return [_product(path)]
+        return page_two(path)
+
+    monkeypatch.setattr(atb_catalog, "fetch_category_async", fake_fetch)
+    monkeypatch.setattr(atb_catalog, "CRAWL_DELAY_SEC", 0)
+
+    async def scenario():
+        try:
+            await atb_catalog.crawl_catalog(CATEGORIES)
+            rows = await temp_db.fetch_all("SELECT sku FROM products ORDER BY sku")
+            return [row["sku"] for row in rows]
+        finally:
+            await temp_db.close_pool()
+
+    return fetched, asyncio.run(scenario())
+
+
+def _raise(error):
+    def page_two(path):
+        raise error
+    return page_two
+
+
+@pytest.mark.parametrize("page_two", [
+    lambda path: [],                                    # порожній лістинг
+    _raise(AtbError("⚠️ АТБ блокує (код 404).")),       # сторінки за межами категорії
+])
+def test_short_category_does_not_stop_crawl(temp_db, monkeypatch, page_two):
+    fetched, skus = _crawl(temp_db, monkeypatch, page_two)
+    assert fetched == [(path, page) for path in CATEGORIES for page in (1, 2)]
+    assert skus == [f"/product/{path}" for path in CATEGORIES]
+
+
+def test_challenge_stops_crawl(temp_db, monkeypatch):
+    fetched, skus = _crawl(temp_db, monkeypatch, _raise(AtbChallenge("🤖")))
+    assert fetched == [("catalog/a", 1), ("catalog/a", 2)]
+    assert skus == ["/product/catalog/a"]
@@ -0,0 +1,65 @@
+# tests/test_feed_parser.py
+import pytest
+
+from services.feed_parser import parse_top_entries
+from tests.benchmark import FIXTURES
+
+
+def _load(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+def test_rss_entries_and_source():
+    entries = parse_top_entries(_load("feed_rss.xml"), limit=10)
+    assert [e["title"] for e in entries] == [
+        "Уряд ухвалив рішення & оприлюднив деталі",
+        "Новина з тегом у заголовку",
+        "Третя новина",
+        "Четверта новина",
+    ]
+    # назва каналу, а не <image><title>
+    assert {e["source"] for e in entries} == {"Українська правда"}
+    assert entries[0]["guid"] == "up-7001"
+    assert entries[1]["guid"] == entries[1]["link"] == "https://www.pravda.com.ua/news/2025/01/6/7002/"
+
+
+def test_rfc822_dates_to_utc():
+    entries = parse_top_entries(_load("feed_rss.xml"), limit=10)
+    assert [e["published"] for e in entries] == [
+        "2025-01-06 10:30:00",      # +0200
+        "2025-01-06 09:15:00",      # GMT
+        None,                       # не дата
+        "2025-01-06 04:59:00",      # -0500 — вже наступна доба за UTC
+    ]
+
+
+def test_atom_alternate_link_and_iso_dates():
+    entries = parse_top_entries(_load("feed_atom.xml"), limit=10)
+    assert entries[0]["link"] == "https://blog.example.com/posts/release-2"   # не enclosure
+    assert entries[1]["link"] == "https://blog.example.com/posts/xhtml"       # без rel = alternate
+    assert entries[2]["link"] == ""
+    assert entries[1]["title"] == "Запис з xhtml заголовком"
+    assert [e["published"] for e in entries] == [
+        "2025-01-06 10:00:00",      # published +02:00, а не updated
+        "2025-01-05 08:30:00",
+        "2025-01-04 00:00:00",
+    ]
+    assert entries[0]["guid"] == "tag:blog.example.com,2025:release-2"
+    assert {e["source"] for e in entries} == {"Блог розробника"}
+
+
+@pytest.mark.parametrize("name", ["feed_rss.xml", "feed_atom.xml"])
+def test_stops_after_limit(name):
+    body = _load(name)
+    assert len(parse_top_entries(body, limit=2)) == 2
+    # документ, обірваний після другого запису, не заважає: далі парсер не читає
+    end_tag = b"</item>" if b"<rss" in body else b"</entry>"
+    second_end = body.index(end_tag, body.index(end_tag) + 1) + len(end_tag)
+    broken = body[:second_end] + b"<item><title>&broken"
+    assert len(parse_top_entries(broken, limit=2, chunk_size=64)) == 2
+    assert parse_top_entries(broken, limit=10, chunk_size=64) is None
+
+
+@pytest.mark.parametrize("name", ["feed_rdf.xml", "feed_entities.xml"])
+def test_fallback_to_feedparser(name):
+    assert parse_top_entries(_load(name), limit=10) is None
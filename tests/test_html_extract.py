@@ -0,0 +1,83 @@
+# tests/test_html_extract.py
+import pytest
+
+from services import price_parser
+from services.html_extract import extract_catalog_items, is_captcha
+from tests.benchmark import FIXTURES
+
+BASE = "https://www.atbmarket.com/"
+
+EMPTY_SEARCH = (
+    '<html><head><script src="https://www.google.com/recaptcha/api.js?render=6Lc"></script></head>'
+    '<body><div class="search-empty">За вашим запитом нічого не знайдено</div></body></html>'
+)
+
+
+def test_recaptcha_script_on_empty_page_is_not_captcha():
+    assert not is_captcha(EMPTY_SEARCH)
+    assert price_parser.extract_products(EMPTY_SEARCH) == []
+
+
+@pytest.mark.parametrize("page", [
+    "<html><head><title>Just a moment...</title></head><body></body></html>",
+    '<html><body><div id="cf-chl-widget"></div></body></html>',
+    '<html><body><form id="captcha-form" method="post"><input name="code"></form></body></html>',
+])
+def test_real_challenge_is_captcha(page):
+    assert is_captcha(page)
+    with pytest.raises(price_parser.AtbError):
+        price_parser.extract_products(page)
+
+
+@pytest.fixture(scope="module")
+def search_page():
+    return extract_catalog_items((FIXTURES / "atb_search.html").read_text(encoding="utf-8"), BASE)
+
+
+def test_saved_page_items(search_page):
+    # картка без назви пропускається, шапка й футер не заважають
+    assert [p["name"] for p in search_page] == [
+        "Молоко 2,67% 900г Фермерське",
+        "Молоко 3,2% 1л Яготинське",
+        "Молоко козине 0,5л",
+        "Молоко Безлактозне 1% 1л",
+        "Молоко згущене & цукор 370г",
+    ]
+
+
+def test_prices_two_part_and_value(search_page):
+    assert search_page[0]["price"] == 41.90     # product-price__top + __bottom
+    assert search_page[1]["price"] == 52.30     # product-price__value "52,30 грн"
+    assert search_page[3]["price"] is None      # немає в наявності
+
+
+def test_sale_flag(search_page):
+    assert [p["on_sale"] for p in search_page] == [False, True, False, False, True]
+
+
+def test_url_and_sku_fallbacks(search_page):
+    assert search_page[0]["url"] == BASE + "product/moloko-267-900g-farmerske"
+    assert search_page[0]["sku"] == "/product/moloko-267-900g-farmerske"
+    # назва без посилання — беремо посилання з фото
+    assert search_page[2]["sku"] == "/product/moloko-kozyne-05l"
+    # посилань немає зовсім — sku з назви
+    assert search_page[3]["url"] is None
+    assert search_page[3]["sku"] == "молоко безлактозне 1% 1л"
+
+
+def test_unclosed_tags_do_not_leak_between_cards(search_page):
+    assert search_page[4]["price"] == 38.50
+    page = (
+        '<div class="catalog-item"><div class="catalog-item__title"><a href="/product/a">А<p>незакритий</div>'
+        '<span class="product-price__top">10</span><span class="product-price__bottom">5</span></div>'
+        '<div class="catalog-item"><div class="catalog-item__title">Б</div></div>'
+    )
+    first, second = extract_catalog_items(page, BASE)
+    # незакритий <p> закривається разом із назвою, ціна дістається своїй картці
+    assert (first["name"], first["price"]) == ("Анезакритий", 10.5)
+    assert (second["name"], second["price"], second["on_sale"]) == ("Б", None, False)
+
+
+def test_limit_stops_early():
+    page = "".join(f'<div class="catalog-item"><div class="catalog-item__title">{i}</div></div>' for i in range(10))
+    assert [p["name"] for p in extract_catalog_items(page, BASE, limit=3)] == ["0", "1", "2"]
@@ -0,0 +1,48 @@
+# tests/test_http_client.py
+import asyncio
+
+import aiohttp
+
+from services import http_client
+
+
+class _FakeResponse:
+    status = 200
+    headers = {}
+
+    async def read(self):
+        return b"ok"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    closed = False
+
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append(kwargs)
+        return _FakeResponse()
+
+
+def test_default_timeout_is_left_to_session(monkeypatch):
+    session = _FakeSession()
+    monkeypatch.setattr(http_client, "_session", session)
+    asyncio.run(http_client.fetch("https://example.com"))
+    # timeout=None у request вимкнув би таймаут сесії
+    assert "timeout" not in session.calls[0]
+
+
+def test_per_call_timeout_keeps_connect_limit(monkeypatch):
+    session = _FakeSession()
+    monkeypatch.setattr(http_client, "_session", session)
+    asyncio.run(http_client.fetch("https://example.com", timeout=30))
+    assert session.calls[0]["timeout"] == aiohttp.ClientTimeout(
+        total=30, connect=http_client.CONNECT_TIMEOUT_SEC
+    )
@@ -0,0 +1,76 @@
+# tests/test_log_search.py
+from services import log_search
+
+
+def _search(monkeypatch, path, **query):
+    monkeypatch.setitem(log_search.SOURCES, "test", (path, f"{path.name}.*"))
+    return log_search.search(log_search.LogQuery(source="test", **query))
+
+
+def test_traceback_stays_with_its_header(tmp_path, monkeypatch):
+    path = tmp_path / "app.log"
+    path.write_text(
+        "2026-01-01 10:00:00,000 | INFO | root | started\n"
+        "2026-01-01 10:00:01,000 | ERROR | root | boom\n"
+        "Traceback (most recent call last):\n"
+        "ValueError: Київ\n"
+    )
+    records = _search(monkeypatch, path, level=40, keyword="київ")
+    assert records == [
+        "2026-01-01 10:00:01,000 | ERROR | root | boom\nTraceback (most recent call last):\nValueError: Київ"
+    ]
+
+
+def test_lines_without_timestamps_are_not_one_record(tmp_path, monkeypatch):
+    path = tmp_path / "out.log"
+    with open(path, "w") as f:
+        for i in range(5000):
+            f.write(f"plain line {i}\n")
+    records = _search(monkeypatch, path, limit=3)
+    assert records == ["plain line 4997", "plain line 4998", "plain line 4999"]
+    assert len(_search(monkeypatch, path, keyword="plain", limit=10_000)) == 5000
+
+
+def test_record_size_is_capped(tmp_path, monkeypatch):
+    path = tmp_path / "huge.log"
+    with open(path, "wb") as f:
+        f.write(b"2026-01-01 10:00:00 " + b"x" * (4 * log_search.MAX_RECORD_BYTES) + b"\n")
+        f.write(b"tail\n" * (3 * log_search.MAX_RECORD_LINES))
+    records = _search(monkeypatch, path, limit=10_000)
+    assert all(len(r) <= log_search.MAX_RECORD_BYTES + log_search.MAX_RECORD_LINES * 5 for r in records)
+    assert records[0].startswith("2026-01-01 10:00:00 xxx")
+
+
+def _pm2_logs(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_search, "PM2_LOG_DIR", tmp_path)
+    (tmp_path / "Jeeves-out.log").write_text("2026-01-01T10:00:01: jeeves up\n")
+    (tmp_path / "Jeeves-error.log").write_text("2026-01-01T10:00:03: jeeves failed\n")
+    (tmp_path / "moto-out.log").write_text("2026-01-01T10:00:02: tunnel open\n")
+    (tmp_path / "ssh-server-error.log").write_text("2026-01-01T10:00:04: sshd denied\n")
+    (tmp_path / "moto-out__2025-12-31_00-00-00.log").write_text("2025-12-31T10:00:00: old tunnel\n")
+
+
+def test_pm2_source_covers_every_process(tmp_path, monkeypatch):
+    _pm2_logs(tmp_path, monkeypatch)
+    assert log_search.pm2_apps() == ["Jeeves", "moto", "ssh-server"]
+    records = log_search.search(log_search.LogQuery(source="pm2"))
+    assert records == [
+        "moto | 2025-12-31T10:00:00: old tunnel",
+        "Jeeves | 2026-01-01T10:00:01: jeeves up",
+        "moto | 2026-01-01T10:00:02: tunnel open",
+        "Jeeves | 2026-01-01T10:00:03: jeeves failed",
+        "ssh-server | 2026-01-01T10:00:04: sshd denied",
+    ]
+    assert log_search.search(log_search.LogQuery(source="err", limit=1)) == [
+        "ssh-server | 2026-01-01T10:00:04: sshd denied"
+    ]
+
+
+def test_query_can_name_a_pm2_process(tmp_path, monkeypatch):
+    _pm2_logs(tmp_path, monkeypatch)
+    query = log_search.parse_query("MOTO tunnel")
+    assert (query.source, query.app, query.keyword) == ("pm2", "moto", "tunnel")
+    assert log_search.search(query) == [
+        "2025-12-31T10:00:00: old tunnel",
+        "2026-01-01T10:00:02: tunnel open",
+    ]
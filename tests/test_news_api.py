@@ -0,0 +1,91 @@
+# tests/test_news_api.py
+import asyncio
+
+from services import news_api
+
+FEED = "https://example.com/rss"
+USER = 1
+
+
+def _entry(n: int) -> dict:
+    return {
+        "title": f"Новина {n}", "link": f"https://example.com/{n}", "source": "Example",
+        "guid": f"item-{n}", "published": f"2026-01-0{n} 10:00:00",
+    }
+
+
+def _run(temp_db, monkeypatch, scenario):
+    monkeypatch.setattr(news_api, "_feed_stats", {})
+    monkeypatch.setattr(news_api, "_feed_tasks", {})
+
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await temp_db.close_pool()
+
+    return asyncio.run(main())
+
+
+async def _deliver() -> list:
+    items = await news_api.get_unseen_items(USER, [FEED])
+    await news_api.mark_seen(USER, [item["item_id"] for item in items])
+    return [item["title"] for item in items]
+
+
+async def _age_items(temp_db, days: int):
+    await temp_db.execute(
+        "UPDATE news_items SET fetched_at = datetime('now', ?), last_seen_at = datetime('now', ?)",
+        (f"-{days} days", f"-{days} days"),
+    )
+
+
+def test_prune_does_not_redeliver_items_still_in_feed(temp_db, monkeypatch):
+    feed = [_entry(1), _entry(2)]
+
+    async def fake_fetch(url, timeout=10, retries=0):
+        return list(feed)
+
+    monkeypatch.setattr(news_api, "fetch_feed_entries", fake_fetch)
+
+    async def scenario():
+        delivered = []
+        await news_api.poll_news_feeds([FEED], force=True)
+        delivered += await _deliver()
+
+        # записи старші за термін зберігання, але фід їх досі віддає
+        await _age_items(temp_db, news_api.NEWS_RETENTION_DAYS + 1)
+        await news_api.poll_news_feeds([FEED], force=True)   # опитування + чистка
+        await news_api.poll_news_feeds([FEED], force=True)
+        delivered += await _deliver()
+
+        feed.append(_entry(3))
+        await news_api.poll_news_feeds([FEED], force=True)
+        delivered += await _deliver()
+        return delivered
+
+    delivered = _run(temp_db, monkeypatch, scenario)
+    assert sorted(delivered) == ["Новина 1", "Новина 2", "Новина 3"]
+
+
+def test_prune_drops_items_gone_from_feed(temp_db, monkeypatch):
+    feed = [_entry(1)]
+
+    async def fake_fetch(url, timeout=10, retries=0):
+        return list(feed)
+
+    monkeypatch.setattr(news_api, "fetch_feed_entries", fake_fetch)
+
+    async def scenario():
+        await news_api.poll_news_feeds([FEED], force=True)
+        await _deliver()
+        await _age_items(temp_db, news_api.NEWS_RETENTION_DAYS + 1)
+        feed[:] = [_entry(2)]
+        await news_api.poll_news_feeds([FEED], force=True)
+        rows = await temp_db.fetch_all("SELECT title FROM news_items")
+        seen = await temp_db.fetch_all("SELECT item_id FROM news_seen")
+        return [row["title"] for row in rows], len(seen)
+
+    titles, seen = _run(temp_db, monkeypatch, scenario)
+    assert titles == ["Новина 2"]
+    assert seen == 1    # позначка "прочитано" переживає сам запис
@@ -0,0 +1,126 @@
+# tests/test_notes.py
+import asyncio
+from types import SimpleNamespace
+
+from handlers import notes
+
+CHAT = -1001234567890
+LONG_TAG = "довгий_кириличний_тег_для_рецептів_бабусі"   # ~80 байт у UTF-8
+
+
+def test_long_cyrillic_tag_is_shortened():
+    assert notes.tag_ref("робота") == "робота"
+    ref = notes.tag_ref(LONG_TAG)
+    assert ref.startswith("#") and ref == notes.tag_ref(LONG_TAG)
+    assert len(ref.encode()) <= notes.TAG_REF_MAX_BYTES
+
+
+def test_note_list_callback_data_fits_telegram_limit(temp_db):
+    # id, як у старій базі з великою історією: курсори в кнопках теж найдовші
+    ids = range(9_999_990, 10_000_010)
+
+    def _seed(conn):
+        for note_id in ids:
+            conn.execute(
+                "INSERT INTO notes (id, user_id, content, tags) VALUES (?, ?, ?, ?)",
+                (note_id, CHAT, f"нотатка {note_id}", LONG_TAG),
+            )
+            conn.execute(
+                "INSERT INTO note_tags (note_id, chat_id, tag) VALUES (?, ?, ?)", (note_id, CHAT, LONG_TAG)
+            )
+
+    sent = {}
+
+    async def edit_text(text, parse_mode=None, reply_markup=None):
+        sent["text"], sent["markup"] = text, reply_markup
+
+    async def answer(*args, **kwargs):
+        pass
+
+    message = SimpleNamespace(chat=SimpleNamespace(id=CHAT), photo=None, edit_text=edit_text)
+
+    async def scenario():
+        try:
+            await temp_db.run_write(_seed)
+            data = f"list_notes:{notes.tag_ref(LONG_TAG)}:{ids[10]}"
+            await notes.show_notes_list(SimpleNamespace(data=data, message=message, answer=answer))
+        finally:
+            await temp_db.close_pool()
+
+    asyncio.run(scenario())
+    assert LONG_TAG in sent["text"]
+    callbacks = [button.callback_data for row in sent["markup"].inline_keyboard for button in row]
+    assert any(data.startswith("view_note:") for data in callbacks)
+    assert any(data.startswith("list_notes:") and "<" in data for data in callbacks)
+    for data in callbacks:
+        assert len(data.encode()) <= 64, data
+    # del_note:<id>:<тег>:<курсор> на 1 байт коротший за view_note з тими ж полями
+    view = next(data for data in callbacks if data.startswith("view_note:"))
+    assert len(view.replace("view_note:", "del_note:", 1).encode()) <= 64
+
+
+def test_first_page_by_id_cursor_has_no_prev(temp_db):
+    # кнопки "переглянути/видалити" несуть курсор str(rows[0]['id']), а не "0"
+    def _seed(conn):
+        for note_id in range(1, 21):
+            conn.execute("INSERT INTO notes (id, user_id, content, tags) VALUES (?, ?, ?, ?)",
+                         (note_id, CHAT, f"нотатка {note_id}", "t"))
+            conn.execute("INSERT INTO note_tags (note_id, chat_id, tag) VALUES (?, ?, ?)", (note_id, CHAT, "t"))
+
+    async def scenario():
+        try:
+            await temp_db.run_write(_seed)
+            return (await notes.fetch_notes_page(CHAT, "t", "1"),
+                    await notes.fetch_notes_page(CHAT, "t", "9"),
+                    await notes.fetch_notes_page(CHAT, "t", "<9"))
+        finally:
+            await temp_db.close_pool()
+
+    first, second, back = asyncio.run(scenario())
+    assert first[0][0]["id"] == 1 and first[1] is None and first[2] == "9"
+    assert second[1] == "<9"
+    assert [row["id"] for row in back[0]] == [row["id"] for row in first[0]] and back[1] is None
+
+
+def test_find_navigation_survives_note_save(temp_db):
+    USER = 42
+
+    def _seed(conn):
+        for note_id in range(1, 13):
+            conn.execute("INSERT INTO notes (id, user_id, content, tags) VALUES (?, ?, ?, ?)",
+                         (note_id, CHAT, f"рецепт борщу №{note_id}", ""))
+
+    sent = []
+
+    async def answer(text=None, reply_markup=None, parse_mode=None, **kwargs):
+        sent.append((text, reply_markup))
+
+    async def edit_text(text, reply_markup=None, parse_mode=None):
+        sent.append((text, reply_markup))
+
+    async def callback_answer(text=None, show_alert=False):
+        if show_alert:
+            sent.append(("alert", text))
+
+    chat, user = SimpleNamespace(id=CHAT), SimpleNamespace(id=USER)
+    message = SimpleNamespace(chat=chat, from_user=user, photo=None, answer=answer, edit_text=edit_text)
+
+    def _callback(data):
+        return SimpleNamespace(data=data, message=message, from_user=user, answer=callback_answer)
+
+    async def scenario():
+        try:
+            await temp_db.run_write(_seed)
+            await notes.cmd_find(message, SimpleNamespace(args="борщ"))
+            await notes.find_page_handler(_callback("find_page:1"))
+            # між переглядами користувач зберіг нотатку — FSM очищено, навігація пошуком лишається
+            await notes.find_page_handler(_callback("find_back:2"))
+        finally:
+            await temp_db.close_pool()
+
+    asyncio.run(scenario())
+    assert not any(text == "alert" for text, _ in sent)
+    first, second, third = sent
+    assert "стор. 2" in second[0] and "стор. 3" in third[0]
+    views = [b.callback_data for row in second[1].inline_keyboard for b in row if b.callback_data.startswith("view_note:")]
+    assert views and all(data.endswith(f":{notes.FIND_CONTEXT}:1") for data in views)
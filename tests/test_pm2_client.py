@@ -0,0 +1,193 @@
+# tests/test_pm2_client.py
+import asyncio
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from services import pm2_client
+
+PROCESSES = [
+    {"pm_id": 0, "name": "Jeeves", "pm2_env": {"status": "online"}, "monit": {"memory": 1}},
+    {"pm_id": 1, "name": "moto", "pm2_env": {"status": "errored"}, "monit": {"memory": 0}},
+]
+
+
+@pytest.fixture
+def pm2_home(monkeypatch):
+    # шлях unix-сокета обмежений ~100 байтами — tmp_path pytest буває задовгим
+    home = Path(tempfile.mkdtemp(prefix="pm2-", dir="/tmp"))
+    monkeypatch.setattr(pm2_client, "RPC_SOCKET", home / "rpc.sock")
+    monkeypatch.setattr(pm2_client, "PUB_SOCKET", home / "pub.sock")
+    monkeypatch.setattr(pm2_client, "_rpc_conn", None)
+    monkeypatch.setattr(pm2_client, "_rpc_lock", asyncio.Lock())
+    pm2_client._list_cache.clear()
+    pm2_client._expected_restarts.clear()
+    pm2_client._recent_exits.clear()
+    yield home
+    shutil.rmtree(home, ignore_errors=True)
+
+
+async def _serve_rpc(handler, calls: list):
+    """Заглушка демона: на кожен виклик спершу чужа відповідь, потім справжня."""
+    async def on_client(reader, writer):
+        while True:
+            try:
+                request, msg_id = await pm2_client.read_message(reader)
+            except asyncio.IncompleteReadError:
+                break
+            calls.append((request["method"], request["args"]))
+            writer.write(pm2_client.pack([{"args": ["not yours"]}, "someone-else:1"]))
+            writer.write(pm2_client.pack([handler(request["method"], request["args"]), msg_id]))
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_unix_server(on_client, str(pm2_client.RPC_SOCKET))
+
+
+def _daemon(method, args):
+    if method == "getMonitorData":
+        return {"args": [PROCESSES]}
+    if method == "restartProcessId":
+        return {"args": [{"restarted": args[0]["id"]}]}
+    return {"error": f"unknown method {method}"}
+
+
+def _run(scenario):
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await pm2_client._close_rpc()
+
+    return asyncio.run(main())
+
+
+def test_pack_round_trip():
+    message = [{"type": "call", "method": "ping", "args": [1, "два"]}, "s-id", b"raw"]
+
+    async def scenario():
+        reader = asyncio.StreamReader()
+        reader.feed_data(pm2_client.pack(message))
+        reader.feed_eof()
+        return await pm2_client.read_message(reader)
+
+    packed = pm2_client.pack(message)
+    assert packed[0] == (pm2_client.AMP_VERSION << 4 | 3)
+    assert _run(scenario) == message
+
+
+def test_rpc_reply_is_matched_by_msg_id(pm2_home):
+    calls = []
+
+    async def scenario():
+        server = await _serve_rpc(_daemon, calls)
+        async with server:
+            first = await pm2_client.rpc_call("getMonitorData", {})
+            second = await pm2_client.rpc_call("restartProcessId", {"id": 1, "env": {}})
+        return first, second
+
+    first, second = _run(scenario)
+    assert first == PROCESSES
+    assert second == {"restarted": 1}
+    assert [method for method, _ in calls] == ["getMonitorData", "restartProcessId"]
+
+
+def test_rpc_errors_become_pm2_error(pm2_home):
+    async def scenario():
+        errors = []
+        try:
+            await pm2_client.rpc_call("getMonitorData")  # сокета ще немає
+        except pm2_client.Pm2Error as e:
+            errors.append(str(e))
+        server = await _serve_rpc(_daemon, [])
+        async with server:
+            try:
+                await pm2_client.rpc_call("deleteEverything")
+            except pm2_client.Pm2Error as e:
+                errors.append(str(e))
+        return errors
+
+    missing, remote = _run(scenario)
+    assert missing.startswith("RPC getMonitorData:")
+    assert remote == "RPC deleteEverything: unknown method deleteEverything"
+
+
+def test_list_processes_falls_back_to_cli_and_caches(pm2_home, monkeypatch):
+    cli_calls = []
+
+    async def fake_cli(*args):
+        cli_calls.append(args)
+        return json.dumps(PROCESSES)
+
+    monkeypatch.setattr(pm2_client, "_run_cli", fake_cli)
+
+    async def scenario():
+        first = await pm2_client.list_processes()
+        second = await pm2_client.list_processes()
+        return first, second
+
+    first, second = _run(scenario)
+    assert first == second == PROCESSES
+    assert cli_calls == [("jlist",)]
+
+
+def test_restart_uses_rpc_and_is_not_reported(pm2_home):
+    calls = []
+
+    async def scenario():
+        server = await _serve_rpc(_daemon, calls)
+        async with server:
+            await pm2_client.restart_process("moto")
+
+    _run(scenario)
+    assert calls[-1] == ("restartProcessId", [{"id": 1, "env": {}}])
+    event = {"event": "restart", "manually": False, "process": {"name": "moto"}}
+    assert pm2_client.describe_event(event) is None
+
+
+def test_describe_event_filtering(pm2_home):
+    def event(name, kind, **extra):
+        return {"event": kind, "manually": False, "process": {"name": name, **extra}}
+
+    assert pm2_client.describe_event(event("moto", "online")) is None
+    assert pm2_client.describe_event({**event("moto", "exit"), "manually": True}) is None
+    assert "(код 1)" in pm2_client.describe_event(event("moto", "exit", exit_code=1))
+    # restart одразу після exit — той самий збій
+    assert pm2_client.describe_event(event("moto", "restart")) is None
+    assert "перезапущено" in pm2_client.describe_event(event("moto", "restart"))
+    assert "errored" in pm2_client.describe_event(event("Jeeves", "restart overlimit"))
+
+
+def test_watch_events_pushes_crashes(pm2_home, monkeypatch):
+    monkeypatch.setattr(pm2_client, "EVENTS_RECONNECT_SEC", 0.01)
+    events = [
+        {"event": "online", "process": {"name": "moto"}},
+        {"event": "exit", "manually": False, "process": {"name": "moto", "exit_code": 2}},
+        {"event": "restart", "manually": False, "process": {"name": "moto"}},
+    ]
+
+    async def scenario():
+        async def on_client(reader, writer):
+            for data in events:
+                writer.write(pm2_client.pack(["process:event", data]))
+            await writer.drain()
+            writer.close()
+
+        got = []
+
+        async def notify(text):
+            got.append(text)
+
+        server = await asyncio.start_unix_server(on_client, str(pm2_client.PUB_SOCKET))
+        async with server:
+            watcher = asyncio.create_task(pm2_client.watch_events(notify))
+            while not got:
+                await asyncio.sleep(0.01)
+            watcher.cancel()
+        return got
+
+    got = _run(scenario)
+    assert got[0] == "⚙️ PM2 💥 впав: <b>moto</b> (код 2)"
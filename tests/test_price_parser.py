@@ -0,0 +1,27 @@
+# tests/test_price_parser.py
+from types import SimpleNamespace
+
+from services import price_parser
+
+CATALOG_PAGE = (
+    '<html><head><script src="https://www.google.com/recaptcha/api.js"></script></head>'
+    '<body><article class="catalog-item"><div class="catalog-item__title">'
+    '<a href="/product/1">Хліб</a></div></article></body></html>'
+)
+CHALLENGE_PAGE = (
+    '<html><head><title>Just a moment...</title></head>'
+    '<body><form id="challenge-form" action="/?__cf_chl_f_tk=x" class="cf-chl-widget"></form></body></html>'
+)
+
+
+def _response(status, text):
+    return SimpleNamespace(status_code=status, text=text)
+
+
+def test_recaptcha_script_is_not_a_challenge():
+    assert not price_parser._is_challenge(_response(200, CATALOG_PAGE))
+
+
+def test_cloudflare_challenge_is_detected():
+    assert price_parser._is_challenge(_response(200, CHALLENGE_PAGE))
+    assert price_parser._is_challenge(_response(503, ""))
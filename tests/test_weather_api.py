@@ -0,0 +1,17 @@
+# tests/test_weather_api.py
+from services.weather_api import GEOCODE_KEY_LEN, normalize_city_query
+
+
+def test_short_queries_share_a_readable_key():
+    assert normalize_city_query("  Київ ") == normalize_city_query("KYIV") == "kyiv"
+
+
+def test_long_queries_with_common_prefix_do_not_collide():
+    prefix = "Новоград-Волинський район Житомирської області "
+    first = normalize_city_query(prefix + "село Суслі")
+    second = normalize_city_query(prefix + "село Броники")
+    assert first != second
+    assert normalize_city_query((prefix + "село Суслі").upper()) == first
+    # ключ іде в callback_data city_pick:<i>:<key> (ліміт Telegram — 64 байти)
+    assert len(f"city_pick:9:{first}".encode()) <= 64
+    assert len(first.encode()) <= GEOCODE_KEY_LEN
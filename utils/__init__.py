@@ -1,5 +1,7 @@
 # Jeeves_Bot/utils
 
+from . import cache
 from . import filters
 from . import helpers
 from . import logger
+from . import rate_limit
@@ -1,6 +1,8 @@
 # utils/helpers.py
+import calendar
 import sqlite3
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from typing import Optional
 
 def get_time_greeting() -> str:
     h = datetime.now().hour
@@ -8,3 +10,43 @@ def get_time_greeting() -> str:
     if 12 <= h < 18: return "☀️ Добрий день"
     if 18 <= h < 23: return "🍸 Доброго вечора"
     return "🌙 Доброї ночі"
+
+def parse_tags(tags_raw: str) -> list:
+    """Розбирає рядок тегів ("#a #b" або "a, b") у список унікальних назв без '#'."""
+    if not tags_raw:
+        return []
+    # Обробка різних розділювачів (пробіл або кома)
+    if " " in tags_raw and "," not in tags_raw:
+        parts = tags_raw.split()
+    else:
+        parts = tags_raw.split(',')
+
+    tags = []
+    for t in parts:
+        tag = t.strip().replace("#", "")
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+def parse_day_month(date_str: str) -> Optional[int]:
+    """'14.02' -> 214 (ключ MMDD для індексу календаря). None — якщо дата некоректна."""
+    try:
+        d, m = map(int, date_str.strip().split('.')[:2])
+    except (ValueError, AttributeError):
+        return None
+    # 2000 — високосний, щоб 29.02 теж була валідною
+    if not (1 <= m <= 12) or not (1 <= d <= calendar.monthrange(2000, m)[1]):
+        return None
+    return m * 100 + d
+
+def next_occurrence(month_day: int, start: date) -> date:
+    """Найближча дата (>= start) щорічної події з ключем MMDD."""
+    m, d = divmod(month_day, 100)
+    for year in (start.year, start.year + 1, start.year + 2):
+        try:
+            occ = date(year, m, d)
+        except ValueError:  # 29.02 у невисокосний рік
+            occ = date(year, 3, 1)
+        if occ >= start:
+            return occ
+    return start + timedelta(days=366)
@@ -0,0 +1,27 @@
+# utils/rate_limit.py
+import asyncio
+import time
+
+
+class RateLimiter:
+    """Рівномірний ліміт запитів: не більше rate стартів за секунду, решта чекає своєї черги."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.interval
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def __aenter__(self):
+        await self.wait()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False